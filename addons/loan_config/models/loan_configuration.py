@@ -1,6 +1,7 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 import json
+from .server_client import LoanServerClient
 
 class LoanConfiguration(models.Model):
     _name = 'loan.config'
@@ -77,6 +78,10 @@ class LoanConfiguration(models.Model):
             }
         return None
     
+    def get_server_client(self):
+        """Client HTTP dùng chung tới server, None nếu chưa bật/cấu hình server"""
+        server_config = self.get_server_config()
+        return LoanServerClient.from_config(server_config) if server_config else None
 
     
     def get_loan_limits(self):
@@ -157,17 +162,8 @@ class LoanConfiguration(models.Model):
                     raise ValidationError(_('Vui lòng cấu hình Server API URL và API Key'))
                 
                 # Test API connection - sử dụng endpoint đúng
-                test_url = f"{record.server_api_url}/api/config/health"
-                if not test_url.startswith('http'):
-                    test_url = f"http://{record.server_api_url}/api/config/health"
-                
-                response = requests.get(
-                    test_url,
-                    headers={
-                        'Content-Type': 'application/json'
-                    },
-                    timeout=10
-                )
+                client = LoanServerClient(record.server_api_url, record.server_api_key)
+                response = client.get('/api/config/health', timeout=10)
                 
                 if response.status_code == 200:
                     return {
@@ -243,19 +239,8 @@ class LoanConfiguration(models.Model):
                 }
                 
                 # Gửi cấu hình lên server - sử dụng endpoint đơn giản hơn
-                sync_url = f"{record.server_api_url}/api/config/sync"
-                if not sync_url.startswith('http'):
-                    sync_url = f"http://{record.server_api_url}/api/config/sync"
-                
-                response = requests.post(
-                    sync_url,
-                    json=config_data,
-                    headers={
-                        'Authorization': f"Bearer {record.server_api_key}",
-                        'Content-Type': 'application/json'
-                    },
-                    timeout=30
-                )
+                client = LoanServerClient(record.server_api_url, record.server_api_key)
+                response = client.post('/api/config/sync', config_data)
                 
                 if response.status_code == 200:
                     return {
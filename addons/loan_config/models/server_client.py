@@ -0,0 +1,102 @@
+"""HTTP client dùng chung cho mọi lời gọi tới loan server.
+
+Mỗi tiến trình worker giữ một requests.Session với connection pool keep-alive,
+nên các lời gọi liên tiếp dùng lại kết nối TCP/TLS thay vì bắt tay lại mỗi lần.
+Session được tạo lại sau khi fork (so sánh pid) để không dùng chung socket giữa
+các worker prefork.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_logger = logging.getLogger(__name__)
+
+# (connect, read) giây
+DEFAULT_TIMEOUT = (5, 30)
+# Số kết nối tối đa giữ lại cho mỗi host
+POOL_MAXSIZE = 16
+# Thử lại ở tầng kết nối cho các phương thức idempotent; POST do nơi gọi tự thử lại
+_RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}),
+    raise_on_status=False,
+)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """requests.Session dùng chung trong tiến trình hiện tại"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=_RETRY)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'})
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+class LoanServerClient:
+    """Gọi API loan server với URL gốc, xác thực và timeout thống nhất"""
+
+    def __init__(self, api_url, api_key):
+        api_url = (api_url or '').rstrip('/')
+        if api_url and not api_url.startswith('http'):
+            api_url = f"http://{api_url}"
+        self.api_url = api_url
+        self.api_key = api_key
+
+    @classmethod
+    def from_config(cls, server_config):
+        """Tạo client từ dict của loan.config.get_server_config()"""
+        return cls(server_config['api_url'], server_config['api_key'])
+
+    def _headers(self, extra=None):
+        headers = {}
+        if self.api_key:
+            # Server cũ đọc x-auth, server mới đọc Authorization
+            headers['Authorization'] = f"Bearer {self.api_key}"
+            headers['x-auth'] = self.api_key
+        headers.update(extra or {})
+        return headers
+
+    def request(self, method, path, json_data=None, params=None, headers=None, timeout=None, compress=False):
+        """Gửi request tới api_url + path.
+
+        :param compress: nén gzip thân JSON (Content-Encoding: gzip)
+        :return: requests.Response; lỗi kết nối ném requests.RequestException
+        """
+        headers = self._headers(headers)
+        data = None
+        if json_data is not None:
+            data = json.dumps(json_data, default=str).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+            if compress:
+                data = gzip.compress(data)
+                headers['Content-Encoding'] = 'gzip'
+        return get_session().request(
+            method, f"{self.api_url}{path}", data=data, params=params, headers=headers,
+            timeout=timeout or DEFAULT_TIMEOUT)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, json_data=None, **kwargs):
+        return self.request('POST', path, json_data=json_data, **kwargs)
+
+    def put(self, path, json_data=None, **kwargs):
+        return self.request('PUT', path, json_data=json_data, **kwargs)
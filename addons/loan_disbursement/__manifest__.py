@@ -17,7 +17,9 @@
         'security/ir.model.access.csv',
         'views/disbursement_views.xml',
         'views/menu_views.xml',
+        'views/loan_type_recompute_views.xml',
         'data/disbursement_sequence.xml',
+        'data/ir_cron.xml',
         'views/web_templates.xml',
     ],
     'demo': [],
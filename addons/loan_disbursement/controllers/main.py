@@ -1,10 +1,20 @@
 from odoo import http
 from odoo.http import request
+import hmac
 import json
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# action: (trạng thái yêu cầu, phương thức, trạng thái đích, lỗi khi sai trạng thái)
+BATCH_TRANSITIONS = {
+    'approve': ('pending', 'action_approve', 'approved', 'Disbursement is not in pending status'),
+    'reject': ('pending', 'action_reject', 'rejected', 'Disbursement is not in pending status'),
+    'process': ('approved', 'action_process_disbursement', 'processing', 'Disbursement is not approved'),
+}
+# Số disbursement_ids tối đa trong một request batch
+BATCH_MAX_IDS = 1000
+
 class LoanDisbursementController(http.Controller):
     
     @http.route('/api/loan/disbursements', type='json', auth='user', methods=['GET'])
@@ -216,12 +226,12 @@ class LoanDisbursementController(http.Controller):
                     'error': 'Disbursement is not approved'
                 }
             
-            # Xử lý giải ngân
+            # Đưa vào hàng đợi giải ngân, kết quả cập nhật khi server phản hồi/callback
             disbursement.action_process_disbursement()
             
             return {
                 'success': True,
-                'message': 'Disbursement processed successfully',
+                'message': 'Disbursement queued for processing',
                 'data': {
                     'id': disbursement.id,
                     'status': disbursement.status,
@@ -237,6 +247,137 @@ class LoanDisbursementController(http.Controller):
                 'error': str(e)
             }
     
+    @http.route('/api/loan/disbursements/approve/batch', type='json', auth='user', methods=['POST'])
+    def approve_disbursements_batch(self, **kwargs):
+        """API phê duyệt nhiều giải ngân"""
+        return self._batch_transition('approve', kwargs)
+
+    @http.route('/api/loan/disbursements/reject/batch', type='json', auth='user', methods=['POST'])
+    def reject_disbursements_batch(self, **kwargs):
+        """API từ chối nhiều giải ngân"""
+        return self._batch_transition('reject', kwargs)
+
+    @http.route('/api/loan/disbursements/process/batch', type='json', auth='user', methods=['POST'])
+    def process_disbursements_batch(self, **kwargs):
+        """API đưa nhiều giải ngân vào hàng đợi xử lý"""
+        return self._batch_transition('process', kwargs)
+
+    def _batch_transition(self, action, kwargs):
+        """Chuyển trạng thái cả lô disbursement_ids, trả kết quả theo từng ID.
+
+        Trạng thái được kiểm tra bằng một truy vấn; các bản ghi hợp lệ được chuyển
+        trong một savepoint. Nếu lô lỗi, thử lại từng bản ghi trong savepoint riêng
+        để lỗi của một bản ghi không hoàn tác các bản ghi thành công. Một ID chỉ
+        thành công khi trạng thái đọc lại sau cùng đúng là trạng thái đích.
+        """
+        try:
+            from_state, method, to_state, state_error = BATCH_TRANSITIONS[action]
+            raw_ids = kwargs.get('disbursement_ids')
+            if not isinstance(raw_ids, list) or not raw_ids:
+                return {
+                    'success': False,
+                    'error': 'disbursement_ids must be a non-empty list'
+                }
+            if len(raw_ids) > BATCH_MAX_IDS:
+                return {
+                    'success': False,
+                    'error': f'At most {BATCH_MAX_IDS} disbursement_ids per request'
+                }
+            try:
+                disbursement_ids = list(dict.fromkeys(int(disbursement_id) for disbursement_id in raw_ids))
+            except (TypeError, ValueError):
+                return {
+                    'success': False,
+                    'error': 'disbursement_ids must contain integers'
+                }
+
+            disbursement_model = request.env['loan.disbursement']
+            states = {
+                row['id']: row['status']
+                for row in disbursement_model.search_read([('id', 'in', disbursement_ids)], ['status'])
+            }
+            errors = {}
+            eligible = []
+            for disbursement_id in disbursement_ids:
+                if disbursement_id not in states:
+                    errors[disbursement_id] = 'Disbursement not found'
+                elif states[disbursement_id] != from_state:
+                    errors[disbursement_id] = state_error
+                else:
+                    eligible.append(disbursement_id)
+
+            records = disbursement_model.browse(eligible).with_context(bulk_transition=True)
+            if records:
+                try:
+                    with request.env.cr.savepoint():
+                        self._apply_batch_transition(records, action, method, kwargs)
+                except Exception as e:
+                    _logger.warning(f"Batch {action} failed, retrying per disbursement: {e}")
+                    request.env.invalidate_all()
+                    for record in records:
+                        try:
+                            with request.env.cr.savepoint():
+                                self._apply_batch_transition(record, action, method, kwargs)
+                        except Exception as record_error:
+                            request.env.invalidate_all()
+                            errors[record.id] = str(record_error)
+
+            data_by_id = {
+                row['id']: row
+                for row in disbursement_model.search_read(
+                    [('id', 'in', eligible)], ['status', 'approval_date', 'blockchain_tx_id', 'blockchain_status'])
+            }
+            results = []
+            for disbursement_id in disbursement_ids:
+                if disbursement_id in errors:
+                    results.append({'id': disbursement_id, 'success': False, 'error': errors[disbursement_id]})
+                    continue
+                row = data_by_id.get(disbursement_id)
+                if not row or row['status'] != to_state:
+                    # Bản ghi đổi trạng thái ở request khác giữa lúc kiểm tra và lúc chuyển
+                    errors[disbursement_id] = state_error
+                    results.append({'id': disbursement_id, 'success': False, 'error': state_error})
+                    continue
+                results.append({
+                    'id': disbursement_id,
+                    'success': True,
+                    'status': row['status'],
+                    'approval_date': row['approval_date'].strftime('%Y-%m-%d %H:%M:%S') if row['approval_date'] else None,
+                    'blockchain_tx_id': row['blockchain_tx_id'],
+                    'blockchain_status': row['blockchain_status'],
+                })
+
+            succeeded = len(disbursement_ids) - len(errors)
+            return {
+                'success': True,
+                'message': f'{succeeded}/{len(disbursement_ids)} disbursements {action} successfully',
+                'data': {
+                    'succeeded': succeeded,
+                    'failed': len(errors),
+                    'results': results
+                }
+            }
+
+        except Exception as e:
+            _logger.error(f"Error in batch {action} of disbursements: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _apply_batch_transition(self, records, action, method, kwargs):
+        """records mang context bulk_transition: không chatter từng bản ghi, một log cho cả lô.
+
+        Lý do từ chối vẫn được ghi vào chatter của từng bản ghi như API đơn lẻ.
+        """
+        getattr(records, method)()
+        reason = kwargs.get('reason')
+        if action == 'reject' and reason:
+            for record in records.filtered(lambda record: record.status == 'rejected'):
+                record.message_post(body=f"Lý do từ chối: {reason}")
+        # Ghi xuống DB trong savepoint để lỗi ràng buộc lộ ra tại đây
+        records.flush_recordset()
+
     @http.route('/api/loan/config', type='json', auth='user', methods=['GET'])
     def get_loan_config(self, **kwargs):
         """API lấy cấu hình khoản vay"""
@@ -274,3 +415,47 @@ class LoanDisbursementController(http.Controller):
                 'success': False,
                 'error': str(e)
             }
+
+    @http.route('/api/loan/disbursements/callback', type='json', auth='public', methods=['POST'], csrf=False)
+    def disbursement_status_callback(self, **kwargs):
+        """Server báo kết quả giải ngân đang xử lý (theo idempotency_key hoặc mã giải ngân)"""
+        try:
+            server_config = request.env['loan.config'].sudo().get_server_config()
+            headers = request.httprequest.headers
+            token = headers.get('x-auth') or headers.get('Authorization', '').removeprefix('Bearer ').strip()
+            if not server_config or not server_config.get('api_key') or not token \
+                    or not hmac.compare_digest(token, server_config['api_key']):
+                return {
+                    'success': False,
+                    'error': 'Unauthorized'
+                }
+
+            domain = [('dispatch_idempotency_key', '=', kwargs['idempotency_key'])] if kwargs.get('idempotency_key') \
+                else [('name', '=', kwargs.get('disbursement_id'))]
+            disbursement = request.env['loan.disbursement'].sudo().search(domain, limit=1)
+            if not disbursement:
+                return {
+                    'success': False,
+                    'error': 'Disbursement not found'
+                }
+
+            if disbursement._lock_processing():
+                if kwargs.get('status') == 'success':
+                    disbursement._mark_dispatch_success(kwargs.get('data') or {})
+                elif kwargs.get('status') == 'failed':
+                    disbursement._mark_dispatch_failure(kwargs.get('message'))
+
+            return {
+                'success': True,
+                'data': {
+                    'id': disbursement.id,
+                    'status': disbursement.status
+                }
+            }
+
+        except Exception as e:
+            _logger.error(f"Error handling disbursement callback: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
@@ -2,10 +2,14 @@ from odoo import http
 from odoo.http import request
 import json
 import logging
-import requests
+from ..models.p2p_import import map_p2p_status_to_application
 
 _logger = logging.getLogger(__name__)
 
+# Con trỏ `since` của lần kéo /loan/odoo/export/loans thành công gần nhất
+PULL_CURSOR_PARAM = 'loan_disbursement.pull_cursor'
+PULL_PAGE_SIZE = 500
+
 class LoanDisbursementWebController(http.Controller):
 
     @http.route('/loan/disbursement/web', type='http', auth='user', website=True)
@@ -32,110 +36,47 @@ class LoanDisbursementWebController(http.Controller):
 
     @http.route('/loan/disbursement/sync', type='json', auth='user', methods=['POST'], csrf=False)
     def loan_disbursement_sync(self, **kwargs):
-        """Đồng bộ dữ liệu giải ngân từ Server (pull từ /loan/odoo/export/loans)"""
-        try:
-            server_config = request.env['loan.config'].get_server_config()
-            response = requests.get(
-                f"{server_config['api_url']}/loan/odoo/export/loans",
-                headers={'x-auth': server_config['api_key']},
-                timeout=5
-            )
+        """Đồng bộ dữ liệu giải ngân từ Server (pull từ /loan/odoo/export/loans).
 
-            if response.status_code != 200:
-                return {'success': False, 'message': f'Lỗi đồng bộ giải ngân: {response.status_code}'}
-
-            body = response.json() or {}
-            result = body.get('data') or {}
-            server_loans = result.get('loans') or []
+        Kéo theo trang với con trỏ `since` lưu trong ir.config_parameter nên mỗi lần
+        chỉ nhận các khoản vay thay đổi từ lần trước; truyền full=True để kéo lại toàn bộ.
+        """
+        try:
+            client = request.env['loan.config'].get_server_client()
+            if not client:
+                return {'success': False, 'message': 'Chưa cấu hình server'}
 
+            params = request.env['ir.config_parameter'].sudo()
+            since = None if kwargs.get('full') else params.get_param(PULL_CURSOR_PARAM)
             created_count = 0
             updated_count = 0
 
-            for loan in server_loans:
-                contract_id = loan.get('id')
-                if not contract_id:
-                    continue
-                existing = request.env['loan.disbursement'].search([
-                    ('server_loan_id', '=', contract_id)
-                ], limit=1)
-
-                borrower_data = (loan.get('borrower') or {})
-                borrower = None
-                if borrower_data:
-                    partner_model = request.env['res.partner'].sudo()
-                    # Tìm theo ref trước
-                    borrower = partner_model.search([('ref', '=', str(borrower_data.get('id')))], limit=1)
-                    # Fallback theo phone
-                    if not borrower and borrower_data.get('phone'):
-                        borrower = partner_model.search([('phone', '=', borrower_data.get('phone'))], limit=1)
-                    # Nếu vẫn chưa có, tạo mới partner tối thiểu
-                    if not borrower:
-                        vals_partner = {
-                            'name': borrower_data.get('name') or borrower_data.get('phone') or 'Unknown',
-                            'ref': str(borrower_data.get('id') or ''),
-                        }
-                        if borrower_data.get('phone'):
-                            vals_partner['phone'] = borrower_data.get('phone')
-                        borrower = partner_model.create(vals_partner)
-
-                # Tìm hoặc tạo loan.application liên quan
-                app_model = request.env['loan.application'].sudo()
-                application = app_model.search([
-                    '|', ('blockchain_contract_id', '=', contract_id),
-                         ('name', '=', contract_id)
-                ], limit=1)
-
-                if not application:
-                    # Yêu cầu loan_type_id NOT NULL: đảm bảo có loan.type
-                    loan_type_model = request.env['loan.type'].sudo()
-                    loan_type = loan_type_model.search([], limit=1)
-                    if not loan_type:
-                        # Tạo mặc định nếu chưa có
-                        default_vals = {
-                            'name': 'Default',
-                            'code': 'DEFAULT',
-                            'term_months': (loan.get('term_months') or 6),
-                            'interest_rate': (loan.get('interest_rate') or 0.0),
-                            'service_fee_rate': 0.0,
-                            'late_fee_rate': 0.0,
-                            'min_amount': 0.0,
-                            'max_amount': 0.0,
-                        }
-                        try:
-                            loan_type = loan_type_model.create(default_vals)
-                        except Exception:
-                            # Nếu tạo thất bại do thiếu field, chỉ tạo tối thiểu name/code
-                            loan_type = loan_type_model.create({'name': 'Default', 'code': 'DEFAULT'})
-
-                    app_vals = {
-                        'name': contract_id,
-                        'borrower_id': borrower.id if borrower else False,
-                        'requested_amount': loan.get('amount') or 0.0,
-                        'approved_amount': loan.get('amount') or 0.0,
-                        'interest_rate': loan.get('interest_rate') or 0.0,
-                        'term_months': loan.get('term_months') or 0,
-                        'purpose': '',
-                        'status': self._map_p2p_status_to_application(loan.get('status')),
-                        'application_date': loan.get('created_date') or False,
-                        'blockchain_contract_id': contract_id,
-                        'loan_type_id': loan_type.id,
+            while True:
+                query = {'limit': PULL_PAGE_SIZE}
+                if since:
+                    query['since'] = since
+                response = client.get('/loan/odoo/export/loans', params=query, timeout=(5, 30))
+                if response.status_code != 200:
+                    return {
+                        'success': False,
+                        'message': f'Lỗi đồng bộ giải ngân: {response.status_code}',
+                        'created_count': created_count,
+                        'updated_count': updated_count
                     }
-                    application = app_model.create(app_vals)
 
-                vals = {
-                    'server_loan_id': contract_id,
-                    'borrower_id': borrower.id if borrower else False,
-                    'loan_application_id': application.id,
-                    'amount': loan.get('amount') or 0.0,
-                    'disbursement_date': loan.get('created_date') or False,
-                    'status': self._map_server_status_to_disbursement(loan.get('status')),
-                }
-                if existing:
-                    existing.write(vals)
-                    updated_count += 1
-                else:
-                    request.env['loan.disbursement'].create(vals)
-                    created_count += 1
+                body = response.json() or {}
+                result = body.get('data') or {}
+                created, updated = self._sync_loans_page(result.get('loans') or [])
+                created_count += created
+                updated_count += updated
+
+                # Server cũ không phân trang: không có next_cursor, coi như một trang duy nhất
+                next_cursor = result.get('next_cursor')
+                if next_cursor:
+                    since = next_cursor
+                    params.set_param(PULL_CURSOR_PARAM, since)
+                if not (result.get('has_more') and next_cursor):
+                    break
 
             return {
                 'success': True,
@@ -147,6 +88,123 @@ class LoanDisbursementWebController(http.Controller):
             _logger.error(f'Error syncing disbursement: {str(e)}')
             return {'success': False, 'message': str(e)}
 
+    def _sync_loans_page(self, server_loans):
+        """Ghi một trang khoản vay từ server: tra cứu gộp bằng domain `in`, tạo theo lô,
+        chỉ cập nhật bản ghi có giá trị thay đổi và ghi gộp các bản ghi cùng giá trị"""
+        loans = {}
+        for loan in server_loans:
+            if loan.get('id'):
+                loans[str(loan['id'])] = loan
+        if not loans:
+            return 0, 0
+        contract_ids = list(loans)
+
+        disb_model = request.env['loan.disbursement']
+        app_model = request.env['loan.application'].sudo()
+
+        existing = {}
+        for disb in disb_model.search([('server_loan_id', 'in', contract_ids)]):
+            existing.setdefault(disb.server_loan_id, disb)
+
+        # Người vay: một lần tra bảng ánh xạ/ref/phone chuẩn hóa, còn thiếu thì tạo một lần
+        borrowers_data = {cid: loan.get('borrower') or {} for cid, loan in loans.items()}
+        with_borrower = [cid for cid, data in borrowers_data.items() if data]
+        partners = request.env['loan.borrower.mapping'].sudo()._resolve_partners([{
+            'external_id': borrowers_data[cid].get('id'),
+            'phone': borrowers_data[cid].get('phone'),
+            'name': borrowers_data[cid].get('name'),
+        } for cid in with_borrower])
+        borrowers = dict.fromkeys(loans)
+        borrowers.update(zip(with_borrower, partners))
+
+        # Tìm hoặc tạo loan.application liên quan
+        applications = {}
+        for application in app_model.search(['|', ('blockchain_contract_id', 'in', contract_ids),
+                                                  ('name', 'in', contract_ids)]):
+            if application.blockchain_contract_id:
+                applications.setdefault(application.blockchain_contract_id, application)
+            applications.setdefault(application.name, application)
+
+        new_app_ids = [cid for cid in contract_ids if cid not in applications]
+        if new_app_ids:
+            loan_type = self._get_default_loan_type(loans[new_app_ids[0]])
+            app_vals_list = []
+            for cid in new_app_ids:
+                loan = loans[cid]
+                borrower = borrowers[cid]
+                app_vals_list.append({
+                    'name': cid,
+                    'borrower_id': borrower.id if borrower else False,
+                    'requested_amount': loan.get('amount') or 0.0,
+                    'approved_amount': loan.get('amount') or 0.0,
+                    'interest_rate': loan.get('interest_rate') or 0.0,
+                    'term_months': loan.get('term_months') or 0,
+                    'purpose': '',
+                    'status': self._map_p2p_status_to_application(loan.get('status')),
+                    'application_date': loan.get('created_date') or False,
+                    'blockchain_contract_id': cid,
+                    'loan_type_id': loan_type.id,
+                })
+            for cid, application in zip(new_app_ids, app_model.create(app_vals_list)):
+                applications[cid] = application
+
+        create_vals_list = []
+        # Các bản ghi cần cập nhật, gộp theo cùng tập giá trị thay đổi để ghi một lần mỗi nhóm
+        update_groups = {}
+        for cid, loan in loans.items():
+            borrower = borrowers[cid]
+            vals = {
+                'server_loan_id': cid,
+                'borrower_id': borrower.id if borrower else False,
+                'loan_application_id': applications[cid].id,
+                'amount': loan.get('amount') or 0.0,
+                'disbursement_date': loan.get('created_date') or False,
+                'status': self._map_server_status_to_disbursement(loan.get('status')),
+            }
+            if cid in existing:
+                disb = existing[cid]
+                # Bỏ qua các trường không đổi (trạng thái/số tiền thường giữ nguyên giữa các lần kéo)
+                changed = {
+                    fname: value for fname, value in vals.items()
+                    if disb._fields[fname].convert_to_cache(value, disb)
+                    != disb._fields[fname].convert_to_cache(disb[fname], disb)
+                }
+                if changed:
+                    key = tuple(sorted(changed.items()))
+                    update_groups[key] = update_groups.get(key, disb_model.browse()) | disb
+            else:
+                create_vals_list.append(vals)
+        updated_count = 0
+        for key, records in update_groups.items():
+            records.write(dict(key))
+            updated_count += len(records)
+        if create_vals_list:
+            disb_model.create(create_vals_list)
+        return len(create_vals_list), updated_count
+
+    def _get_default_loan_type(self, loan):
+        """loan.type cho khoản vay tạo từ server (loan_type_id NOT NULL)"""
+        loan_type_model = request.env['loan.type'].sudo()
+        loan_type = loan_type_model.search([], limit=1)
+        if not loan_type:
+            # Tạo mặc định nếu chưa có
+            default_vals = {
+                'name': 'Default',
+                'code': 'DEFAULT',
+                'term_months': (loan.get('term_months') or 6),
+                'interest_rate': (loan.get('interest_rate') or 0.0),
+                'service_fee_rate': 0.0,
+                'late_fee_rate': 0.0,
+                'min_amount': 0.0,
+                'max_amount': 0.0,
+            }
+            try:
+                loan_type = loan_type_model.create(default_vals)
+            except Exception:
+                # Nếu tạo thất bại do thiếu field, chỉ tạo tối thiểu name/code
+                loan_type = loan_type_model.create({'name': 'Default', 'code': 'DEFAULT'})
+        return loan_type
+
     @http.route('/loan/disbursement/process', type='json', auth='user', methods=['POST'], csrf=False)
     def process_loan_actions(self, **kwargs):
         """API xử lý giải ngân"""
@@ -158,44 +216,29 @@ class LoanDisbursementWebController(http.Controller):
             if not action or not loan_ids:
                 return {'success': False, 'error': 'action and loan_ids are required'}
 
-            server_config = request.env['loan.config'].get_server_config()
+            client = request.env['loan.config'].get_server_client()
 
             # Chỉ hỗ trợ giải ngân (disburse) lên server
             if action == 'disburse':
-                processed = 0
-                for loan_id in loan_ids:
-                    disb = request.env['loan.disbursement'].search([('server_loan_id', '=', loan_id)], limit=1)
-                    if not disb:
-                        continue
-                    payload = {
-                        'disbursement_id': f"{loan_id}-{int(http.request.httprequest.timestamp())}",
-                        'loan_application_id': loan_id,
-                        'borrower_id': disb.borrower_id.id if disb.borrower_id else None,
-                        'amount': disb.amount or 0.0,
-                        'disbursement_date': str(disb.disbursement_date or ''),
-                        'disbursement_method': disb.disbursement_method or 'bank_transfer',
-                        'bank_account': disb.bank_account or '',
-                        'bank_name': disb.bank_name or '',
-                        'notes': disb.notes or ''
-                    }
-                    resp = requests.post(
-                        f"{server_config['api_url']}/loan/disburse",
-                        json=payload,
-                        headers={'x-auth': server_config['api_key']},
-                        timeout=6
-                    )
-                    if resp.status_code == 200:
-                        disb.status = 'disbursed'
-                        processed += 1
-                    else:
-                        _logger.error(f"Disburse API error {resp.status_code}: {resp.text}")
+                if not client:
+                    return {'success': False, 'message': 'Chưa cấu hình server'}
+                # Chỉ các giải ngân đã phê duyệt; gửi qua hàng đợi của action_process_disbursement
+                # (idempotency key ổn định, cron gửi lên server và xử lý thử lại)
+                disbursements = {}
+                for disb in request.env['loan.disbursement'].search([
+                        ('server_loan_id', 'in', [str(loan_id) for loan_id in loan_ids]),
+                        ('status', '=', 'approved')]):
+                    disbursements.setdefault(disb.server_loan_id, disb)
+                records = request.env['loan.disbursement'].browse([disb.id for disb in disbursements.values()])
+                records.action_process_disbursement()
+                processed = len(records.filtered(lambda record: record.status == 'processing'))
 
                 if processed > 0:
                     return {
                         'success': True,
-                        'message': f'Giải ngân thành công {processed} khoản vay'
+                        'message': f'Đã đưa {processed} khoản vay vào hàng đợi giải ngân'
                     }
-                return {'success': False, 'message': 'Không giải ngân được khoản vay nào'}
+                return {'success': False, 'message': 'Không có khoản vay đã phê duyệt nào để giải ngân'}
 
             # Hủy/Reject: cập nhật cục bộ
             if action in ('reject', 'cancel'):
@@ -212,17 +255,14 @@ class LoanDisbursementWebController(http.Controller):
             return {'success': False, 'error': str(e)}
 
     def _find_borrower(self, borrower_data):
-        phone = (borrower_data or {}).get('phone')
-        return request.env['res.partner'].search([('phone', '=', phone)], limit=1)
+        borrower_data = borrower_data or {}
+        return request.env['loan.borrower.mapping'].sudo()._resolve_partners([{
+            'external_id': borrower_data.get('id'),
+            'phone': borrower_data.get('phone'),
+        }], create_missing=False)[0]
 
     def _map_p2p_status_to_application(self, p2p_status: str) -> str:
-        status = (p2p_status or '').lower()
-        return {
-            'waiting': 'submitted',
-            'success': 'approved',
-            'clean': 'disbursed',
-            'fail': 'rejected'
-        }.get(status, 'submitted')
+        return map_p2p_status_to_application(p2p_status)
 
     def _map_server_status_to_disbursement(self, server_status: str) -> str:
         """Map trạng thái từ server sang trạng thái hợp lệ của loan.disbursement"""
@@ -237,77 +277,10 @@ class LoanDisbursementWebController(http.Controller):
 
     @http.route('/loan/disbursement/import_p2p', type='json', auth='user', methods=['POST'], csrf=False)
     def import_from_p2p(self, **kwargs):
-        """Kết nối dữ liệu từ p2p_bridge sang loan_disbursement"""
+        """Kết nối dữ liệu từ p2p_bridge sang loan_disbursement (chỉ các p2p.loan thay đổi từ lần trước)"""
         try:
-            p2p_loans = request.env['p2p.loan'].sudo().search([])
-            app_model = request.env['loan.application'].sudo()
-            disb_model = request.env['loan.disbursement'].sudo()
-            partner_model = request.env['res.partner'].sudo()
-
-            created_apps = updated_apps = created_disbs = 0
-
-            for loan in p2p_loans:
-                contract_id = loan.contractId or loan.loan_id
-                if not contract_id:
-                    continue
-
-                borrower = None
-                if loan.borrower_id:
-                    borrower = partner_model.search([('ref', '=', loan.borrower_id)], limit=1)
-                    if not borrower:
-                        borrower = partner_model.create({
-                            'name': loan.borrower_id,
-                            'ref': loan.borrower_id,
-                            'company_type': 'person',
-                        })
-
-                application = app_model.search([
-                    '|', ('blockchain_contract_id', '=', contract_id),
-                         ('name', '=', contract_id)
-                ], limit=1)
-
-                app_vals = {
-                    'name': contract_id,
-                    'borrower_id': borrower.id if borrower else False,
-                    'requested_amount': loan.capital or 0.0,
-                    'approved_amount': loan.capital or 0.0,
-                    'interest_rate': loan.interest_rate or 0.0,
-                    'term_months': loan.term_months or 0,
-                    'purpose': loan.willing or loan.description or '',
-                    'status': self._map_p2p_status_to_application(loan.status),
-                    'application_date': (loan.created_at and str(loan.created_at)) or False,
-                    'blockchain_contract_id': contract_id,
-                }
-                if application:
-                    application.write(app_vals)
-                    updated_apps += 1
-                else:
-                    application = app_model.create(app_vals)
-                    created_apps += 1
-
-                if loan.status == 'clean':
-                    existing_disb = disb_model.search([('server_loan_id', '=', contract_id)], limit=1)
-                    if not existing_disb:
-                        disb_model.create({
-                            'server_loan_id': contract_id,
-                            'loan_application_id': application.id,
-                            'borrower_id': borrower.id if borrower else False,
-                            'amount': loan.capital or 0.0,
-                            'disbursement_date': (loan.created_at and str(loan.created_at.date())
-                                                  if hasattr(loan.created_at, 'date')
-                                                  else loan.created_date) or False,
-                            'status': 'disbursed',
-                            'disbursement_method': 'bank_transfer',
-                        })
-                        created_disbs += 1
-
-            return {
-                'success': True,
-                'message': 'Imported from p2p successfully',
-                'created_applications': created_apps,
-                'updated_applications': updated_apps,
-                'created_disbursements': created_disbs,
-            }
+            counts = request.env['loan.application'].sudo()._import_from_p2p(full=bool(kwargs.get('full')))
+            return dict(counts, success=True, message='Imported from p2p successfully')
         except Exception as e:
             _logger.error(f'Error importing from p2p: {str(e)}')
             return {'success': False, 'message': str(e)}
@@ -1,2 +1,8 @@
+from . import bulk_transition
 from . import disbursement
 from . import loan_application
+from . import loan_application_schedule
+from . import loan_type
+from . import res_partner
+from . import borrower_mapping
+from . import p2p_import
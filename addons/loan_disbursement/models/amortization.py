@@ -0,0 +1,71 @@
+"""Sinh lịch trả nợ (gốc/lãi/dư nợ từng kỳ) cho nhiều khoản vay bằng NumPy.
+
+Mọi khoản vay được trải thành một mảng phẳng các kỳ (np.repeat theo kỳ hạn),
+rồi dư nợ sau kỳ k tính theo công thức đóng của niên kim:
+    B_k = P(1+r)^k - A((1+r)^k - 1)/r      (r > 0)
+    B_k = P - A*k                           (r = 0)
+nên không có vòng lặp Python theo khoản vay hay theo kỳ.
+"""
+import numpy as np
+
+
+def annuity_payments(principals, annual_rates, terms):
+    """Số tiền trả đều mỗi kỳ, cùng công thức với LoanApplication._compute_monthly_payment"""
+    principals = np.asarray(principals, dtype=np.float64)
+    rates = np.asarray(annual_rates, dtype=np.float64) / 100 / 12
+    terms = np.asarray(terms, dtype=np.int64)
+    growth = (1 + rates) ** terms
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payments = np.where(rates > 0,
+                            principals * rates * growth / (growth - 1),
+                            principals / np.maximum(terms, 1))
+    return np.where(terms > 0, payments, 0.0)
+
+
+def amortization_schedules(principals, annual_rates, terms):
+    """Lịch trả nợ phẳng của nhiều khoản vay.
+
+    :param principals: mảng số tiền gốc
+    :param annual_rates: mảng lãi suất năm (%)
+    :param terms: mảng kỳ hạn (tháng); khoản vay có kỳ hạn <= 0 không sinh dòng nào
+    :return: dict mảng cùng độ dài: 'index' (vị trí khoản vay trong đầu vào),
+             'period' (1..kỳ hạn), 'payment', 'principal', 'interest', 'balance'
+    """
+    principals = np.asarray(principals, dtype=np.float64)
+    annual_rates = np.asarray(annual_rates, dtype=np.float64)
+    terms = np.maximum(np.asarray(terms, dtype=np.int64), 0)
+    payments = annuity_payments(principals, annual_rates, terms)
+
+    index = np.repeat(np.arange(terms.size), terms)
+    # Số thứ tự kỳ 1..n của từng khoản vay trên mảng phẳng
+    starts = np.cumsum(terms) - terms
+    period = np.arange(index.size) - np.repeat(starts, terms) + 1
+
+    principal0 = principals[index]
+    rate = annual_rates[index] / 100 / 12
+    payment = payments[index]
+
+    def balance_after(k):
+        growth = (1 + rate) ** k
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annuity = np.where(rate > 0, (growth - 1) / rate, k)
+        return principal0 * growth - payment * annuity
+
+    opening = balance_after(period - 1)
+    interest = opening * rate
+    principal = payment - interest
+    balance = opening - principal
+
+    # Kỳ cuối trả hết phần dư để triệt sai số làm tròn
+    last = period == terms[index]
+    principal = np.where(last, opening, principal)
+    payment = np.where(last, opening + interest, payment)
+    balance = np.where(last, 0.0, np.maximum(balance, 0.0))
+    return {
+        'index': index,
+        'period': period,
+        'payment': payment,
+        'principal': principal,
+        'interest': interest,
+        'balance': balance,
+    }
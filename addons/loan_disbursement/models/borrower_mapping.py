@@ -0,0 +1,109 @@
+from odoo import models, fields, api
+from .res_partner import normalize_phone
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class LoanBorrowerMapping(models.Model):
+    """Ánh xạ mã người vay bên ngoài (server, p2p) sang res.partner"""
+    _name = 'loan.borrower.mapping'
+    _description = 'Loan Borrower Mapping'
+    _rec_name = 'external_id'
+
+    external_id = fields.Char('Mã người vay bên ngoài', required=True)
+    partner_id = fields.Many2one('res.partner', string='Người vay', required=True, ondelete='cascade', index=True)
+
+    _sql_constraints = [
+        ('external_id_uniq', 'unique(external_id)', 'Mỗi mã người vay bên ngoài chỉ gắn với một đối tác.'),
+    ]
+
+    @api.model
+    def _resolve_partners(self, borrowers, create_missing=True):
+        """Tìm người vay cho cả lô bằng một truy vấn, tạo các đối tác còn thiếu trong một lần create.
+
+        Thứ tự ưu tiên: bảng ánh xạ, ref của đối tác, số điện thoại chuẩn hóa.
+        Mã bên ngoài chưa có trong bảng ánh xạ được ghi thêm sau khi tìm thấy/tạo đối tác.
+
+        :param borrowers: list dict {'external_id', 'phone', 'name'} (các khóa đều tùy chọn)
+        :return: list res.partner cùng thứ tự (recordset rỗng nếu không tìm được/không tạo)
+        """
+        keys = []
+        for borrower in borrowers:
+            external_id = str(borrower.get('external_id') or '') or False
+            keys.append((external_id, normalize_phone(borrower.get('phone'))))
+        external_ids = list({external_id for external_id, _phone in keys if external_id})
+        phones = list({phone for _external_id, phone in keys if phone})
+
+        partner_model = self.env['res.partner'].sudo()
+        partner_model.flush_model(['ref', 'phone_normalized', 'active'])
+        self.flush_model()
+        by_mapping, by_ref, by_phone = {}, {}, {}
+        if external_ids or phones:
+            self.env.cr.execute("""
+                SELECT 'mapping', m.external_id, m.partner_id
+                  FROM loan_borrower_mapping m
+                 WHERE m.external_id = ANY(%(external_ids)s)
+                 UNION ALL
+                SELECT 'ref', p.ref, p.id
+                  FROM res_partner p
+                 WHERE p.ref = ANY(%(external_ids)s) AND p.active
+                 UNION ALL
+                SELECT 'phone', p.phone_normalized, p.id
+                  FROM res_partner p
+                 WHERE p.phone_normalized = ANY(%(phones)s) AND p.active
+                 ORDER BY 3
+            """, {'external_ids': external_ids, 'phones': phones})
+            targets = {'mapping': by_mapping, 'ref': by_ref, 'phone': by_phone}
+            for source, key, partner_id in self.env.cr.fetchall():
+                targets[source].setdefault(key, partner_id)
+
+        def lookup(external_id, phone):
+            return (external_id and (by_mapping.get(external_id) or by_ref.get(external_id))
+                    or (phone and by_phone.get(phone)))
+
+        if create_missing:
+            missing = {}
+            for borrower, (external_id, phone) in zip(borrowers, keys):
+                key = external_id or phone
+                if key and key not in missing and not lookup(external_id, phone):
+                    vals = {
+                        'name': borrower.get('name') or borrower.get('phone') or external_id or 'Unknown',
+                        'company_type': 'person',
+                    }
+                    if external_id:
+                        vals['ref'] = external_id
+                    if borrower.get('phone'):
+                        vals['phone'] = borrower['phone']
+                    missing[key] = vals
+            if missing:
+                for partner in partner_model.create(list(missing.values())):
+                    if partner.ref:
+                        by_ref.setdefault(partner.ref, partner.id)
+                    if partner.phone_normalized:
+                        by_phone.setdefault(partner.phone_normalized, partner.id)
+                _logger.info("Created %s borrower partners", len(missing))
+
+        new_mappings = {}
+        partner_ids = []
+        for external_id, phone in keys:
+            partner_id = lookup(external_id, phone)
+            partner_ids.append(partner_id)
+            if partner_id and external_id and external_id not in by_mapping:
+                new_mappings.setdefault(external_id, partner_id)
+        if new_mappings:
+            self.env.cr.execute("""
+                INSERT INTO loan_borrower_mapping (external_id, partner_id, create_uid, create_date, write_uid, write_date)
+                SELECT external_id, partner_id, %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+                  FROM unnest(%(external_ids)s::varchar[], %(partner_ids)s::int[]) AS m(external_id, partner_id)
+                ON CONFLICT (external_id) DO NOTHING
+            """, {
+                'external_ids': list(new_mappings),
+                'partner_ids': list(new_mappings.values()),
+                'uid': self.env.uid,
+            })
+            self.invalidate_model()
+
+        empty = self.env['res.partner']
+        partners = iter(empty.browse([partner_id for partner_id in partner_ids if partner_id]))
+        return [next(partners) if partner_id else empty for partner_id in partner_ids]
@@ -0,0 +1,56 @@
+from odoo import models, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Từ số bản ghi này trở lên, chuyển trạng thái ở chế độ hàng loạt:
+# không tracking/chatter từng bản ghi, chỉ một log tổng kết cho cả lô
+BULK_TRANSITION_THRESHOLD = 20
+# Số tên bản ghi tối đa liệt kê trong log tổng kết
+BULK_LOG_NAME_LIMIT = 50
+
+
+class LoanBulkTransitionMixin(models.AbstractModel):
+    _name = 'loan.bulk.transition.mixin'
+    _description = 'Loan Bulk Status Transition'
+
+    def _is_bulk_transition(self):
+        return len(self) >= BULK_TRANSITION_THRESHOLD or self.env.context.get('bulk_transition')
+
+    def _bulk_transition(self, from_states, vals, message):
+        """Chuyển các bản ghi đang ở from_states sang vals['status'] bằng một lần write.
+
+        Lô nhỏ giữ tracking và message_post từng bản ghi như trước; lô lớn (hoặc
+        context bulk_transition) tắt tracking và ghi một log tổng kết vào ir.logging.
+
+        :return: các bản ghi đã chuyển trạng thái
+        """
+        records = self.filtered(lambda record: record.status in from_states)
+        if not records:
+            return records
+        if not records._is_bulk_transition():
+            records.write(vals)
+            for record in records:
+                record.message_post(body=message)
+            return records
+        records.with_context(tracking_disable=True).write(vals)
+        records._log_bulk_transition(message)
+        return records
+
+    def _log_bulk_transition(self, message):
+        """Một dòng log cho cả lô thay cho tin nhắn chatter từng bản ghi"""
+        names = ', '.join(self[:BULK_LOG_NAME_LIMIT].mapped('display_name'))
+        if len(self) > BULK_LOG_NAME_LIMIT:
+            names += ', …'
+        summary = f"{message} ({len(self)} {self._description}, {self.env.user.name}): {names}"
+        _logger.info(summary)
+        self.env['ir.logging'].sudo().create({
+            'name': self._name,
+            'type': 'server',
+            'dbname': self.env.cr.dbname,
+            'level': 'INFO',
+            'message': summary,
+            'path': __name__,
+            'func': '_bulk_transition',
+            'line': '0',
+        })
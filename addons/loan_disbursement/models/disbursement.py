@@ -2,15 +2,173 @@ from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
 import logging
 import requests
+from odoo.addons.loan_config.models.server_client import LoanServerClient
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 _logger = logging.getLogger(__name__)
 
+# Hàng đợi gửi giải ngân lên server
+DISPATCH_BATCH_SIZE = 50
+DEFAULT_DISPATCH_CONCURRENCY = 8
+DISPATCH_MAX_ATTEMPTS = 5
+DISPATCH_BACKOFF_SECONDS = 60
+DISPATCH_MAX_BACKOFF_SECONDS = 3600
+# Thời gian giữ chỗ bản ghi đang được gửi, hết hạn thì cron gửi lại
+DISPATCH_LEASE_SECONDS = 600
+DISPATCH_TIMEOUT = 30
+# Mã HTTP nên thử lại (ngoài lỗi kết nối/timeout)
+_RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# Số giải ngân tối đa trong một lời gọi POST /loan/disburse/batch
+DISBURSE_BATCH_SIZE = 100
+# Mã HTTP cho biết server chưa có endpoint batch
+_BATCH_UNSUPPORTED_STATUS_CODES = {404, 405, 501}
+# Sau bao lâu (giây) thì thử lại endpoint batch với server đã báo không hỗ trợ
+_BATCH_RECHECK_SECONDS = 3600
+# URL endpoint batch -> thời điểm (monotonic) phát hiện server không hỗ trợ
+_batch_unsupported = {}
+# Đồng bộ trạng thái giải ngân lên server
+SYNC_BATCH_SIZE = 500
+SYNC_WATERMARK_PARAM = 'loan_disbursement.sync_watermark'
+# Chưa đẩy bản ghi ghi trong khoảng này (giây): transaction ghi chúng có thể chưa commit
+SYNC_SETTLE_SECONDS = 60
+
+
+def _send_disbursement(server_config, payload):
+    """Gửi một giải ngân lên server (chạy trong thread, không dùng env/cursor).
+
+    :return: dict outcome ('success', 'retry', 'failed'), data, message
+    """
+    headers = {'Idempotency-Key': payload['idempotency_key']} if payload.get('idempotency_key') else None
+    try:
+        response = LoanServerClient.from_config(server_config).post(
+            '/loan/disburse', payload, headers=headers, timeout=DISPATCH_TIMEOUT
+        )
+    except requests.RequestException as e:
+        _logger.warning(f"Disbursement {payload['disbursement_id']} dispatch error: {e}")
+        return {'outcome': 'retry', 'message': str(e)}
+
+    if response.status_code == 200:
+        try:
+            result = response.json()
+        except ValueError:
+            return {'outcome': 'retry', 'message': 'Invalid JSON response'}
+        if result.get('success'):
+            return {'outcome': 'success', 'data': result.get('data') or {}}
+        _logger.error(f"Server disbursement failed: {result.get('message')}")
+        return {'outcome': 'failed', 'message': result.get('message')}
+    _logger.error(f"Server API error: {response.status_code} - {response.text[:500]}")
+    outcome = 'retry' if response.status_code in _RETRYABLE_STATUS_CODES else 'failed'
+    return {'outcome': outcome, 'message': f"HTTP {response.status_code}"}
+
+
+def _batch_supported(endpoint):
+    marked_at = _batch_unsupported.get(endpoint)
+    return marked_at is None or time.monotonic() - marked_at > _BATCH_RECHECK_SECONDS
+
+
+def _send_disbursement_batch(client, payloads):
+    """Gửi một lô giải ngân trong một request.
+
+    Hợp đồng: POST /loan/disburse/batch {'items': [payload, ...]} trả về
+    {'success': true, 'data': {'results': [{'disbursement_id', 'success', 'data', 'message'}]}}.
+
+    :return: list kết quả theo thứ tự payloads, hoặc None nếu server không có endpoint batch
+    """
+    endpoint = f"{client.api_url}/loan/disburse/batch"
+    try:
+        response = client.post('/loan/disburse/batch', {'items': payloads}, timeout=DISPATCH_TIMEOUT, compress=True)
+    except requests.RequestException as e:
+        _logger.warning(f"Batch disbursement dispatch error: {e}")
+        return [{'outcome': 'retry', 'message': str(e)} for _payload in payloads]
+
+    if response.status_code in _BATCH_UNSUPPORTED_STATUS_CODES:
+        _logger.info(f"Loan server {client.api_url} has no batch disbursement endpoint, using single calls")
+        _batch_unsupported[endpoint] = time.monotonic()
+        return None
+    _batch_unsupported.pop(endpoint, None)
+    if response.status_code != 200:
+        _logger.error(f"Batch disbursement API error: {response.status_code} - {response.text[:500]}")
+        outcome = 'retry' if response.status_code in _RETRYABLE_STATUS_CODES else 'failed'
+        return [{'outcome': outcome, 'message': f"HTTP {response.status_code}"} for _payload in payloads]
+    try:
+        items = ((response.json() or {}).get('data') or {}).get('results') or []
+    except ValueError:
+        items = []
+
+    by_id = {str(item.get('disbursement_id')): item for item in items if isinstance(item, dict)}
+    results = []
+    for payload in payloads:
+        item = by_id.get(str(payload['disbursement_id']))
+        if item is None:
+            # Server không trả kết quả cho mục này: gửi lại sau (idempotency key chống trùng)
+            results.append({'outcome': 'retry', 'message': 'Missing result in batch response'})
+        elif item.get('success'):
+            results.append({'outcome': 'success', 'data': item.get('data') or {}})
+        else:
+            results.append({'outcome': 'failed', 'message': item.get('message')})
+    return results
+
+
+def send_disbursements(server_config, payloads, concurrency=DEFAULT_DISPATCH_CONCURRENCY):
+    """Gửi nhiều giải ngân: theo lô nếu server hỗ trợ, ngược lại từng lời gọi song song.
+
+    :param payloads: dict khóa -> payload (có 'disbursement_id' duy nhất)
+    :return: dict khóa -> kết quả (xem _send_disbursement)
+    """
+    client = LoanServerClient.from_config(server_config)
+    results = {}
+    pending = list(payloads.items())
+    if _batch_supported(f"{client.api_url}/loan/disburse/batch"):
+        while pending:
+            chunk, rest = pending[:DISBURSE_BATCH_SIZE], pending[DISBURSE_BATCH_SIZE:]
+            batch_results = _send_disbursement_batch(client, [payload for _key, payload in chunk])
+            if batch_results is None:
+                break
+            results.update((key, result) for (key, _payload), result in zip(chunk, batch_results))
+            pending = rest
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending)))) as executor:
+            futures = {key: executor.submit(_send_disbursement, server_config, payload) for key, payload in pending}
+            results.update((key, future.result()) for key, future in futures.items())
+    return results
+
+
+def _put_sync_batch(client, items):
+    """Đẩy một lô trạng thái giải ngân; True nếu server nhận cả lô.
+
+    Hợp đồng: PUT /loan/disbursement/sync/batch {'items': [sync_data, ...]} (thân gzip).
+    Server chưa có endpoint batch thì gửi từng PUT /loan/disbursement/sync như trước.
+    """
+    endpoint = f"{client.api_url}/loan/disbursement/sync/batch"
+    try:
+        if _batch_supported(endpoint):
+            response = client.put('/loan/disbursement/sync/batch', {'items': items},
+                                  timeout=DISPATCH_TIMEOUT, compress=True)
+            if response.status_code not in _BATCH_UNSUPPORTED_STATUS_CODES:
+                _batch_unsupported.pop(endpoint, None)
+                if response.status_code != 200:
+                    _logger.error(f"Batch sync API error: {response.status_code} - {response.text[:500]}")
+                return response.status_code == 200
+            _logger.info(f"Loan server {client.api_url} has no batch sync endpoint, using single calls")
+            _batch_unsupported[endpoint] = time.monotonic()
+        for item in items:
+            response = client.put('/loan/disbursement/sync', item, timeout=DISPATCH_TIMEOUT)
+            if response.status_code != 200:
+                _logger.error(f"Sync API error: {response.status_code} - {response.text[:500]}")
+                return False
+        return True
+    except requests.RequestException as e:
+        _logger.warning(f"Disbursement sync error: {e}")
+        return False
+
+
 class LoanDisbursement(models.Model):
     _name = 'loan.disbursement'
     _description = 'Loan Disbursement'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'loan.bulk.transition.mixin']
     _order = 'create_date desc'
 
     name = fields.Char('Mã giải ngân', required=True, copy=False, readonly=True, 
@@ -60,6 +218,12 @@ class LoanDisbursement(models.Model):
     ], string='Trạng thái Blockchain', default='pending', tracking=True)
     
     notes = fields.Text('Ghi chú')
+
+    # Hàng đợi gửi lên server
+    dispatch_idempotency_key = fields.Char('Idempotency Key', copy=False, readonly=True, index=True)
+    dispatch_attempts = fields.Integer('Số lần gửi lỗi', copy=False, readonly=True)
+    dispatch_next_attempt = fields.Datetime('Lần gửi kế tiếp', copy=False, readonly=True, index=True)
+    dispatch_error = fields.Text('Lỗi gửi gần nhất', copy=False, readonly=True)
     
     # Computed fields
     interest_amount = fields.Float('Tiền lãi', compute='_compute_interest', store=True)
@@ -78,114 +242,179 @@ class LoanDisbursement(models.Model):
         for record in self:
             record.total_amount = record.amount + record.interest_amount
     
-    @api.model
-    def create(self, vals):
-        if vals.get('name', _('New')) == _('New'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('loan.disbursement') or _('New')
-        return super(LoanDisbursement, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', _('New')) == _('New'):
+                vals['name'] = self.env['ir.sequence'].next_by_code('loan.disbursement') or _('New')
+        return super(LoanDisbursement, self).create(vals_list)
     
     def action_submit_for_approval(self):
         """Gửi yêu cầu phê duyệt"""
-        for record in self:
-            if record.status == 'draft':
-                record.status = 'pending'
-                record.message_post(body=_('Yêu cầu phê duyệt đã được gửi'))
+        self._bulk_transition(['draft'], {'status': 'pending'}, _('Yêu cầu phê duyệt đã được gửi'))
+        return True
     
     def action_approve(self):
         """Phê duyệt giải ngân"""
-        for record in self:
-            if record.status == 'pending':
-                record.status = 'approved'
-                record.approval_user_id = self.env.user.id
-                record.approval_date = fields.Datetime.now()
-                record.message_post(body=_('Đã được phê duyệt bởi %s') % self.env.user.name)
+        self._bulk_transition(['pending'], {
+            'status': 'approved',
+            'approval_user_id': self.env.user.id,
+            'approval_date': fields.Datetime.now(),
+        }, _('Đã được phê duyệt bởi %s') % self.env.user.name)
+        return True
     
     def action_reject(self):
         """Từ chối giải ngân"""
-        for record in self:
-            if record.status == 'pending':
-                record.status = 'rejected'
-                record.message_post(body=_('Đã bị từ chối bởi %s') % self.env.user.name)
+        self._bulk_transition(['pending'], {'status': 'rejected'},
+                              _('Đã bị từ chối bởi %s') % self.env.user.name)
+        return True
     
     def action_process_disbursement(self):
-        """Xử lý giải ngân - tích hợp với server hiện tại"""
-        for record in self:
-            if record.status == 'approved':
-                record.status = 'processing'
-                
-                try:
-                    # Gọi API server để xử lý giải ngân
-                    success = record._process_server_disbursement()
-                    if success:
-                        record.status = 'disbursed'
-                        record.message_post(body=_('Giải ngân thành công qua server'))
-                    else:
-                        record.status = 'approved'  # Rollback
-                        record.message_post(body=_('Giải ngân thất bại qua server'))
-                        
-                except Exception as e:
-                    record.status = 'approved'  # Rollback
-                    record.message_post(body=_('Lỗi xử lý giải ngân: %s') % str(e))
-                    _logger.error(f"Error processing disbursement: {str(e)}")
-    
-    def _process_server_disbursement(self):
-        """Xử lý giải ngân qua server hiện tại"""
-        try:
-            # Lấy cấu hình server
-            server_config = self.env['loan.config'].get_server_config()
-            if not server_config:
-                _logger.error("Server configuration not found")
-                return False
-            
-            # Chuẩn bị dữ liệu cho server
-            disbursement_data = {
-                'disbursement_id': self.name,
-                'loan_application_id': self.loan_application_id.name,
-                'borrower_id': str(self.borrower_id.id),
-                'amount': self.amount,
-                'disbursement_date': self.disbursement_date.strftime('%Y-%m-%d'),
-                'disbursement_method': self.disbursement_method,
-                'bank_account': self.bank_account,
-                'bank_name': self.bank_name,
-                'notes': self.notes
-            }
-            
-            # Gọi API server
-            response = requests.post(
-                f"{server_config['api_url']}/loan/disburse",
-                json=disbursement_data,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f"Bearer {server_config['api_key']}"
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    # Cập nhật thông tin từ server
-                    self.server_loan_id = result.get('data', {}).get('loan_id')
-                    self.server_investment_id = result.get('data', {}).get('investment_id')
-                    self.blockchain_tx_id = result.get('data', {}).get('blockchain_tx_id')
-                    return True
-                else:
-                    _logger.error(f"Server disbursement failed: {result.get('message')}")
-                    return False
-            else:
-                _logger.error(f"Server API error: {response.status_code} - {response.text}")
-                return False
-                
-        except Exception as e:
-            _logger.error(f"Error processing server disbursement: {str(e)}")
-            return False
-    
+        """Xử lý giải ngân - đưa vào hàng đợi gửi lên server hiện tại.
+
+        Bản ghi chuyển ngay sang 'processing' và được cron gửi song song ở nền,
+        nên request của người dùng không phải chờ server phản hồi.
+        """
+        approved = self.filtered(lambda record: record.status == 'approved')
+        if approved:
+            # Khóa idempotency gán một lần cho cả lô, giữ nguyên khóa đã có
+            approved.flush_recordset(['dispatch_idempotency_key'])
+            self.env.cr.execute("""
+                UPDATE loan_disbursement
+                   SET dispatch_idempotency_key = gen_random_uuid()::text
+                 WHERE id IN %s AND dispatch_idempotency_key IS NULL
+            """, (tuple(approved.ids),))
+            approved.invalidate_recordset(['dispatch_idempotency_key'])
+        records = approved._bulk_transition(['approved'], {
+            'status': 'processing',
+            'dispatch_attempts': 0,
+            'dispatch_next_attempt': fields.Datetime.now(),
+            'dispatch_error': False,
+        }, _('Đã đưa vào hàng đợi giải ngân qua server'))
+        if records:
+            self.env.ref('loan_disbursement.ir_cron_dispatch_disbursements').sudo()._trigger()
+        return True
+
+    def _prepare_dispatch_payload(self):
+        """Dữ liệu gửi lên server cho một giải ngân"""
+        self.ensure_one()
+        return {
+            'disbursement_id': self.name,
+            'idempotency_key': self.dispatch_idempotency_key,
+            'loan_application_id': self.loan_application_id.name,
+            'borrower_id': str(self.borrower_id.id),
+            'amount': self.amount,
+            'disbursement_date': self.disbursement_date.strftime('%Y-%m-%d') if self.disbursement_date else None,
+            'disbursement_method': self.disbursement_method,
+            'bank_account': self.bank_account,
+            'bank_name': self.bank_name,
+            'notes': self.notes
+        }
+
+    @api.model
+    def _get_dispatch_concurrency(self):
+        params = self.env['ir.config_parameter'].sudo()
+        return max(1, int(params.get_param('loan_disbursement.dispatch_concurrency', DEFAULT_DISPATCH_CONCURRENCY)))
+
+    @api.model
+    def _cron_dispatch_disbursements(self):
+        """Gửi các giải ngân đang 'processing' tới hạn lên server (theo lô hoặc song song có giới hạn).
+
+        Các bản ghi được nhận (claim) bằng SKIP LOCKED và dời hạn lần thử kế tiếp
+        rồi commit trước khi gọi HTTP, nên không giữ khóa DB trong lúc chờ server;
+        nếu worker chết giữa chừng, lần thử sau gửi lại cùng idempotency key.
+        """
+        server_config = self.env['loan.config'].get_server_config()
+        if not server_config:
+            _logger.warning("Disbursement dispatch skipped: server configuration not found")
+            return
+        self.env.cr.execute("""
+            SELECT id FROM loan_disbursement
+             WHERE status = 'processing' AND dispatch_next_attempt <= now() AT TIME ZONE 'UTC'
+          ORDER BY dispatch_next_attempt, id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (DISPATCH_BATCH_SIZE,))
+        records = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if not records:
+            return
+        payloads = {record.id: record._prepare_dispatch_payload() for record in records}
+        records.write({'dispatch_next_attempt': fields.Datetime.now() + timedelta(seconds=DISPATCH_LEASE_SECONDS)})
+        self.env.cr.commit()
+
+        results = send_disbursements(server_config, payloads, self._get_dispatch_concurrency())
+
+        for record in records._lock_processing():
+            record._apply_dispatch_result(results[record.id])
+        self.env.cr.commit()
+        remaining = self.search_count([('status', '=', 'processing'),
+                                       ('dispatch_next_attempt', '<=', fields.Datetime.now())])
+        self.env['ir.cron']._notify_progress(done=len(records), remaining=remaining)
+
+    def _lock_processing(self):
+        """Khóa (FOR UPDATE) và trả về các bản ghi trong self còn ở trạng thái 'processing'.
+
+        Trạng thái được đọc lại từ DB thay vì cache: server có thể đã gọi callback
+        trong lúc chờ phản hồi.
+        """
+        if not self:
+            return self
+        self.invalidate_recordset()
+        self.env.cr.execute("""
+            SELECT id FROM loan_disbursement
+             WHERE id IN %s AND status = 'processing'
+               FOR UPDATE
+        """, (tuple(self.ids),))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _apply_dispatch_result(self, result):
+        """Cập nhật giải ngân theo kết quả gửi: thành công, thử lại sau, hoặc trả về 'approved'.
+
+        self phải đã được khóa bằng _lock_processing.
+        """
+        self.ensure_one()
+        if self.status != 'processing':
+            return
+        if result['outcome'] == 'success':
+            self._mark_dispatch_success(result.get('data') or {})
+            return
+        attempts = self.dispatch_attempts + 1
+        if result['outcome'] == 'retry' and attempts < DISPATCH_MAX_ATTEMPTS:
+            delay = min(DISPATCH_BACKOFF_SECONDS * 2 ** (attempts - 1), DISPATCH_MAX_BACKOFF_SECONDS)
+            self.write({
+                'dispatch_attempts': attempts,
+                'dispatch_next_attempt': fields.Datetime.now() + timedelta(seconds=delay),
+                'dispatch_error': result.get('message'),
+            })
+            return
+        self._mark_dispatch_failure(result.get('message'), attempts)
+
+    def _mark_dispatch_success(self, data):
+        self.write({
+            'status': 'disbursed',
+            'server_loan_id': data.get('loan_id') or self.server_loan_id,
+            'server_investment_id': data.get('investment_id') or self.server_investment_id,
+            'blockchain_tx_id': data.get('blockchain_tx_id') or self.blockchain_tx_id,
+            'dispatch_error': False,
+        })
+        self.message_post(body=_('Giải ngân thành công qua server'))
+
+    def _mark_dispatch_failure(self, message, attempts=None):
+        """Thất bại không thử lại được: trả về 'approved' và bỏ idempotency key,
+        lần giải ngân sau là một yêu cầu mới"""
+        self.write({
+            'status': 'approved',  # Rollback
+            'dispatch_attempts': attempts if attempts is not None else self.dispatch_attempts,
+            'dispatch_error': message,
+            'dispatch_idempotency_key': False,
+        })
+        self.message_post(body=_('Giải ngân thất bại qua server: %s') % (message or ''))
+
     def action_cancel(self):
         """Hủy giải ngân"""
-        for record in self:
-            if record.status in ['draft', 'pending']:
-                record.status = 'cancelled'
-                record.message_post(body=_('Đã hủy bởi %s') % self.env.user.name)
+        self._bulk_transition(['draft', 'pending'], {'status': 'cancelled'},
+                              _('Đã hủy bởi %s') % self.env.user.name)
+        return True
     
     @api.constrains('amount')
     def _check_amount(self):
@@ -204,38 +433,88 @@ class LoanDisbursement(models.Model):
         return result
     
     # API methods để đồng bộ với server
+    def _prepare_sync_data(self):
+        self.ensure_one()
+        return {
+            'disbursement_id': self.name,
+            'status': self.status,
+            'approval_date': self.approval_date.strftime('%Y-%m-%d %H:%M:%S') if self.approval_date else None,
+            'disbursement_date': self.disbursement_date.strftime('%Y-%m-%d') if self.disbursement_date else None,
+            'blockchain_tx_id': self.blockchain_tx_id
+        }
+
+    def _push_sync_batch(self, client):
+        """Đẩy self (một lô) lên server, chỉ ghi log cho từng lô"""
+        success = _put_sync_batch(client, [record._prepare_sync_data() for record in self])
+        if success:
+            _logger.info("Disbursement sync: pushed %s records (%s … %s)",
+                         len(self), self[:1].name, self[-1:].name)
+        else:
+            _logger.warning("Disbursement sync: batch of %s records failed, will retry on next run", len(self))
+        return success
+
+    @api.model
+    def _post_sync_failure(self, synced):
+        """Một tin nhắn tổng kết cho cả lần chạy vào cấu hình server, chỉ khi có lô lỗi"""
+        config = self.env['loan.config'].sudo().search([('active', '=', True)], limit=1)
+        if config:
+            config.message_post(body=_(
+                'Lỗi đồng bộ giải ngân với server sau %(count)s bản ghi đã gửi, sẽ gửi lại ở lần chạy sau',
+                count=synced))
+
     def sync_with_server(self):
-        """Đồng bộ dữ liệu với server"""
-        for record in self:
-            try:
-                server_config = self.env['loan.config'].get_server_config()
-                if not server_config:
-                    continue
-                
-                # Gửi dữ liệu cập nhật lên server
-                sync_data = {
-                    'disbursement_id': record.name,
-                    'status': record.status,
-                    'approval_date': record.approval_date.strftime('%Y-%m-%d %H:%M:%S') if record.approval_date else None,
-                    'disbursement_date': record.disbursement_date.strftime('%Y-%m-%d') if record.disbursement_date else None,
-                    'blockchain_tx_id': record.blockchain_tx_id
-                }
-                
-                response = requests.put(
-                    f"{server_config['api_url']}/loan/disbursement/sync",
-                    json=sync_data,
-                    headers={
-                        'Content-Type': 'application/json',
-                        'Authorization': f"Bearer {server_config['api_key']}"
-                    },
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    record.message_post(body=_('Đồng bộ thành công với server'))
-                else:
-                    record.message_post(body=_('Lỗi đồng bộ với server'))
-                    
-            except Exception as e:
-                _logger.error(f"Error syncing disbursement: {str(e)}")
-                record.message_post(body=_('Lỗi đồng bộ: %s') % str(e))
+        """Đồng bộ trạng thái các giải ngân này với server theo lô; trả về số bản ghi đã gửi"""
+        client = self.env['loan.config'].get_server_client()
+        if not client:
+            return 0
+        synced = 0
+        for start in range(0, len(self), SYNC_BATCH_SIZE):
+            batch = self[start:start + SYNC_BATCH_SIZE]
+            if not batch._push_sync_batch(client):
+                self._post_sync_failure(synced)
+                break
+            synced += len(batch)
+        return synced
+
+    @api.model
+    def _cron_sync_with_server(self, full=False):
+        """Đẩy các giải ngân thay đổi kể từ lần đẩy thành công trước.
+
+        Watermark (write_date, id) lưu trong ir.config_parameter và chỉ tiến lên sau
+        khi server nhận cả lô, nên lô lỗi được gửi lại ở lần chạy sau.
+        write_date là thời điểm bắt đầu transaction, nên dòng của một transaction
+        dài hơn SYNC_SETTLE_SECONDS có thể commit sau khi watermark đã vượt qua;
+        full=True (cron hằng ngày) đẩy lại toàn bộ mà không dùng hay đổi watermark.
+        """
+        client = self.env['loan.config'].get_server_client()
+        if not client:
+            return
+        params = self.env['ir.config_parameter'].sudo()
+        last_date, last_id = '-infinity', 0
+        if not full:
+            last_date, _sep, last_id = (params.get_param(SYNC_WATERMARK_PARAM) or '').partition(',')
+            last_date, last_id = last_date or '-infinity', int(last_id or 0)
+        self.flush_model(['write_date'])
+        synced = 0
+        while True:
+            self.env.cr.execute("""
+                SELECT id, write_date::text
+                  FROM loan_disbursement
+                 WHERE (write_date, id) > (%s::timestamp, %s)
+                   AND write_date < (now() AT TIME ZONE 'UTC') - make_interval(secs => %s)
+                 ORDER BY write_date, id
+                 LIMIT %s
+            """, (last_date, last_id, SYNC_SETTLE_SECONDS, SYNC_BATCH_SIZE))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            if not self.browse([row[0] for row in rows])._push_sync_batch(client):
+                self._post_sync_failure(synced)
+                self.env.cr.commit()
+                break
+            last_id, last_date = rows[-1]
+            if not full:
+                params.set_param(SYNC_WATERMARK_PARAM, f"{last_date},{last_id}")
+            self.env.cr.commit()
+            synced += len(rows)
+        _logger.info("Disbursement sync%s: %s records pushed", " (full)" if full else "", synced)
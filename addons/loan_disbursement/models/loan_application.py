@@ -1,10 +1,16 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+# Các trường của loan.application quyết định lịch trả nợ
+SCHEDULE_FIELDS = {'approved_amount', 'loan_type_id', 'interest_rate', 'term_months',
+                   'disbursement_date', 'approval_date', 'application_date'}
+# Số khoản vay mỗi lô khi sinh lịch trả nợ
+SCHEDULE_BATCH_SIZE = 1000
+
 class LoanApplication(models.Model):
     _name = 'loan.application'
     _description = 'Loan Application'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'loan.bulk.transition.mixin']
     _order = 'create_date desc'
 
     name = fields.Char('Mã khoản vay', required=True, copy=False, readonly=True, 
@@ -16,8 +22,10 @@ class LoanApplication(models.Model):
     requested_amount = fields.Float('Số tiền yêu cầu', required=True, tracking=True)
     approved_amount = fields.Float('Số tiền được phê duyệt', tracking=True)
     
-    interest_rate = fields.Float('Lãi suất (%)', related='loan_type_id.interest_rate', store=True)
-    term_months = fields.Integer('Kỳ hạn (tháng)', related='loan_type_id.term_months', store=True)
+    # Sao chép từ loại khoản vay khi chọn loại; khi loại khoản vay đổi lãi suất/kỳ hạn,
+    # giá trị mới được đẩy xuống theo lô ở nền (loan.type.recompute.job)
+    interest_rate = fields.Float('Lãi suất (%)', compute='_compute_loan_type_terms', store=True)
+    term_months = fields.Integer('Kỳ hạn (tháng)', compute='_compute_loan_type_terms', store=True)
     
     purpose = fields.Text('Mục đích vay', tracking=True)
     
@@ -55,7 +63,14 @@ class LoanApplication(models.Model):
     # Related fields
     disbursement_ids = fields.One2many('loan.disbursement', 'loan_application_id', string='Giải ngân')
     disbursement_count = fields.Integer('Số lần giải ngân', compute='_compute_disbursement_count')
+    schedule_ids = fields.One2many('loan.application.schedule', 'application_id', string='Lịch trả nợ')
     
+    @api.depends('loan_type_id')
+    def _compute_loan_type_terms(self):
+        for record in self:
+            record.interest_rate = record.loan_type_id.interest_rate
+            record.term_months = record.loan_type_id.term_months
+
     @api.depends('approved_amount', 'interest_rate', 'term_months')
     def _compute_monthly_payment(self):
         for record in self:
@@ -95,33 +110,52 @@ class LoanApplication(models.Model):
         for record in self:
             record.disbursement_count = len(record.disbursement_ids)
     
-    @api.model
-    def create(self, vals):
-        if vals.get('name', _('New')) == _('New'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('loan.application') or _('New')
-        return super(LoanApplication, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', _('New')) == _('New'):
+                vals['name'] = self.env['ir.sequence'].next_by_code('loan.application') or _('New')
+        records = super(LoanApplication, self).create(vals_list)
+        if not self.env.context.get('skip_schedule_generation'):
+            records._generate_schedules()
+        return records
+
+    def write(self, vals):
+        result = super(LoanApplication, self).write(vals)
+        # skip_schedule_generation: nơi gọi ghi nhiều bản ghi tự sinh lịch một lần cho cả lô
+        if SCHEDULE_FIELDS.intersection(vals) and not self.env.context.get('skip_schedule_generation'):
+            self._generate_schedules()
+        return result
+
+    def _generate_schedules(self):
+        """Sinh lại lịch trả nợ cho các khoản vay đã có số tiền phê duyệt, theo lô"""
+        scheduled = self.filtered(lambda record: record.approved_amount or record.schedule_ids)
+        for start in range(0, len(scheduled), SCHEDULE_BATCH_SIZE):
+            self.env['loan.application.schedule']._regenerate(scheduled[start:start + SCHEDULE_BATCH_SIZE])
+        return True
+
+    def action_generate_schedule(self):
+        """Tạo lại lịch trả nợ"""
+        return self._generate_schedules()
     
     def action_submit(self):
         """Nộp đơn vay"""
-        for record in self:
-            if record.status == 'draft':
-                record.status = 'submitted'
-                record.message_post(body=_('Đơn vay đã được nộp'))
+        self._bulk_transition(['draft'], {'status': 'submitted'}, _('Đơn vay đã được nộp'))
+        return True
     
     def action_approve(self):
         """Phê duyệt khoản vay"""
-        for record in self:
-            if record.status in ['submitted', 'under_review']:
-                record.status = 'approved'
-                record.approval_date = fields.Date.today()
-                record.message_post(body=_('Khoản vay đã được phê duyệt'))
+        self._bulk_transition(['submitted', 'under_review'], {
+            'status': 'approved',
+            'approval_date': fields.Date.today(),
+        }, _('Khoản vay đã được phê duyệt'))
+        return True
     
     def action_reject(self):
         """Từ chối khoản vay"""
-        for record in self:
-            if record.status in ['submitted', 'under_review']:
-                record.status = 'rejected'
-                record.message_post(body=_('Khoản vay đã bị từ chối'))
+        self._bulk_transition(['submitted', 'under_review'], {'status': 'rejected'},
+                              _('Khoản vay đã bị từ chối'))
+        return True
     
     def action_disburse(self):
         """Tạo yêu cầu giải ngân"""
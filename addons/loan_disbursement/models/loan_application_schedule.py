@@ -0,0 +1,77 @@
+from odoo import models, fields, api
+from . import amortization
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class LoanApplicationSchedule(models.Model):
+    _name = 'loan.application.schedule'
+    _description = 'Loan Repayment Schedule Line'
+    _order = 'application_id, period'
+
+    application_id = fields.Many2one('loan.application', string='Khoản vay', required=True,
+                                     ondelete='cascade', index=True)
+    period = fields.Integer('Kỳ', required=True)
+    due_date = fields.Date('Ngày đến hạn')
+    payment = fields.Float('Số tiền trả')
+    principal = fields.Float('Tiền gốc')
+    interest = fields.Float('Tiền lãi')
+    balance = fields.Float('Dư nợ còn lại')
+
+    _sql_constraints = [
+        ('application_period_uniq', 'unique(application_id, period)',
+         'Mỗi kỳ của khoản vay chỉ có một dòng lịch trả nợ.'),
+    ]
+
+    @api.model
+    def _regenerate(self, applications):
+        """Sinh lại lịch trả nợ cho một lô khoản vay bằng một lần tính NumPy và một câu INSERT.
+
+        Khoản vay chưa có số tiền phê duyệt hoặc kỳ hạn sẽ bị xóa lịch cũ và không
+        sinh dòng mới. Ngày đến hạn tính từ ngày giải ngân (hoặc ngày phê duyệt,
+        ngày nộp đơn) cộng số kỳ, do PostgreSQL xử lý cuối tháng.
+        """
+        if not applications:
+            return 0
+        applications.flush_recordset(['approved_amount', 'interest_rate', 'term_months',
+                                      'disbursement_date', 'approval_date', 'application_date'])
+        self.env.cr.execute("""
+            SELECT id, approved_amount, interest_rate, term_months
+              FROM loan_application
+             WHERE id IN %s AND approved_amount > 0 AND term_months > 0
+        """, (tuple(applications.ids),))
+        rows = self.env.cr.fetchall()
+        self.env.cr.execute("DELETE FROM loan_application_schedule WHERE application_id IN %s",
+                            (tuple(applications.ids),))
+        if rows:
+            ids, principals, rates, terms = zip(*rows)
+            schedule = amortization.amortization_schedules(principals, [rate or 0 for rate in rates], terms)
+            application_ids = [ids[i] for i in schedule['index'].tolist()]
+            self.env.cr.execute("""
+                INSERT INTO loan_application_schedule
+                       (application_id, period, due_date, payment, principal, interest, balance,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT line.application_id, line.period,
+                       (COALESCE(app.disbursement_date, app.approval_date, app.application_date)
+                        + make_interval(months => line.period))::date,
+                       line.payment, line.principal, line.interest, line.balance,
+                       %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+                  FROM unnest(%(application_ids)s::int[], %(periods)s::int[], %(payments)s::float8[],
+                              %(principals)s::float8[], %(interests)s::float8[], %(balances)s::float8[])
+                       AS line(application_id, period, payment, principal, interest, balance)
+                  JOIN loan_application app ON app.id = line.application_id
+            """, {
+                'application_ids': application_ids,
+                'periods': schedule['period'].tolist(),
+                'payments': schedule['payment'].tolist(),
+                'principals': schedule['principal'].tolist(),
+                'interests': schedule['interest'].tolist(),
+                'balances': schedule['balance'].tolist(),
+                'uid': self.env.uid,
+            })
+        line_count = self.env.cr.rowcount if rows else 0
+        self.invalidate_model()
+        applications.invalidate_recordset(['schedule_ids'])
+        _logger.info("Regenerated repayment schedules for %s applications (%s lines)", len(rows), line_count)
+        return line_count
@@ -0,0 +1,128 @@
+from odoo import models, fields, api, _
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Các trường của loan.type được sao chép sang loan.application
+LOAN_TYPE_SCHEDULE_FIELDS = {'interest_rate', 'term_months'}
+# Số khoản vay cập nhật trong mỗi lô (mỗi lô một transaction)
+RECOMPUTE_CHUNK_SIZE = 500
+# Dưới ngưỡng này cập nhật luôn trong request lưu loại khoản vay
+RECOMPUTE_SYNC_LIMIT = 200
+# Thời gian tối đa (giây) của một lần chạy cron trước khi nhường và tự kích hoạt lại
+RECOMPUTE_TIME_BUDGET = 60
+
+
+class LoanType(models.Model):
+    _inherit = 'loan.type'
+
+    recompute_job_ids = fields.One2many('loan.type.recompute.job', 'loan_type_id', string='Cập nhật khoản vay')
+
+    def write(self, vals):
+        result = super(LoanType, self).write(vals)
+        if LOAN_TYPE_SCHEDULE_FIELDS.intersection(vals):
+            self.env['loan.type.recompute.job'].sudo()._enqueue(self)
+        return result
+
+
+class LoanTypeRecomputeJob(models.Model):
+    """Cập nhật lãi suất/kỳ hạn mới của loan.type xuống các khoản vay theo lô ở nền.
+
+    Khoản vay giữ giá trị cũ (cùng khoản trả hàng tháng, lịch trả nợ) cho tới khi
+    lô chứa nó được xử lý; mỗi lô là một transaction riêng và tắt tracking.
+    """
+    _name = 'loan.type.recompute.job'
+    _description = 'Loan Type Recompute Job'
+    _order = 'create_date desc, id desc'
+    _rec_name = 'loan_type_id'
+
+    loan_type_id = fields.Many2one('loan.type', string='Loại khoản vay', required=True, ondelete='cascade', index=True)
+    state = fields.Selection([
+        ('pending', 'Đang chờ'),
+        ('running', 'Đang chạy'),
+        ('done', 'Hoàn thành'),
+    ], string='Trạng thái', default='pending', required=True, index=True)
+    total_count = fields.Integer('Tổng số khoản vay')
+    done_count = fields.Integer('Đã cập nhật')
+    last_application_id = fields.Integer('ID khoản vay cuối đã xử lý', default=0)
+    progress = fields.Float('Tiến độ (%)', compute='_compute_progress')
+    date_done = fields.Datetime('Hoàn thành lúc')
+
+    @api.depends('total_count', 'done_count', 'state')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done' or not job.total_count:
+                job.progress = 100.0 if job.state == 'done' else 0.0
+            else:
+                job.progress = min(100.0, job.done_count * 100.0 / job.total_count)
+
+    def _get_application_domain(self):
+        self.ensure_one()
+        return [('loan_type_id', '=', self.loan_type_id.id), ('id', '>', self.last_application_id)]
+
+    @api.model
+    def _enqueue(self, loan_types):
+        """Tạo (hoặc khởi động lại) job cho các loại khoản vay vừa đổi lãi suất/kỳ hạn"""
+        applications = self.env['loan.application'].sudo()
+        jobs = self.browse()
+        for loan_type in loan_types:
+            total = applications.search_count([('loan_type_id', '=', loan_type.id)])
+            job = self.search([('loan_type_id', '=', loan_type.id), ('state', '!=', 'done')], limit=1)
+            vals = {'state': 'pending', 'total_count': total, 'done_count': 0, 'last_application_id': 0}
+            if job:
+                job.write(vals)
+            else:
+                job = self.create(dict(vals, loan_type_id=loan_type.id))
+            jobs |= job
+
+        small_jobs = jobs.filtered(lambda job: job.total_count <= RECOMPUTE_SYNC_LIMIT)
+        for job in small_jobs:
+            while job._process_chunk():
+                pass
+        if jobs - small_jobs:
+            self.env.ref('loan_disbursement.ir_cron_loan_type_recompute').sudo()._trigger()
+        return jobs
+
+    def _process_chunk(self):
+        """Cập nhật lô khoản vay tiếp theo của job; trả về False khi job đã xong"""
+        self.ensure_one()
+        loan_type = self.loan_type_id
+        applications = self.env['loan.application'].sudo().search(
+            self._get_application_domain(), order='id', limit=RECOMPUTE_CHUNK_SIZE)
+        if not applications:
+            self.write({'state': 'done', 'date_done': fields.Datetime.now(), 'done_count': self.total_count})
+            loan_type.sudo().message_post(body=_(
+                'Đã cập nhật lãi suất %(rate)s%% và kỳ hạn %(term)s tháng cho %(count)s khoản vay',
+                rate=loan_type.interest_rate, term=loan_type.term_months, count=self.total_count))
+            return False
+
+        # Ghi thẳng giá trị mới: các trường tính toán phụ thuộc và lịch trả nợ được
+        # tính lại cho riêng lô này, không sinh tracking/chatter cho từng khoản vay
+        applications.with_context(tracking_disable=True).write({
+            'interest_rate': loan_type.interest_rate,
+            'term_months': loan_type.term_months,
+        })
+        self.write({
+            'state': 'running',
+            'done_count': self.done_count + len(applications),
+            'last_application_id': applications[-1].id,
+        })
+        return True
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Xử lý các job theo lô, commit sau mỗi lô để giá trị mới hiện dần và không giữ khóa lâu"""
+        started = time.monotonic()
+        jobs = self.search([('state', '!=', 'done')], order='id')
+        done = 0
+        for job in jobs:
+            while time.monotonic() - started < RECOMPUTE_TIME_BUDGET:
+                has_more = job._process_chunk()
+                self.env.cr.commit()
+                if not has_more:
+                    done += 1
+                    break
+        remaining = self.search_count([('state', '!=', 'done')])
+        _logger.info("Loan type recompute: %s jobs finished, %s remaining", done, remaining)
+        self.env['ir.cron']._notify_progress(done=done, remaining=remaining)
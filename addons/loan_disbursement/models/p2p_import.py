@@ -0,0 +1,164 @@
+from odoo import models, fields, api
+from datetime import timedelta
+from .disbursement import SYNC_SETTLE_SECONDS
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Watermark (write_date, id) của p2p.loan đã nhập sang loan.application
+P2P_IMPORT_WATERMARK_PARAM = 'loan_disbursement.p2p_import_watermark'
+# Số p2p.loan xử lý mỗi lô (cron commit sau mỗi lô)
+P2P_IMPORT_CHUNK_SIZE = 500
+# Chỉ nhập các dòng có write_date cũ hơn khoảng này (giây), giống đồng bộ giải ngân:
+# write_date là thời điểm bắt đầu transaction nên dòng mới hơn có thể chưa commit hết
+P2P_IMPORT_SETTLE_SECONDS = SYNC_SETTLE_SECONDS
+P2P_APPLICATION_STATUS = {
+    'waiting': 'submitted',
+    'success': 'approved',
+    'clean': 'disbursed',
+    'fail': 'rejected'
+}
+
+
+def map_p2p_status_to_application(p2p_status):
+    return P2P_APPLICATION_STATUS.get((p2p_status or '').lower(), 'submitted')
+
+
+class LoanApplication(models.Model):
+    _inherit = 'loan.application'
+
+    @api.model
+    def _import_from_p2p(self, full=False, commit=False):
+        """Nhập các p2p.loan thay đổi kể từ watermark sang loan.application/loan.disbursement.
+
+        :param full: bỏ qua watermark, nhập lại toàn bộ
+        :param commit: commit sau mỗi lô (chỉ dùng trong cron)
+        :return: dict số khoản vay tạo mới/cập nhật và số giải ngân tạo mới
+        """
+        counts = {'created_applications': 0, 'updated_applications': 0, 'created_disbursements': 0}
+        if 'p2p.loan' not in self.env:
+            return counts
+        params = self.env['ir.config_parameter'].sudo()
+        watermark = '' if full else params.get_param(P2P_IMPORT_WATERMARK_PARAM) or ''
+        last_date, _sep, last_id = watermark.partition(',')
+        last_date, last_id = last_date or '-infinity', int(last_id or 0)
+
+        self.env['p2p.loan'].flush_model(['write_date'])
+        while True:
+            self.env.cr.execute("""
+                SELECT id, write_date::text
+                  FROM p2p_loan
+                 WHERE (write_date, id) > (%s::timestamp, %s)
+                   AND write_date < (now() AT TIME ZONE 'UTC') - make_interval(secs => %s)
+                 ORDER BY write_date, id
+                 LIMIT %s
+            """, (last_date, last_id, P2P_IMPORT_SETTLE_SECONDS, P2P_IMPORT_CHUNK_SIZE))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            for key, value in self._import_p2p_chunk(self.env['p2p.loan'].sudo().browse([row[0] for row in rows])).items():
+                counts[key] += value
+            last_id, last_date = rows[-1]
+            params.set_param(P2P_IMPORT_WATERMARK_PARAM, f"{last_date},{last_id}")
+            if commit:
+                self.env.cr.commit()
+        if commit:
+            # Các dòng còn trong khoảng chờ: chạy lại cron khi chúng đã ổn định
+            self.env.cr.execute("SELECT 1 FROM p2p_loan WHERE (write_date, id) > (%s::timestamp, %s) LIMIT 1",
+                                (last_date, last_id))
+            if self.env.cr.fetchone():
+                self.env.ref('loan_disbursement.ir_cron_import_from_p2p')._trigger(
+                    fields.Datetime.now() + timedelta(seconds=P2P_IMPORT_SETTLE_SECONDS))
+        _logger.info("P2P import: %s", counts)
+        return counts
+
+    @api.model
+    def _import_p2p_chunk(self, p2p_loans):
+        """Nhập một lô p2p.loan: tra cứu gộp bằng domain `in`, tạo mới bằng một lần create"""
+        loans = {}
+        for loan in p2p_loans:
+            contract_id = loan.contractId or loan.loan_id
+            if contract_id:
+                loans[contract_id] = loan
+        counts = {'created_applications': 0, 'updated_applications': 0, 'created_disbursements': 0}
+        if not loans:
+            return counts
+        contract_ids = list(loans)
+        app_model = self.sudo()
+        disb_model = self.env['loan.disbursement'].sudo()
+
+        borrower_refs = list({loan.borrower_id for loan in loans.values() if loan.borrower_id})
+        borrowers = dict(zip(borrower_refs, self.env['loan.borrower.mapping'].sudo()._resolve_partners(
+            [{'external_id': ref, 'name': ref} for ref in borrower_refs])))
+
+        applications = {}
+        for application in app_model.search(['|', ('blockchain_contract_id', 'in', contract_ids),
+                                                  ('name', 'in', contract_ids)]):
+            if application.blockchain_contract_id:
+                applications.setdefault(application.blockchain_contract_id, application)
+            applications.setdefault(application.name, application)
+        loan_type = self.env['loan.type'].sudo().search([], limit=1)
+
+        updated = app_model.browse()
+        new_contract_ids, create_vals_list = [], []
+        for contract_id, loan in loans.items():
+            borrower = borrowers.get(loan.borrower_id)
+            app_vals = {
+                'name': contract_id,
+                'borrower_id': borrower.id if borrower else False,
+                'requested_amount': loan.capital or 0.0,
+                'approved_amount': loan.capital or 0.0,
+                'interest_rate': loan.interest_rate or 0.0,
+                'term_months': loan.term_months or 0,
+                'purpose': loan.willing or loan.description or '',
+                'status': map_p2p_status_to_application(loan.status),
+                'application_date': (loan.created_at and str(loan.created_at)) or False,
+                'blockchain_contract_id': contract_id,
+            }
+            application = applications.get(contract_id)
+            if application:
+                application.with_context(skip_schedule_generation=True).write(app_vals)
+                updated |= application
+            else:
+                if loan_type:
+                    app_vals['loan_type_id'] = loan_type.id
+                new_contract_ids.append(contract_id)
+                create_vals_list.append(app_vals)
+        if create_vals_list:
+            applications.update(zip(new_contract_ids, app_model.create(create_vals_list)))
+        # Lịch trả nợ của các khoản vay vừa cập nhật: sinh theo lô thay vì sau từng write
+        # (khoản vay mới đã được sinh lịch trong create)
+        updated._generate_schedules()
+
+        clean_ids = [contract_id for contract_id, loan in loans.items() if loan.status == 'clean']
+        disbursed = set()
+        if clean_ids:
+            disbursed = set(disb_model.search([('server_loan_id', 'in', clean_ids)]).mapped('server_loan_id'))
+        disb_vals_list = []
+        for contract_id in clean_ids:
+            if contract_id in disbursed:
+                continue
+            loan = loans[contract_id]
+            borrower = borrowers.get(loan.borrower_id)
+            disb_vals_list.append({
+                'server_loan_id': contract_id,
+                'loan_application_id': applications[contract_id].id,
+                'borrower_id': borrower.id if borrower else False,
+                'amount': loan.capital or 0.0,
+                'disbursement_date': (loan.created_at and str(loan.created_at.date())
+                                      if hasattr(loan.created_at, 'date')
+                                      else loan.created_date) or False,
+                'status': 'disbursed',
+                'disbursement_method': 'bank_transfer',
+            })
+        if disb_vals_list:
+            disb_model.create(disb_vals_list)
+
+        counts.update(created_applications=len(create_vals_list), updated_applications=len(updated),
+                      created_disbursements=len(disb_vals_list))
+        return counts
+
+    @api.model
+    def _cron_import_from_p2p(self):
+        """Nhập p2p.loan thay đổi sau lần đồng bộ MongoDB, commit theo lô"""
+        self._import_from_p2p(commit=True)
@@ -0,0 +1,22 @@
+from odoo import models, fields, api
+import re
+
+
+def normalize_phone(phone):
+    """Chuẩn hóa số điện thoại để so khớp: chỉ giữ chữ số, đầu số 84 đổi về 0"""
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('84') and len(digits) >= 11:
+        digits = '0' + digits[2:]
+    return digits or False
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    phone_normalized = fields.Char('Số điện thoại chuẩn hóa', compute='_compute_phone_normalized',
+                                   store=True, index=True)
+
+    @api.depends('phone')
+    def _compute_phone_normalized(self):
+        for partner in self:
+            partner.phone_normalized = normalize_phone(partner.phone)
@@ -0,0 +1,3 @@
+from . import test_amortization
+from . import test_phone_normalization
+from . import test_batch_api
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from odoo.tests import BaseCase, tagged
+from odoo.addons.loan_disbursement.models.amortization import annuity_payments, amortization_schedules
+
+
+@tagged('loan_disbursement')
+class TestAmortization(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        # 12 triệu, 12%/năm, 12 tháng; 1200 lãi 0%, 3 tháng; khoản kỳ hạn 0 không sinh lịch
+        self.principals = [12000000, 1200, 5000]
+        self.rates = [12, 0, 10]
+        self.terms = [12, 3, 0]
+
+    def test_annuity_payments(self):
+        np.testing.assert_allclose(annuity_payments(self.principals, self.rates, self.terms),
+                                   [1066185.4641401002, 400, 0])
+
+    def test_schedule_layout(self):
+        schedule = amortization_schedules(self.principals, self.rates, self.terms)
+        np.testing.assert_array_equal(schedule['index'], [0] * 12 + [1] * 3)
+        np.testing.assert_array_equal(schedule['period'], list(range(1, 13)) + [1, 2, 3])
+        for values in schedule.values():
+            self.assertEqual(values.size, 15)
+
+    def test_annuity_schedule(self):
+        schedule = amortization_schedules(self.principals, self.rates, self.terms)
+        loan = schedule['index'] == 0
+        interest, principal, balance = schedule['interest'][loan], schedule['principal'][loan], schedule['balance'][loan]
+        # Kỳ đầu: lãi = 12 triệu x 1%, gốc = số tiền trả đều - lãi
+        self.assertAlmostEqual(interest[0], 120000.0, places=6)
+        self.assertAlmostEqual(principal[0], 946185.4641401002, places=6)
+        self.assertAlmostEqual(balance[0], 11053814.5358599, places=4)
+        # Kỳ cuối trả hết dư nợ, tổng gốc đúng bằng số tiền vay
+        self.assertEqual(balance[-1], 0.0)
+        self.assertAlmostEqual(principal.sum(), 12000000, places=4)
+        self.assertAlmostEqual(interest.sum(), 794225.5696812058, places=4)
+        np.testing.assert_allclose(schedule['payment'][loan], 1066185.4641401002)
+        self.assertTrue((np.diff(balance) < 0).all())
+
+    def test_zero_rate_schedule(self):
+        schedule = amortization_schedules(self.principals, self.rates, self.terms)
+        loan = schedule['index'] == 1
+        np.testing.assert_allclose(schedule['payment'][loan], [400, 400, 400])
+        np.testing.assert_allclose(schedule['principal'][loan], [400, 400, 400])
+        np.testing.assert_allclose(schedule['interest'][loan], [0, 0, 0])
+        np.testing.assert_allclose(schedule['balance'][loan], [800, 400, 0])
+
+    def test_empty(self):
+        schedule = amortization_schedules([], [], [])
+        self.assertEqual(schedule['index'].size, 0)
+        self.assertEqual(schedule['balance'].size, 0)
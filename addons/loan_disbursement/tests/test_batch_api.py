@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('post_install', '-at_install', 'loan_disbursement')
+class TestDisbursementBatchApi(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        loan_type = cls.env['loan.type'].create({
+            'name': 'Vay tiêu dùng',
+            'code': 'TEST_BATCH',
+            'interest_rate': 12.0,
+            'term_months': 12,
+        })
+        borrower = cls.env['res.partner'].create({'name': 'Người vay batch'})
+        application = cls.env['loan.application'].with_context(skip_schedule_generation=True).create({
+            'borrower_id': borrower.id,
+            'loan_type_id': loan_type.id,
+            'requested_amount': 10000000,
+            'approved_amount': 10000000,
+        })
+        cls.pending = cls.env['loan.disbursement'].create([{
+            'loan_application_id': application.id,
+            'amount': 1000000,
+            'status': 'pending',
+        } for _i in range(3)])
+        cls.approved = cls.env['loan.disbursement'].create({
+            'loan_application_id': application.id,
+            'amount': 1000000,
+            'status': 'approved',
+        })
+        cls.missing_id = cls.approved.id + 1000
+
+    def _call(self, action, **params):
+        self.authenticate('admin', 'admin')
+        return self.make_jsonrpc_request(f'/api/loan/disbursements/{action}/batch', params)
+
+    def test_approve_batch_results_per_id(self):
+        ids = self.pending.ids + [self.approved.id, self.missing_id]
+        response = self._call('approve', disbursement_ids=ids)
+
+        self.assertTrue(response['success'])
+        self.assertEqual(response['data']['succeeded'], 3)
+        self.assertEqual(response['data']['failed'], 2)
+        results = {result['id']: result for result in response['data']['results']}
+        self.assertEqual([result['id'] for result in response['data']['results']], ids)
+        for disbursement in self.pending:
+            self.assertTrue(results[disbursement.id]['success'])
+            self.assertEqual(results[disbursement.id]['status'], 'approved')
+            self.assertTrue(results[disbursement.id]['approval_date'])
+        self.assertEqual(results[self.approved.id],
+                         {'id': self.approved.id, 'success': False, 'error': 'Disbursement is not in pending status'})
+        self.assertEqual(results[self.missing_id],
+                         {'id': self.missing_id, 'success': False, 'error': 'Disbursement not found'})
+        self.pending.invalidate_recordset(['status'])
+        self.assertEqual(set(self.pending.mapped('status')), {'approved'})
+
+    def test_reject_batch_posts_reason(self):
+        rejected, untouched = self.pending[:2], self.pending[2]
+        response = self._call('reject', disbursement_ids=rejected.ids + [self.approved.id],
+                              reason='Thiếu hồ sơ')
+
+        self.assertEqual(response['data']['succeeded'], 2)
+        self.assertEqual(response['data']['failed'], 1)
+        (rejected | untouched | self.approved).invalidate_recordset()
+        self.assertEqual(set(rejected.mapped('status')), {'rejected'})
+        self.assertEqual(untouched.status, 'pending')
+        self.assertEqual(self.approved.status, 'approved')
+        for disbursement in rejected:
+            self.assertTrue(disbursement.message_ids.filtered(
+                lambda message: 'Lý do từ chối: Thiếu hồ sơ' in message.body))
+        self.assertFalse(self.approved.message_ids.filtered(lambda message: 'Thiếu hồ sơ' in message.body))
+
+    def test_invalid_payload(self):
+        self.assertFalse(self._call('approve', disbursement_ids=[])['success'])
+        self.assertEqual(self._call('approve', disbursement_ids=['abc'])['error'],
+                         'disbursement_ids must contain integers')
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import BaseCase, tagged
+from odoo.addons.loan_disbursement.models.res_partner import normalize_phone
+
+
+@tagged('loan_disbursement')
+class TestPhoneNormalization(BaseCase):
+
+    def test_strip_formatting(self):
+        self.assertEqual(normalize_phone('0912-345-678'), '0912345678')
+        self.assertEqual(normalize_phone('(091) 234.5678'), '0912345678')
+
+    def test_country_code(self):
+        self.assertEqual(normalize_phone('+84 912 345 678'), '0912345678')
+        self.assertEqual(normalize_phone('84912345678'), '0912345678')
+        # Quá ngắn để là số có mã quốc gia: giữ nguyên
+        self.assertEqual(normalize_phone('84'), '84')
+        self.assertEqual(normalize_phone('8412345'), '8412345')
+
+    def test_empty(self):
+        self.assertFalse(normalize_phone(''))
+        self.assertFalse(normalize_phone(None))
+        self.assertFalse(normalize_phone(False))
+        self.assertFalse(normalize_phone('không có'))
@@ -10,7 +10,9 @@
         "views/investor_views.xml",
         "views/custom_templates.xml",
         "views/menu_views.xml",
+        "views/loan_report_views.xml",
         "wizard/sync_wizard_view.xml",
+        "wizard/export_wizard_view.xml",
         "data/ir_cron.xml"
     ],
     "installable": True,
@@ -0,0 +1,51 @@
+import logging
+from datetime import datetime
+
+from odoo import http
+from odoo.http import request, content_disposition
+from werkzeug.exceptions import NotFound
+
+from ..models import data_export
+
+_logger = logging.getLogger(__name__)
+
+_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class P2PExportController(http.Controller):
+
+    @http.route('/p2p_bridge/export/<string:dataset>.<string:file_format>', type='http', auth='user')
+    def export_dataset(self, dataset, file_format, **kwargs):
+        """Tải về toàn bộ một tập dữ liệu dạng luồng (chunked), không dựng file trong bộ nhớ"""
+        if dataset not in data_export.EXPORT_DATASETS or file_format not in _CONTENT_TYPES:
+            raise NotFound()
+        if file_format == 'parquet' and not data_export.parquet_available():
+            return request.make_response("pyarrow is not installed on the server", status=501)
+        model_name, table, columns = data_export.EXPORT_DATASETS[dataset]
+        request.env[model_name].check_access('read')
+
+        if table:
+            request.env[model_name].flush_model()
+            batches = data_export.iter_table_batches(request.env.cr.dbname, table, columns)
+        else:
+            batches = self._iter_transaction_batches(columns)
+        writer = data_export.stream_parquet if file_format == 'parquet' else data_export.stream_csv
+
+        filename = f"p2p_{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+        _logger.info("Streaming %s export of %s for user %s", file_format, dataset, request.env.uid)
+        return request.make_response(writer(batches, columns), headers=[
+            ('Content-Type', _CONTENT_TYPES[file_format]),
+            ('Content-Disposition', content_disposition(filename)),
+            ('Cache-Control', 'no-store'),
+        ])
+
+    def _iter_transaction_batches(self, columns):
+        from ..models.mongo_service import MongoService
+        mongo = MongoService()
+        try:
+            yield from data_export.iter_mongo_batches(mongo.iter_transactions(), columns)
+        finally:
+            mongo.close_connection()
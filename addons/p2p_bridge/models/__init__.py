@@ -1,2 +1,4 @@
 from . import bridge
 from . import mongo_service
+from . import loan_daily_stat
+from . import loan_report
@@ -1,9 +1,25 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.tools import config, str2bool
 from .mongo_service import MongoService
+from .loan_daily_stat import ROLLUP_LOAN_FIELDS, SKETCH_LOAN_FIELDS
+from . import loan_columns
 import logging
+import os
 
 _logger = logging.getLogger(__name__)
 
+# Khóa trong cr.cache chứa các số liệu dẫn xuất từ p2p.loan (xem _get_loan_memo)
+LOAN_MEMO_CACHE_KEY = 'p2p.loan.memo'
+
+# Số dòng log phiên bản giữ lại sau mỗi lần tăng
+DATA_VERSION_LOG_KEEP = 1000
+DATA_VERSION_SQL = "SELECT COALESCE(MAX(version), 0) FROM p2p_data_version_log"
+# Các trường p2p.loan mà dashboard, cột xuất và stress test đọc; ghi các trường
+# khác (last_sync, description, amount, ...) không tăng phiên bản dữ liệu
+DATA_VERSION_LOAN_FIELDS = frozenset(ROLLUP_LOAN_FIELDS) | frozenset(SKETCH_LOAN_FIELDS) | {
+    'maturity_date', 'monthly_pay',
+}
+
 # Local mapping to keep status values compatible with Odoo selection
 _P2P_ALLOWED_STATUSES = {"waiting", "success", "clean", "fail"}
 _P2P_STATUS_MAP = {
@@ -37,6 +53,119 @@ class P2PBridge(models.Model):
     wallet_balance = fields.Float(compute="_compute_wallet_balance", string='Wallet Balance')
     last_sync = fields.Datetime(string='Last Sync', default=fields.Datetime.now)
 
+    def init(self):
+        # Bộ đếm phiên bản dữ liệu, dùng làm khóa cho các cache phân tích.
+        # Mỗi lần tăng được ghi vào bảng log để việc đọc phiên bản đi theo
+        # snapshot của transaction (last_value của sequence thì không).
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS p2p_data_version_seq")
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS p2p_data_version_log (version bigint PRIMARY KEY)
+        """)
+        self.env.cr.execute("""
+            INSERT INTO p2p_data_version_log (version)
+            SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM p2p_data_version_seq
+            ON CONFLICT DO NOTHING
+        """)
+
+    @api.model
+    def _get_data_version(self):
+        """Phiên bản dữ liệu khoản vay mà transaction hiện tại nhìn thấy.
+
+        Dòng log của một phiên bản chỉ được commit sau dữ liệu của nó, nên mọi
+        transaction đọc được phiên bản V cũng đã thấy dữ liệu ứng với V.
+        """
+        self.env.cr.execute(DATA_VERSION_SQL)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _schedule_data_version_bump(self):
+        """Tăng phiên bản dữ liệu ngay sau khi transaction hiện tại được commit.
+
+        Chỉ đăng ký một lần cho mỗi transaction; nextval chạy trên cursor riêng
+        sau commit nên các worker khác không thấy phiên bản mới trước dữ liệu mới.
+        Bộ nhớ tạm của _get_loan_memo bị xóa ở mỗi lần gọi vì dữ liệu trong
+        transaction này đã đổi dù phiên bản chưa tăng.
+        """
+        self.env.cr.cache.pop(LOAN_MEMO_CACHE_KEY, None)
+        postcommit = self.env.cr.postcommit
+        if postcommit.data.get('p2p.data_version.bump'):
+            return
+        postcommit.data['p2p.data_version.bump'] = True
+        registry = self.env.registry
+        export_columns = self._loan_columns_enabled()
+
+        @postcommit.add
+        def bump_data_version():
+            with registry.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO p2p_data_version_log (version)
+                    VALUES (nextval('p2p_data_version_seq'))
+                    RETURNING version
+                """)
+                version = cr.fetchone()[0]
+                cr.execute("DELETE FROM p2p_data_version_log WHERE version <= %s",
+                           [version - DATA_VERSION_LOG_KEEP])
+                if export_columns:
+                    # Bản chụp dạng cột được xuất lại ở cron, không chặn request hiện tại
+                    cron = api.Environment(cr, SUPERUSER_ID, {}).ref(
+                        'p2p_bridge.ir_cron_export_loan_columns', raise_if_not_found=False)
+                    if cron:
+                        cron._trigger()
+
+    @api.model
+    def _get_loan_memo(self, namespace):
+        """Bộ nhớ tạm theo cursor cho số liệu dẫn xuất từ p2p.loan.
+
+        Gắn với phiên bản dữ liệu hiện tại và bị xóa khi p2p.loan được ghi
+        trong cùng transaction.
+        """
+        memo = self.env.cr.cache.setdefault(LOAN_MEMO_CACHE_KEY, {})
+        data_version = self._get_data_version()
+        if memo.get('data_version') != data_version:
+            memo.clear()
+            memo['data_version'] = data_version
+        return memo.setdefault(namespace, {})
+
+    @api.model
+    def _loan_columns_enabled(self):
+        """Bản chụp dạng cột (tùy chọn) bật bằng tham số p2p_bridge.loan_columns_enabled"""
+        value = self.env['ir.config_parameter'].sudo().get_param('p2p_bridge.loan_columns_enabled', 'False')
+        return str2bool(value, False)
+
+    @api.model
+    def _get_loan_columns_dir(self):
+        return os.path.join(config.filestore(self.env.cr.dbname), 'p2p_loan_columns')
+
+    @api.model
+    def _cron_export_loan_columns(self):
+        """Xuất lại bản chụp dạng cột của p2p.loan nếu phiên bản dữ liệu đã đổi.
+
+        Được kích hoạt sau mỗi lần tăng phiên bản và chạy định kỳ để bù các lần
+        kích hoạt bị lỡ. Dữ liệu và phiên bản đọc trong cùng một transaction.
+        """
+        if not self._loan_columns_enabled():
+            return
+        base_dir = self._get_loan_columns_dir()
+        data_version = self._get_data_version()
+        current = loan_columns.load_loan_columns(base_dir)
+        if current and current[0]['data_version'] == data_version:
+            return
+        self.env['p2p.loan'].flush_model()
+        loan_columns.export_loan_columns(self.env.cr, base_dir, data_version)
+
+    @api.model
+    def _get_loan_columns(self):
+        """Các cột p2p.loan ánh xạ bộ nhớ (chỉ đọc), hoặc None nếu tắt hay bản chụp đã cũ"""
+        if not self._loan_columns_enabled():
+            return None
+        loaded = loan_columns.load_loan_columns(self._get_loan_columns_dir())
+        if not loaded:
+            return None
+        manifest, columns = loaded
+        if manifest['data_version'] != self._get_data_version():
+            return None
+        return columns
+
     @api.depends('user_id')
     def _compute_wallet_balance(self):
         for record in self:
@@ -71,35 +200,41 @@ class P2PBridge(models.Model):
                     else:
                         self.env['p2p.wallet'].create(values)
             
-            # Sync loans
-            loans = mongo.get_loans()
+            # Sync loans: tra cứu các khoản vay đã có một lần, ghi và tạo theo lô
+            loans = [loan_data for loan_data in mongo.get_loans() if loan_data.get('_id')]
             loan_model = self.env['p2p.loan']
+            existing = {
+                loan.loan_id: loan
+                for loan in loan_model.search([('loan_id', 'in', [str(loan_data['_id']) for loan_data in loans])])
+            }
+            updates = {}
+            creates = {}
+            now = fields.Datetime.now()
             for loan_data in loans:
-                loan_id = loan_data.get('_id')
-                if loan_id:
-                    existing_loan = loan_model.search([('loan_id', '=', str(loan_id))])
-                    if existing_loan:
-                        existing_loan.write({
-                            'borrower_id': loan_data.get('borrower_id'),
-                            'amount': loan_data.get('amount', 0),
-                            'interest_rate': loan_data.get('interest_rate', 0),
-                            'status': _normalize_status(loan_data.get('status')),
-                            'description': loan_data.get('description', ''),
-                            'last_sync': fields.Datetime.now()
-                        })
-                    else:
-                        loan_model.create({
-                            'loan_id': str(loan_id),
-                            'borrower_id': loan_data.get('borrower_id'),
-                            'amount': loan_data.get('amount', 0),
-                            'interest_rate': loan_data.get('interest_rate', 0),
-                            'term_months': loan_data.get('term_months', 12),
-                            'status': _normalize_status(loan_data.get('status')),
-                            'description': loan_data.get('description', ''),
-                            'created_at': loan_data.get('created_at'),
-                            'last_sync': fields.Datetime.now()
-                        })
+                loan_id = str(loan_data['_id'])
+                values = {
+                    'borrower_id': loan_data.get('borrower_id'),
+                    'amount': loan_data.get('amount', 0),
+                    'interest_rate': loan_data.get('interest_rate', 0),
+                    'status': _normalize_status(loan_data.get('status')),
+                    'description': loan_data.get('description', ''),
+                    'last_sync': now
+                }
+                if loan_id in existing:
+                    updates[loan_id] = (existing[loan_id], values)
+                else:
+                    creates[loan_id] = dict(values, **{
+                        'loan_id': loan_id,
+                        'term_months': loan_data.get('term_months', 12),
+                        'created_at': loan_data.get('created_at'),
+                    })
+            loan_model._write_batch(list(updates.values()))
+            loan_model.create(list(creates.values()))
             
+            # loan_disbursement (nếu cài) nhập các khoản vay vừa đồng bộ sang loan.application
+            import_cron = self.env.ref('loan_disbursement.ir_cron_import_from_p2p', raise_if_not_found=False)
+            if import_cron:
+                import_cron.sudo()._trigger()
             _logger.info("MongoDB sync completed successfully")
             
         except Exception as e:
@@ -170,6 +305,65 @@ class P2PLoan(models.Model):
     created_at = fields.Datetime(string='Created At')
     last_sync = fields.Datetime(string='Last Sync', default=fields.Datetime.now)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        loans = super().create(vals_list)
+        self.env['p2p.loan.daily.stat']._apply_loan_delta(loans.ids, 1)
+        self.env['p2p.loan.daily.sketch']._add_loans(loans.ids)
+        self.env['p2p.bridge']._schedule_data_version_bump()
+        return loans
+
+    def write(self, vals):
+        if self.env.context.get('skip_loan_rollup'):
+            # Người gọi tự cập nhật rollup/sketch cho cả lô (xem _write_batch)
+            result = super().write(vals)
+        else:
+            # Cập nhật rollup theo delta: trừ giá trị cũ, cộng giá trị mới,
+            # chỉ cho các khoản vay có trường rollup thực sự đổi giá trị
+            rollup_loans = self._filter_changed(vals, ROLLUP_LOAN_FIELDS)
+            sketch_loans = self._filter_changed(vals, SKETCH_LOAN_FIELDS)
+            self.env['p2p.loan.daily.stat']._apply_loan_delta(rollup_loans.ids, -1)
+            result = super().write(vals)
+            self.env['p2p.loan.daily.stat']._apply_loan_delta(rollup_loans.ids, 1)
+            self.env['p2p.loan.daily.sketch']._add_loans(sketch_loans.ids)
+        if DATA_VERSION_LOAN_FIELDS.intersection(vals):
+            self.env['p2p.bridge']._schedule_data_version_bump()
+        return result
+
+    def _filter_changed(self, vals, fnames):
+        """Các khoản vay có ít nhất một trường trong fnames sẽ đổi giá trị khi ghi vals"""
+        fnames = [fname for fname in fnames if fname in vals]
+        if not fnames:
+            return self.browse()
+        new_values = {fname: self._fields[fname].convert_to_cache(vals[fname], self) for fname in fnames}
+        return self.filtered(lambda loan: any(
+            loan._fields[fname].convert_to_cache(loan[fname], loan) != value
+            for fname, value in new_values.items()
+        ))
+
+    @api.model
+    def _write_batch(self, vals_by_loan):
+        """Ghi nhiều khoản vay với giá trị khác nhau, cập nhật rollup/sketch một lần cho cả lô.
+
+        :param vals_by_loan: list (bản ghi p2p.loan, vals)
+        """
+        rollup_loans = self.browse()
+        sketch_loans = self.browse()
+        for loan, vals in vals_by_loan:
+            rollup_loans |= loan._filter_changed(vals, ROLLUP_LOAN_FIELDS)
+            sketch_loans |= loan._filter_changed(vals, SKETCH_LOAN_FIELDS)
+        self.env['p2p.loan.daily.stat']._apply_loan_delta(rollup_loans.ids, -1)
+        for loan, vals in vals_by_loan:
+            # Chỉ ghi vào cache; flush gộp các UPDATE khi rollup đọc lại p2p_loan
+            loan.with_context(skip_loan_rollup=True).write(vals)
+        self.env['p2p.loan.daily.stat']._apply_loan_delta(rollup_loans.ids, 1)
+        self.env['p2p.loan.daily.sketch']._add_loans(sketch_loans.ids)
+
+    def unlink(self):
+        self.env['p2p.loan.daily.stat']._apply_loan_delta(self.ids, -1)
+        self.env['p2p.bridge']._schedule_data_version_bump()
+        return super().unlink()
+
     @api.model
     def _auto_init(self):
         """Auto-add missing columns during model initialization"""
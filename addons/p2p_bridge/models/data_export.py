@@ -0,0 +1,196 @@
+"""Xuất dữ liệu P2P dạng luồng (CSV/Parquet) với bộ nhớ không đổi.
+
+Bảng PostgreSQL được đọc theo từng lô bằng phân trang keyset (id > id cuối),
+mỗi lô dùng một cursor ngắn lấy từ registry; collection Mongo được đọc qua
+cursor của pymongo theo batch_size. Mỗi lô được ghi ra ngay thành một đoạn CSV
+hoặc một row group Parquet rồi trả về cho HTTP response, nên bộ nhớ chỉ phụ
+thuộc kích thước lô chứ không phụ thuộc số dòng.
+"""
+import csv
+import io
+import logging
+
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_FORMATS = [('csv', 'CSV'), ('parquet', 'Apache Parquet')]
+
+# Tập dữ liệu -> (model kiểm tra quyền đọc, nguồn, danh sách cột (tên, biểu thức SQL hoặc khóa Mongo, kiểu))
+EXPORT_DATASETS = {
+    'loans': ('p2p.loan', 'p2p_loan', [
+        ('id', 'id', 'int'),
+        ('contract_id', '"contractId"', 'str'),
+        ('loan_id', 'loan_id', 'str'),
+        ('borrower_id', 'borrower_id', 'str'),
+        ('capital', 'capital::float8', 'float'),
+        ('interest_rate', 'interest_rate::float8', 'float'),
+        ('term_months', 'term_months', 'int'),
+        ('status', 'status', 'str'),
+        ('purpose', 'willing', 'str'),
+        ('maturity_date', 'maturity_date', 'date'),
+        ('created_date', 'created_date', 'date'),
+        ('monthly_pay', 'monthly_pay::float8', 'float'),
+        ('entirely_pay', 'entirely_pay::float8', 'float'),
+        ('total_notes', 'total_notes', 'int'),
+        ('invested_notes', 'invested_notes', 'int'),
+        ('created_at', 'created_at', 'datetime'),
+        ('write_date', 'write_date', 'datetime'),
+    ]),
+    'wallets': ('p2p.wallet', 'p2p_wallet', [
+        ('id', 'id', 'int'),
+        ('user_id', 'user_id', 'str'),
+        ('wallet_balance', 'wallet_balance::float8', 'float'),
+        ('currency', 'currency', 'str'),
+        ('last_updated', 'last_updated', 'datetime'),
+        ('last_sync', 'last_sync', 'datetime'),
+    ]),
+    # Giao dịch chỉ nằm trên MongoDB; các khóa khác trong document bị bỏ qua
+    'transactions': ('p2p.wallet', None, [
+        ('id', '_id', 'str'),
+        ('user_id', 'user_id', 'str'),
+        ('type', 'type', 'str'),
+        ('amount', 'amount', 'float'),
+        ('status', 'status', 'str'),
+        ('created_at', 'createdAt', 'datetime'),
+        ('updated_at', 'updatedAt', 'datetime'),
+    ]),
+}
+
+DEFAULT_BATCH_SIZE = 50000
+
+
+def parquet_available():
+    return pq is not None
+
+
+def iter_table_batches(dbname, table, columns, batch_size=DEFAULT_BATCH_SIZE):
+    """Các lô dòng (list tuple) của một bảng, phân trang keyset theo id.
+
+    Mỗi lô mở cursor riêng vì response được đọc sau khi cursor của request
+    đã đóng; cột đầu tiên phải là id.
+    """
+    registry = Registry(dbname)
+    select_sql = ", ".join(expression for _name, expression, _kind in columns)
+    last_id = 0
+    while True:
+        with registry.cursor() as cr:
+            cr.execute(f"""
+                SELECT {select_sql}
+                  FROM {table}
+                 WHERE id > %s
+              ORDER BY id
+                 LIMIT %s
+            """, (last_id, batch_size))
+            rows = cr.fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def iter_mongo_batches(documents, columns, batch_size=DEFAULT_BATCH_SIZE):
+    """Các lô dòng từ một cursor pymongo, chỉ lấy các khóa trong columns"""
+    keys = [key for _name, key, _kind in columns]
+    converters = [_MONGO_CONVERTERS[kind] for _name, _key, kind in columns]
+    rows = []
+    for document in documents:
+        rows.append(tuple(convert(document.get(key)) for key, convert in zip(keys, converters)))
+        if len(rows) >= batch_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_datetime(value):
+    return value if hasattr(value, 'isoformat') else None
+
+
+_MONGO_CONVERTERS = {
+    'str': lambda value: str(value) if value is not None else None,
+    'float': _to_float,
+    'datetime': _to_datetime,
+}
+
+
+def stream_csv(batches, columns):
+    """Các đoạn bytes UTF-8 (có BOM để Excel đọc đúng tiếng Việt) của file CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([name for name, _expression, _kind in columns])
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _StreamSink:
+    """File-like chỉ ghi cho ParquetWriter: gom bytes để trả ra sau mỗi row group"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(columns):
+    types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string(),
+             'date': pa.date32(), 'datetime': pa.timestamp('us')}
+    return pa.schema([(name, types[kind]) for name, _expression, kind in columns])
+
+
+def stream_parquet(batches, columns):
+    """Các đoạn bytes của file Parquet, mỗi lô là một row group"""
+    if pq is None:
+        raise ImportError("pyarrow is required for Parquet export")
+    schema = _arrow_schema(columns)
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in batches:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,155 @@
+"""Bản chụp dạng cột của p2p.loan lưu thành các file .npy ánh xạ bộ nhớ.
+
+Mỗi lần xuất tạo một thư mục phiên bản mới rồi trỏ file CURRENT sang nó
+(os.replace là thao tác nguyên tử), nên worker đang đọc phiên bản cũ không bị
+ảnh hưởng. Các worker prefork mở file bằng np.load(mmap_mode='r'): dữ liệu nằm
+trong page cache của hệ điều hành và được chia sẻ, mỗi worker chỉ giữ view
+chỉ đọc, không sao chép.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .loan_daily_stat import LOAN_DATE_SQL
+
+_logger = logging.getLogger(__name__)
+
+# Mã trạng thái trong cột status (0: không xác định)
+LOAN_STATUS_CODES = {'waiting': 1, 'success': 2, 'clean': 3, 'fail': 4}
+
+# Tên cột -> kiểu dữ liệu; ngày lưu dạng số ngày kể từ 1970-01-01, -1 nếu trống
+LOAN_COLUMNS = {
+    'id': np.int32,
+    'capital': np.float64,
+    'interest_rate': np.float32,
+    'term_months': np.int16,
+    'status': np.int8,
+    'loan_day': np.int32,
+    'maturity_day': np.int32,
+    # Mã người vay dày đặc (theo thứ tự xuất hiện khi duyệt theo id), -1 nếu trống
+    'borrower': np.int32,
+}
+
+_CURRENT_FILE = 'CURRENT'
+# Số dòng mỗi lần đọc khi xuất (phân trang theo id)
+_CHUNK_SIZE = 50000
+
+# Các bản chụp đã mở trong tiến trình: thư mục -> (manifest, dict cột)
+_mapped = {}
+
+
+def export_loan_columns(cr, base_dir, data_version):
+    """Xuất p2p_loan thành các file cột trong base_dir/v<data_version>.
+
+    Các file được cấp phát trước (np.lib.format.open_memmap) rồi ghi dần từng
+    đoạn _CHUNK_SIZE dòng đọc theo id, nên bộ nhớ dùng không phụ thuộc kích
+    thước bảng. Cần chạy trong một transaction để số dòng và dữ liệu khớp nhau.
+
+    :return: manifest của bản chụp vừa xuất
+    """
+    status_case = " ".join(f"WHEN '{status}' THEN {code}" for status, code in LOAN_STATUS_CODES.items())
+    cr.execute("SELECT COUNT(*) FROM p2p_loan")
+    total = cr.fetchone()[0]
+
+    os.makedirs(base_dir, exist_ok=True)
+    version_name = f"v{data_version}"
+    tmp_dir = tempfile.mkdtemp(prefix=f".{version_name}-", dir=base_dir)
+    try:
+        columns = {
+            name: np.lib.format.open_memmap(os.path.join(tmp_dir, f"{name}.npy"), mode='w+', dtype=dtype, shape=(total,))
+            for name, dtype in LOAN_COLUMNS.items()
+        }
+        borrower_codes = {}
+        rows_written = 0
+        last_id = 0
+        while rows_written < total:
+            cr.execute(f"""
+                SELECT id,
+                       COALESCE(capital, 0),
+                       COALESCE(interest_rate, 0),
+                       COALESCE(term_months, 0),
+                       CASE status {status_case} ELSE 0 END,
+                       COALESCE({LOAN_DATE_SQL} - DATE '1970-01-01', -1),
+                       COALESCE(maturity_date - DATE '1970-01-01', -1),
+                       borrower_id
+                  FROM p2p_loan
+                 WHERE id > %s
+              ORDER BY id
+                 LIMIT %s
+            """, (last_id, min(_CHUNK_SIZE, total - rows_written)))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            end = rows_written + len(rows)
+            numeric = np.array([row[:-1] for row in rows], dtype=np.float64)
+            for position, name in enumerate(list(LOAN_COLUMNS)[:-1]):
+                columns[name][rows_written:end] = numeric[:, position]
+            columns['borrower'][rows_written:end] = [
+                -1 if row[-1] is None else borrower_codes.setdefault(row[-1], len(borrower_codes))
+                for row in rows
+            ]
+            rows_written = end
+            last_id = rows[-1][0]
+        for column in columns.values():
+            column.flush()
+        del columns
+
+        manifest = {'data_version': data_version, 'rows': rows_written, 'columns': list(LOAN_COLUMNS)}
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        version_dir = os.path.join(base_dir, version_name)
+        if os.path.isdir(version_dir):
+            shutil.rmtree(version_dir)
+        os.rename(tmp_dir, version_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    current_tmp = os.path.join(base_dir, f".{_CURRENT_FILE}.tmp")
+    with open(current_tmp, 'w') as f:
+        f.write(version_name)
+    os.replace(current_tmp, os.path.join(base_dir, _CURRENT_FILE))
+    _cleanup_old_versions(base_dir, keep=version_name)
+    _logger.info("Exported %s p2p.loan rows to columnar snapshot %s", manifest['rows'], version_dir)
+    return manifest
+
+
+def _cleanup_old_versions(base_dir, keep):
+    """Xóa các phiên bản cũ; worker còn mmap file cũ vẫn đọc được tới khi đóng (unlink trên POSIX)"""
+    for name in os.listdir(base_dir):
+        if name.startswith('v') and name != keep:
+            shutil.rmtree(os.path.join(base_dir, name), ignore_errors=True)
+
+
+def load_loan_columns(base_dir):
+    """Mở bản chụp hiện tại dưới dạng các mảng NumPy chỉ đọc ánh xạ bộ nhớ.
+
+    :return: (manifest, dict tên cột -> mảng) hoặc None nếu chưa có bản chụp
+    """
+    try:
+        with open(os.path.join(base_dir, _CURRENT_FILE)) as f:
+            version_dir = os.path.join(base_dir, f.read().strip())
+    except OSError:
+        return None
+    if version_dir in _mapped:
+        return _mapped[version_dir]
+    try:
+        with open(os.path.join(version_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        # Chỉ dùng phần đã ghi (số dòng có thể ít hơn kích thước đã cấp phát)
+        columns = {
+            name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r')[:manifest['rows']]
+            for name in manifest['columns']
+        }
+    except (OSError, ValueError) as e:
+        _logger.warning("Could not open loan column snapshot %s: %s", version_dir, e)
+        return None
+    # Chỉ giữ bản chụp mới nhất trong tiến trình
+    _mapped.clear()
+    _mapped[version_dir] = (manifest, columns)
+    return _mapped[version_dir]
@@ -0,0 +1,272 @@
+from odoo import models, fields, api
+import logging
+import math
+
+_logger = logging.getLogger(__name__)
+
+# Ngày hiệu lực của khoản vay: ưu tiên created_date, nếu trống thì dùng created_at
+LOAN_DATE_SQL = "COALESCE(created_date, created_at::date)"
+
+# Các trường của p2p.loan ảnh hưởng tới bảng rollup
+ROLLUP_LOAN_FIELDS = ('created_date', 'created_at', 'status', 'term_months', 'willing', 'capital', 'interest_rate')
+
+_ROLLUP_GROUPBY = ('status', 'term_months', 'purpose')
+_ROLLUP_GRANULARITIES = ('day', 'week', 'month')
+
+# Các trường của p2p.loan ảnh hưởng tới sketch người vay
+SKETCH_LOAN_FIELDS = ('created_date', 'created_at', 'status', 'borrower_id')
+
+# HyperLogLog: 2^8 thanh ghi, sai số chuẩn tương đối 1.04 / sqrt(256) ~ 6.5%.
+# Hash 32 bit của hashtext(): 8 bit thấp chọn thanh ghi, 24 bit còn lại cho rank.
+HLL_REGISTER_BITS = 8
+HLL_REGISTERS = 1 << HLL_REGISTER_BITS
+HLL_RELATIVE_ERROR = 1.04 / math.sqrt(HLL_REGISTERS)
+_HLL_RANK_BITS = 32 - HLL_REGISTER_BITS
+
+
+class P2PLoanDailyStat(models.Model):
+    _name = 'p2p.loan.daily.stat'
+    _description = 'P2P Loan Daily Statistics'
+    _order = 'day desc'
+    _rec_name = 'day'
+
+    day = fields.Date(string='Day', required=True, index=True)
+    status = fields.Char(string='Status', required=True, default='')
+    term_months = fields.Integer(string='Term (Months)', required=True, default=0)
+    purpose = fields.Char(string='Purpose', required=True, default='')
+    loan_count = fields.Integer(string='Loans', default=0)
+    capital_sum = fields.Float(string='Capital', default=0.0)
+    rate_sum = fields.Float(string='Interest Rate Sum', default=0.0)
+    rate_count = fields.Integer(string='Loans With Rate', default=0)
+
+    _sql_constraints = [
+        ('day_key_uniq', 'unique(day, status, term_months, purpose)',
+         'Each day/status/term/purpose combination must be unique.'),
+    ]
+
+    def init(self):
+        """Dựng lại bảng rollup khi cài đặt/cập nhật module nếu bảng đang trống"""
+        self.env.cr.execute("SELECT 1 FROM p2p_loan_daily_stat LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    @api.model
+    def _rollup_select_sql(self, where_clause):
+        """Câu SELECT tổng hợp p2p_loan theo khóa rollup (day, status, term, purpose)"""
+        return f"""
+            SELECT {LOAN_DATE_SQL} AS day,
+                   COALESCE(status, '') AS status,
+                   COALESCE(term_months, 0) AS term_months,
+                   LEFT(COALESCE(willing, ''), 255) AS purpose,
+                   %(sign)s * COUNT(*) AS loan_count,
+                   %(sign)s * COALESCE(SUM(capital), 0) AS capital_sum,
+                   %(sign)s * COALESCE(SUM(interest_rate) FILTER (WHERE interest_rate <> 0), 0) AS rate_sum,
+                   %(sign)s * COUNT(*) FILTER (WHERE interest_rate <> 0) AS rate_count
+              FROM p2p_loan
+             WHERE {LOAN_DATE_SQL} IS NOT NULL AND {where_clause}
+          GROUP BY 1, 2, 3, 4
+        """
+
+    @api.model
+    def _apply_loan_delta(self, loan_ids, sign):
+        """Cộng (sign=1) hoặc trừ (sign=-1) các khoản vay vào bảng rollup.
+
+        Được gọi từ create/write/unlink và _write_batch của p2p.loan nên mọi đường đồng bộ
+        (cron, wizard, sync từng bản ghi) đều cập nhật rollup theo delta.
+        """
+        if not loan_ids:
+            return
+        self.env['p2p.loan'].flush_model(ROLLUP_LOAN_FIELDS)
+        self.env.cr.execute(f"""
+            INSERT INTO p2p_loan_daily_stat
+                   (day, status, term_months, purpose, loan_count, capital_sum, rate_sum, rate_count,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT delta.*, %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM ({self._rollup_select_sql('id IN %(ids)s')}) AS delta
+            ON CONFLICT (day, status, term_months, purpose) DO UPDATE
+               SET loan_count = p2p_loan_daily_stat.loan_count + EXCLUDED.loan_count,
+                   capital_sum = p2p_loan_daily_stat.capital_sum + EXCLUDED.capital_sum,
+                   rate_sum = p2p_loan_daily_stat.rate_sum + EXCLUDED.rate_sum,
+                   rate_count = p2p_loan_daily_stat.rate_count + EXCLUDED.rate_count,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+         RETURNING id, loan_count
+        """, {'ids': tuple(loan_ids), 'sign': sign, 'uid': self.env.uid})
+        # Chỉ xóa các nhóm vừa về 0, không quét cả bảng
+        empty_ids = tuple(row_id for row_id, loan_count in self.env.cr.fetchall() if loan_count <= 0)
+        if empty_ids:
+            self.env.cr.execute("DELETE FROM p2p_loan_daily_stat WHERE id IN %s", (empty_ids,))
+        self.invalidate_model()
+
+    @api.model
+    def _rebuild(self):
+        """Tính lại toàn bộ bảng rollup từ p2p_loan"""
+        self.env['p2p.loan'].flush_model(ROLLUP_LOAN_FIELDS)
+        self.env.cr.execute("DELETE FROM p2p_loan_daily_stat")
+        self.env.cr.execute(f"""
+            INSERT INTO p2p_loan_daily_stat
+                   (day, status, term_months, purpose, loan_count, capital_sum, rate_sum, rate_count,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT rollup.*, %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM ({self._rollup_select_sql('TRUE')}) AS rollup
+        """, {'sign': 1, 'uid': self.env.uid})
+        _logger.info("Rebuilt p2p.loan.daily.stat with %s rows", self.env.cr.rowcount)
+        self.invalidate_model()
+        self.env['p2p.bridge']._schedule_data_version_bump()
+
+    @api.model
+    def _aggregate(self, date_from, date_to, groupby=(), granularity=None):
+        """Tổng hợp bảng rollup trong khoảng ngày [date_from, date_to].
+
+        :param groupby: các cột khóa trong ('status', 'term_months', 'purpose')
+        :param granularity: 'day', 'week' hoặc 'month' để nhóm thêm theo kỳ (khóa 'period')
+        :return: list dict gồm các khóa nhóm và loan_count, capital_sum, rate_sum, rate_count
+        """
+        groupby = [column for column in groupby if column in _ROLLUP_GROUPBY]
+        select_keys = list(groupby)
+        params = {'date_from': date_from, 'date_to': date_to}
+        if granularity in _ROLLUP_GRANULARITIES:
+            select_keys.insert(0, "date_trunc(%(granularity)s, day)::date AS period")
+            params['granularity'] = granularity
+        key_sql = ", ".join(select_keys)
+        group_sql = ", ".join(str(i + 1) for i in range(len(select_keys)))
+
+        self.flush_model()
+        self.env.cr.execute(f"""
+            SELECT {key_sql + ',' if key_sql else ''}
+                   SUM(loan_count) AS loan_count,
+                   SUM(capital_sum) AS capital_sum,
+                   SUM(rate_sum) AS rate_sum,
+                   SUM(rate_count) AS rate_count
+              FROM p2p_loan_daily_stat
+             WHERE day BETWEEN %(date_from)s AND %(date_to)s
+             {'GROUP BY ' + group_sql if group_sql else ''}
+        """, params)
+        rows = self.env.cr.dictfetchall()
+        # Không có dòng nào trong khoảng: SUM trả về NULL
+        return [row for row in rows if row['loan_count']]
+
+
+class P2PLoanDailySketch(models.Model):
+    """Sketch HyperLogLog số người vay phân biệt theo (ngày, trạng thái).
+
+    Các sketch gộp được bằng max từng thanh ghi nên số người vay phân biệt của
+    một khoảng ngày bất kỳ được ước lượng mà không cần đọc p2p_loan. Sketch chỉ
+    cộng thêm được: khoản vay bị xóa hoặc đổi ngày vẫn được tính cho tới lần
+    dựng lại, tức ước lượng có thể lệch lên.
+    """
+    _name = 'p2p.loan.daily.sketch'
+    _description = 'P2P Loan Daily Borrower Sketch'
+    _order = 'day desc'
+    _rec_name = 'day'
+
+    day = fields.Date(string='Day', required=True, index=True)
+    status = fields.Char(string='Status', required=True, default='')
+
+    _sql_constraints = [
+        ('day_status_uniq', 'unique(day, status)', 'Each day/status combination must be unique.'),
+    ]
+
+    def init(self):
+        # Thanh ghi HLL lưu dạng smallint[], không có kiểu trường ORM tương ứng
+        self.env.cr.execute("ALTER TABLE p2p_loan_daily_sketch ADD COLUMN IF NOT EXISTS registers smallint[]")
+        self.env.cr.execute("SELECT 1 FROM p2p_loan_daily_sketch LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    @api.model
+    def _sketch_select_sql(self, where_clause):
+        """Câu SELECT dựng mảng thanh ghi HLL cho mỗi (day, status) từ p2p_loan"""
+        rank_mask = (1 << _HLL_RANK_BITS) - 1
+        return f"""
+            WITH ranked AS (
+                SELECT {LOAN_DATE_SQL} AS day,
+                       COALESCE(status, '') AS status,
+                       hashtext(borrower_id) & {HLL_REGISTERS - 1} AS idx,
+                       MAX({_HLL_RANK_BITS + 1} - length(ltrim(
+                           ((hashtext(borrower_id) >> {HLL_REGISTER_BITS}) & {rank_mask})::bit({_HLL_RANK_BITS})::text,
+                           '0'))) AS rank
+                  FROM p2p_loan
+                 WHERE {LOAN_DATE_SQL} IS NOT NULL AND borrower_id IS NOT NULL AND {where_clause}
+              GROUP BY 1, 2, 3
+            )
+            SELECT keys.day, keys.status,
+                   array_agg(COALESCE(ranked.rank, 0)::smallint ORDER BY slot.idx) AS registers
+              FROM (SELECT DISTINCT day, status FROM ranked) AS keys
+        CROSS JOIN generate_series(0, {HLL_REGISTERS - 1}) AS slot(idx)
+         LEFT JOIN ranked ON ranked.day = keys.day AND ranked.status = keys.status AND ranked.idx = slot.idx
+          GROUP BY keys.day, keys.status
+        """
+
+    @api.model
+    def _add_loans(self, loan_ids):
+        """Gộp người vay của các khoản vay vào sketch (max từng thanh ghi)"""
+        if not loan_ids:
+            return
+        self.env['p2p.loan'].flush_model(SKETCH_LOAN_FIELDS)
+        self.env.cr.execute(f"""
+            INSERT INTO p2p_loan_daily_sketch
+                   (day, status, registers, create_uid, create_date, write_uid, write_date)
+            SELECT sketch.*, %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM ({self._sketch_select_sql('id IN %(ids)s')}) AS sketch
+            ON CONFLICT (day, status) DO UPDATE
+               SET registers = ARRAY(
+                       SELECT GREATEST(old_rank, new_rank)
+                         FROM unnest(p2p_loan_daily_sketch.registers, EXCLUDED.registers) AS r(old_rank, new_rank)),
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, {'ids': tuple(loan_ids), 'uid': self.env.uid})
+        self.invalidate_model()
+
+    @api.model
+    def _rebuild(self):
+        """Tính lại toàn bộ sketch từ p2p_loan"""
+        self.env['p2p.loan'].flush_model(SKETCH_LOAN_FIELDS)
+        self.env.cr.execute("DELETE FROM p2p_loan_daily_sketch")
+        self.env.cr.execute(f"""
+            INSERT INTO p2p_loan_daily_sketch
+                   (day, status, registers, create_uid, create_date, write_uid, write_date)
+            SELECT sketch.*, %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM ({self._sketch_select_sql('TRUE')}) AS sketch
+        """, {'uid': self.env.uid})
+        _logger.info("Rebuilt p2p.loan.daily.sketch with %s rows", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def _estimate_borrowers(self, date_from, date_to, statuses=None):
+        """Ước lượng số người vay phân biệt trong khoảng ngày.
+
+        :param statuses: chỉ tính các trạng thái này (mặc định tất cả)
+        :return: (ước lượng, sai số chuẩn tuyệt đối)
+        """
+        self.flush_model()
+        params = {'date_from': date_from, 'date_to': date_to}
+        status_sql = ''
+        if statuses:
+            status_sql = 'AND status IN %(statuses)s'
+            params['statuses'] = tuple(statuses)
+        self.env.cr.execute(f"""
+            SELECT MAX(r.rank)
+              FROM p2p_loan_daily_sketch, unnest(registers) WITH ORDINALITY AS r(rank, idx)
+             WHERE day BETWEEN %(date_from)s AND %(date_to)s {status_sql}
+          GROUP BY r.idx
+        """, params)
+        ranks = [row[0] for row in self.env.cr.fetchall()]
+        if not ranks:
+            return 0, 0.0
+        ranks += [0] * (HLL_REGISTERS - len(ranks))
+        estimate = self._hll_estimate(ranks)
+        return int(round(estimate)), estimate * HLL_RELATIVE_ERROR
+
+    @api.model
+    def _hll_estimate(self, ranks):
+        """Ước lượng HyperLogLog (Flajolet et al.) kèm hiệu chỉnh khoảng nhỏ/lớn"""
+        m = len(ranks)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in ranks)
+        zeros = ranks.count(0)
+        if estimate <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        if estimate > (1 << 32) / 30:
+            return -(1 << 32) * math.log(1 - estimate / (1 << 32))
+        return estimate
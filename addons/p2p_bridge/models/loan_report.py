@@ -0,0 +1,70 @@
+from odoo import models, fields, tools
+
+from .loan_daily_stat import LOAN_DATE_SQL
+
+# Nhóm kỳ hạn (tháng): (mã, nhãn, kỳ hạn tối đa của nhóm); nhóm cuối không giới hạn
+LOAN_TERM_BUCKETS = [
+    ('le_3', '≤ 3 tháng', 3),
+    ('4_6', '4-6 tháng', 6),
+    ('7_12', '7-12 tháng', 12),
+    ('13_24', '13-24 tháng', 24),
+    ('gt_24', '> 24 tháng', None),
+]
+
+
+class P2PLoanReport(models.Model):
+    """Báo cáo phân tích p2p.loan dựa trên SQL view.
+
+    Pivot/graph chạy read_group trực tiếp trên view nên việc nhóm theo trạng
+    thái, kỳ hạn, tháng được PostgreSQL thực hiện, không phải đọc từng bản ghi.
+    """
+    _name = 'p2p.loan.report'
+    _description = 'P2P Loan Analysis'
+    _auto = False
+    _rec_name = 'loan_id'
+    _order = 'loan_date desc'
+
+    loan_id = fields.Many2one('p2p.loan', string='Loan', readonly=True)
+    loan_date = fields.Date(string='Effective Date', readonly=True)
+    loan_month = fields.Date(string='Month', readonly=True)
+    status = fields.Selection([
+        ('waiting', 'Waiting'),
+        ('success', 'Success'),
+        ('clean', 'Clean'),
+        ('fail', 'Fail')
+    ], string='Status', readonly=True)
+    term_months = fields.Integer(string='Term (Months)', readonly=True, aggregator='avg')
+    term_bucket = fields.Selection([(code, label) for code, label, _limit in LOAN_TERM_BUCKETS],
+                                   string='Term Bucket', readonly=True)
+    purpose = fields.Char(string='Purpose', readonly=True)
+    borrower_id = fields.Char(string='Borrower ID', readonly=True)
+    capital = fields.Float(string='Capital', readonly=True)
+    interest_rate = fields.Float(string='Interest Rate (%)', readonly=True, aggregator='avg')
+    loan_count = fields.Integer(string='Loans', readonly=True)
+
+    def _term_bucket_sql(self):
+        cases = " ".join(
+            f"WHEN COALESCE(term_months, 0) <= {limit} THEN '{code}'"
+            for code, _label, limit in LOAN_TERM_BUCKETS if limit is not None
+        )
+        return f"CASE {cases} ELSE '{LOAN_TERM_BUCKETS[-1][0]}' END"
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT id,
+                       id AS loan_id,
+                       {LOAN_DATE_SQL} AS loan_date,
+                       date_trunc('month', {LOAN_DATE_SQL})::date AS loan_month,
+                       status,
+                       term_months,
+                       {self._term_bucket_sql()} AS term_bucket,
+                       LEFT(COALESCE(willing, ''), 255) AS purpose,
+                       borrower_id,
+                       COALESCE(capital, 0) AS capital,
+                       NULLIF(interest_rate, 0) AS interest_rate,
+                       1 AS loan_count
+                  FROM p2p_loan
+            )
+        """)
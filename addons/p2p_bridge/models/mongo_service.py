@@ -136,6 +136,10 @@ class MongoService:
             _logger.error(f"Error getting transactions: {e}")
             return []
 
+    def iter_transactions(self, batch_size=1000):
+        """Cursor duyệt toàn bộ transactions theo lô, không nạp hết vào bộ nhớ"""
+        return self.db.transactions.find({}, batch_size=batch_size).sort("_id", 1)
+
     def get_users(self):
         """Lấy tất cả users"""
         try:
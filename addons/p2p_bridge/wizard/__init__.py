@@ -1 +1,2 @@
 from . import sync_wizard
+from . import export_wizard
@@ -0,0 +1,26 @@
+from odoo import models, fields
+from odoo.exceptions import UserError
+from ..models import data_export
+
+
+class ExportWizard(models.TransientModel):
+    _name = 'p2p.export.wizard'
+    _description = 'P2P Export Wizard'
+
+    dataset = fields.Selection([
+        ('loans', 'Loans'),
+        ('wallets', 'Wallets'),
+        ('transactions', 'Transactions (MongoDB)'),
+    ], string='Dataset', required=True, default='loans')
+    file_format = fields.Selection(data_export.EXPORT_FORMATS, string='Format', required=True, default='csv')
+
+    def action_export(self):
+        """Mở endpoint xuất dạng luồng; trình duyệt tải file trực tiếp"""
+        self.ensure_one()
+        if self.file_format == 'parquet' and not data_export.parquet_available():
+            raise UserError("❌ Server chưa cài pyarrow, không thể xuất Parquet")
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/p2p_bridge/export/{self.dataset}.{self.file_format}',
+            'target': 'self',
+        }
@@ -275,6 +275,24 @@ class SyncWizard(models.TransientModel):
         except Exception as e:
             raise UserError(f"❌ Lỗi xóa dữ liệu: {str(e)}")
 
+    def rebuild_loan_statistics(self):
+        """Dựng lại bảng thống kê khoản vay theo ngày"""
+        try:
+            self.env['p2p.loan.daily.stat']._rebuild()
+            self.env['p2p.loan.daily.sketch']._rebuild()
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Loan Statistics',
+                    'message': '✅ Đã dựng lại bảng thống kê khoản vay theo ngày!',
+                    'type': 'success',
+                    'sticky': False,
+                }
+            }
+        except Exception as e:
+            raise UserError(f"❌ Lỗi dựng lại thống kê: {str(e)}")
+
     def open_wallets(self):
         """Mở danh sách wallets"""
         return {
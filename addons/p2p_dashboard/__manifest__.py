@@ -19,6 +19,7 @@
         "security/ir.model.access.csv",
         "views/dashboard_views.xml",
         "views/menu_views.xml",
+        "data/ir_cron.xml",
         "data/demo_data.xml",
     ],
     "installable": True,
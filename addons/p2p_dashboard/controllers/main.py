@@ -0,0 +1,78 @@
+import logging
+from werkzeug.exceptions import BadRequest
+from odoo import fields, http
+from odoo.http import request
+from odoo.addons.p2p_dashboard.models.dashboard import CHART_SECTIONS
+
+_logger = logging.getLogger(__name__)
+
+# Các trường bảng điều khiển widget biểu đồ gửi kèm theo giá trị hiện tại của form
+DASHBOARD_PARAM_FIELDS = ('date_from', 'date_to', 'company_id', 'trend_granularity',
+                          'top_borrower_limit', 'analytics_mode')
+
+
+class P2PDashboardController(http.Controller):
+
+    @http.route('/p2p_dashboard/chart/<int:dashboard_id>/<string:chart>', type='http', auth='user', methods=['GET'])
+    def dashboard_chart(self, dashboard_id, chart, **kwargs):
+        """Dữ liệu của một biểu đồ, được widget tải riêng khi hiển thị.
+
+        ETag gắn với phiên bản dữ liệu nên trình duyệt chỉ cần xác thực lại (304)
+        cho tới khi có lần đồng bộ mới hoặc tham số bảng điều khiển thay đổi.
+        Query string mang giá trị hiện tại của form và được ưu tiên hơn giá trị
+        đã lưu; dashboard_id = 0 cho bản ghi chưa lưu.
+        """
+        if chart not in CHART_SECTIONS:
+            raise request.not_found()
+        dashboard_model = request.env['p2p.dashboard']
+        origin = dashboard_model
+        if dashboard_id:
+            origin = dashboard_model.browse(dashboard_id).exists()
+            if not origin:
+                raise request.not_found()
+        origin.check_access('read')
+
+        try:
+            values = self._get_dashboard_values(kwargs)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        if origin:
+            dashboard = dashboard_model.new(values, origin=origin)
+        else:
+            defaults = dashboard_model.default_get(list(DASHBOARD_PARAM_FIELDS))
+            dashboard = dashboard_model.new(dict(defaults, **values))
+
+        etag = dashboard._get_chart_etag(chart)
+        headers = [
+            ('ETag', etag),
+            ('Cache-Control', 'private, no-cache'),
+        ]
+        if_none_match = request.httprequest.headers.get('If-None-Match', '')
+        if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+            return request.make_response('', headers=headers, status=304)
+
+        payload = dashboard._get_chart_data(chart)
+        headers.append(('Content-Type', 'application/json; charset=utf-8'))
+        return request.make_response(payload, headers=headers)
+
+    def _get_dashboard_values(self, params):
+        """Giá trị trường bảng điều khiển từ query string, đã kiểm tra hợp lệ"""
+        dashboard_model = request.env['p2p.dashboard']
+        values = {}
+        for name in ('date_from', 'date_to'):
+            if params.get(name):
+                values[name] = fields.Date.to_date(params[name])
+        for name in ('trend_granularity', 'analytics_mode'):
+            if params.get(name):
+                allowed = [key for key, _label in dashboard_model._fields[name].selection]
+                if params[name] not in allowed:
+                    raise ValueError(f"Invalid {name}: {params[name]}")
+                values[name] = params[name]
+        if params.get('top_borrower_limit'):
+            values['top_borrower_limit'] = max(int(params['top_borrower_limit']), 1)
+        if params.get('company_id'):
+            company_id = int(params['company_id'])
+            if company_id not in request.env.user.company_ids.ids:
+                raise ValueError(f"Invalid company_id: {company_id}")
+            values['company_id'] = company_id
+        return values
@@ -1,2 +1,5 @@
 # -*- coding: utf-8 -*-
-from . import dashboard
\ No newline at end of file
+from . import dashboard
+from . import dashboard_cache
+from . import dashboard_snapshot
+from . import stress_result
@@ -1,21 +1,94 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
+from odoo.exceptions import AccessError
+from odoo.addons.p2p_bridge.models.loan_daily_stat import LOAN_DATE_SQL, HLL_RELATIVE_ERROR
+from odoo.addons.p2p_bridge.models.loan_columns import LOAN_STATUS_CODES
+from . import vintage
 from datetime import date, timedelta, datetime
 from dateutil.relativedelta import relativedelta
+import hashlib
 import json
 import logging
+import math
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+_TREND_GRANULARITIES = ('month', 'week', 'day')
+
+# Các nhóm chỉ số được cache; ngoài khoảng ngày và công ty, khóa cache của
+# mỗi nhóm gồm thêm các trường cấu hình liệt kê ở đây. KPI và biểu đồ nằm ở
+# các nhóm riêng để đọc KPI trên form không phải dựng dữ liệu biểu đồ.
+SECTION_KEY_FIELDS = {
+    'loan_stats': (),
+    'loan_charts': (),
+    'loan_trend': ('trend_granularity',),
+    'user_stats': ('analytics_mode',),
+    'user_charts': ('top_borrower_limit', 'analytics_mode'),
+    'risk_stats': (),
+    'risk_charts': (),
+    'distribution': ('analytics_mode',),
+    'distribution_charts': ('analytics_mode',),
+    'vintage': (),
+    # Kết quả mô phỏng không phụ thuộc khoảng ngày, khóa đổi khi có lần chạy mới
+    'stress': ('stress_result_id',),
+    'stress_charts': ('stress_result_id',),
+}
+
+# Các khoảng thời gian chuẩn được cron tính sẵn (p2p.dashboard.snapshot)
+STANDARD_RANGES = [
+    ('default', 'Mặc định (180 ngày)'),
+    ('this_month', 'Tháng này'),
+    ('last_month', 'Tháng trước'),
+    ('last_3_months', '3 tháng qua'),
+    ('this_year', 'Năm nay'),
+]
+
+# Các trường biểu đồ có thể tải riêng qua /p2p_dashboard/chart, kèm nhóm chỉ số chứa nó
+CHART_SECTIONS = {
+    'loans_by_state': 'loan_charts',
+    'chart_loan_status': 'loan_charts',
+    'loans_by_purpose': 'loan_charts',
+    'loan_trend_data': 'loan_trend',
+    'loan_amount_trend_data': 'loan_trend',
+    'top_borrowers': 'user_charts',
+    'risk_return_data': 'risk_charts',
+    'interest_rate_histogram': 'distribution_charts',
+    'loans_by_term': 'distribution_charts',
+    'vintage_default_data': 'vintage',
+    'vintage_clean_data': 'vintage',
+    'stress_loss_distribution': 'stress_charts',
+}
+
+# Số cohort (tháng giải ngân) gần nhất được vẽ trên biểu đồ vintage
+_VINTAGE_CHART_COHORTS = 12
+
+# Biểu đồ phân bố lãi suất: (cận dưới, cận trên, số khoảng) cho width_bucket, đơn vị %
+_RATE_HISTOGRAM_BOUNDS = (0, 30, 15)
+# Các mốc kỳ hạn (tháng) để nhóm khoản vay: <=3, 4-6, 7-12, 13-24, >24
+_TERM_BUCKET_THRESHOLDS = (4, 7, 13, 25)
+
+# Tỷ lệ mẫu (%) mặc định cho chế độ ước lượng, ghi đè bằng tham số p2p_dashboard.sample_percent
+DEFAULT_SAMPLE_PERCENT = 5.0
+
 class P2PDashboard(models.Model):
     _name = 'p2p.dashboard'
     _description = 'Bảng điều khiển P2P Lending'
     _rec_name = 'name'
 
     name = fields.Char('Tên', required=True, default="Bảng điều khiển P2P")
-    date_from = fields.Date('Từ ngày', default=lambda self: (date.today().replace(day=1) - timedelta(days=180)))
-    date_to = fields.Date('Đến ngày', default=fields.Date.today)
+    date_from = fields.Date('Từ ngày', default=lambda self: self._get_standard_range('default')[0])
+    date_to = fields.Date('Đến ngày', default=lambda self: self._get_standard_range('default')[1])
     company_id = fields.Many2one('res.company', string='Công ty', default=lambda self: self.env.company)
+    snapshot_computed_at = fields.Datetime('Số liệu tính lúc', compute='_compute_snapshot_computed_at',
+        help="Thời điểm cron tính sẵn số liệu cho khoảng thời gian này. "
+             "Để trống khi số liệu được tính trực tiếp (khoảng thời gian tùy chọn).")
+    analytics_mode = fields.Selection([
+        ('exact', 'Chính xác'),
+        ('approximate', 'Ước lượng'),
+    ], string='Chế độ tính', default='exact', required=True,
+        help="Ước lượng: số người vay tính từ sketch HyperLogLog, phân vị và top người vay "
+             "tính trên mẫu TABLESAMPLE. Dùng cho các khoảng thời gian rất dài.")
     
     # ----- Loan Stats -----
     total_loans = fields.Integer('Tổng số khoản vay', compute='_compute_loan_stats')
@@ -36,9 +109,14 @@ class P2PDashboard(models.Model):
     average_loan_amount_empty = fields.Char(string='', default="(Chưa có dữ liệu)")
     average_interest_rate = fields.Float('Lãi suất trung bình (%)', compute='_compute_loan_stats')
     average_interest_rate_empty = fields.Char(string='', default="(Chưa có dữ liệu)")
-    loans_by_purpose = fields.Json('Phân loại theo mục đích', compute='_compute_loan_stats')
-    loans_by_state = fields.Json('Phân loại theo trạng thái', compute='_compute_loan_stats')
-    chart_loan_status = fields.Json('Trạng thái khoản vay', compute='_compute_loan_stats')
+    loans_by_purpose = fields.Json('Phân loại theo mục đích', compute='_compute_loan_charts')
+    loans_by_state = fields.Json('Phân loại theo trạng thái', compute='_compute_loan_charts')
+    chart_loan_status = fields.Json('Trạng thái khoản vay', compute='_compute_loan_charts')
+    trend_granularity = fields.Selection([
+        ('month', 'Theo tháng'),
+        ('week', 'Theo tuần'),
+        ('day', 'Theo ngày'),
+    ], string='Chu kỳ xu hướng', default='month', required=True)
     loan_trend_data = fields.Json('Dữ liệu xu hướng khoản vay', compute='_compute_loan_trend_data')
     loan_amount_trend_data = fields.Json('Dữ liệu xu hướng giá trị khoản vay', compute='_compute_loan_trend_data')
 
@@ -47,134 +125,38 @@ class P2PDashboard(models.Model):
     total_borrowers_empty = fields.Char(string='', default="(Chưa có dữ liệu)")
     active_borrowers = fields.Integer('Người vay đang hoạt động', compute='_compute_user_stats')
     active_borrowers_empty = fields.Char(string='', default="(Chưa có dữ liệu)")
-    top_borrowers = fields.Json('Top người vay', compute='_compute_user_stats')
+    top_borrowers = fields.Json('Top người vay', compute='_compute_user_charts')
+    top_borrower_limit = fields.Integer('Số người vay trong top', default=5, required=True)
+    borrower_stats_note = fields.Char('Sai số thống kê người vay', compute='_compute_user_stats')
 
     # ----- Risk Stats -----
     default_rate = fields.Float('Tỷ lệ vỡ nợ (%)', compute='_compute_risk_stats')
     default_rate_empty = fields.Char(string='', default="(Chưa có dữ liệu)")
-    risk_return_data = fields.Json('Dữ liệu rủi ro và lợi nhuận', compute='_compute_risk_stats')
+    risk_return_data = fields.Json('Dữ liệu rủi ro và lợi nhuận', compute='_compute_risk_charts')
+    vintage_default_data = fields.Json('Vỡ nợ lũy kế theo cohort', compute='_compute_vintage_stats')
+    vintage_clean_data = fields.Json('Tất toán lũy kế theo cohort', compute='_compute_vintage_stats')
+    stress_result_id = fields.Many2one('p2p.stress.result', string='Lần mô phỏng stress',
+                                       compute='_compute_stress_result_id')
+    stress_computed_at = fields.Datetime(related='stress_result_id.computed_at', string='Mô phỏng lúc')
+    stress_scenario_count = fields.Integer(related='stress_result_id.scenario_count', string='Số kịch bản')
+    stress_expected_loss = fields.Float('Tổn thất kỳ vọng (EL)', compute='_compute_stress_stats')
+    stress_value_at_risk = fields.Float('VaR', compute='_compute_stress_stats')
+    stress_conditional_var = fields.Float('CVaR', compute='_compute_stress_stats')
+    stress_loss_distribution = fields.Json('Phân bố tổn thất mô phỏng', compute='_compute_stress_charts')
+
+    # ----- Distribution Stats -----
+    median_loan_amount = fields.Float('Giá trị khoản vay trung vị', compute='_compute_distribution_stats')
+    p90_loan_amount = fields.Float('Giá trị khoản vay P90', compute='_compute_distribution_stats')
+    p99_loan_amount = fields.Float('Giá trị khoản vay P99', compute='_compute_distribution_stats')
+    interest_rate_histogram = fields.Json('Phân bố lãi suất', compute='_compute_distribution_charts')
+    loans_by_term = fields.Json('Phân loại theo kỳ hạn', compute='_compute_distribution_charts')
+    distribution_note = fields.Char('Sai số thống kê phân bố', compute='_compute_distribution_stats')
 
     @api.depends('date_from', 'date_to')
     def _compute_loan_stats(self):
         for dashboard in self:
-            # Lấy dữ liệu từ p2p_bridge.p2p.loan: dùng created_date/created_at thay cho start_date
-            # Domain: (created_date trong khoảng) OR (created_at trong khoảng)
-            loan_domain = [
-                '|',
-                    '&', ('created_date', '>=', dashboard.date_from), ('created_date', '<=', dashboard.date_to),
-                    '&', ('created_at', '>=', fields.Datetime.to_datetime(dashboard.date_from)), ('created_at', '<=', fields.Datetime.to_datetime(dashboard.date_to)),
-            ]
-            
             try:
-                # Tính tổng số khoản vay và các trạng thái
-                loans = self.env['p2p.loan'].search(loan_domain)
-                dashboard.total_loans = len(loans)
-                # Trường p2p_bridge dùng 'capital' thay cho 'amount'
-                dashboard.total_loan_amount = sum(loan.capital for loan in loans if loan.capital)
-                
-                # Các trạng thái
-                # p2p_bridge.status: waiting, success, clean, fail
-                dashboard.active_loans = len(loans.filtered(lambda l: l.status in ['waiting', 'success']))
-                dashboard.funded_loans = len(loans.filtered(lambda l: l.status in ['success', 'clean']))
-                dashboard.defaulted_loans = len(loans.filtered(lambda l: l.status == 'fail'))
-                dashboard.completed_loans = len(loans.filtered(lambda l: l.status == 'clean'))
-                
-                # Tỷ lệ gọi vốn thành công
-                waiting_or_funding = len(loans.filtered(lambda l: l.status in ['waiting']))
-                if waiting_or_funding > 0:
-                    dashboard.loan_funding_rate = (dashboard.funded_loans / (dashboard.funded_loans + waiting_or_funding)) * 100
-                else:
-                    dashboard.loan_funding_rate = 0
-                
-                # Giá trị khoản vay trung bình
-                dashboard.average_loan_amount = dashboard.total_loan_amount / dashboard.total_loans if dashboard.total_loans > 0 else 0
-                
-                # Lãi suất trung bình
-                if dashboard.total_loans > 0:
-                    interest_rates = [loan.interest_rate for loan in loans if loan.interest_rate]
-                    dashboard.average_interest_rate = sum(interest_rates) / len(interest_rates) if interest_rates else 0
-                else:
-                    dashboard.average_interest_rate = 0
-                
-                # Phân loại theo trạng thái (dựa theo p2p_bridge.status)
-                state_data = {}
-                status_field = self.env['p2p.loan']._fields.get('status')
-                if status_field and status_field.type == 'selection':
-                    selection_dict = dict(status_field.selection)
-                    for state in selection_dict.keys():
-                        state_count = len(loans.filtered(lambda l, s=state: l.status == s))
-                        if state_count > 0:
-                            state_data[selection_dict[state]] = state_count
-                else:
-                    # Nếu không phải selection field, dùng trực tiếp giá trị
-                    status_counts = {}
-                    for loan in loans:
-                        status = loan.status
-                        status_counts[status] = status_counts.get(status, 0) + 1
-                    
-                    for status, count in status_counts.items():
-                        state_data[status or 'Không xác định'] = count
-                
-                # Nếu không có dữ liệu, thêm một mục "Không có dữ liệu"
-                if not state_data:
-                    state_data = {"Không có dữ liệu": 1}
-                
-                # Cấu trúc JSON cho Chart.js - Biểu đồ phân loại theo trạng thái
-                colors = self._get_chart_colors(len(state_data))
-                dashboard.loans_by_state = json.dumps({
-                    'labels': list(state_data.keys()),
-                    'datasets': [{
-                        'label': 'Khoản vay theo trạng thái',
-                        'data': list(state_data.values()),
-                        'backgroundColor': colors['backgroundColor'],
-                        'borderColor': colors['borderColor'],
-                        'borderWidth': 1
-                    }]
-                })
-                
-                # Cấu trúc JSON cho Chart.js - Biểu đồ trạng thái khoản vay
-                dashboard.chart_loan_status = json.dumps({
-                    'labels': list(state_data.keys()),
-                    'datasets': [{
-                        'label': 'Trạng thái khoản vay',
-                        'data': list(state_data.values()),
-                        'backgroundColor': colors['backgroundColor'],
-                        'borderColor': colors['borderColor'],
-                        'borderWidth': 1
-                    }]
-                })
-                
-                # Tạo biểu đồ phân loại theo mục đích (từ description hoặc willing)
-                # Nếu p2p.loan có trường 'willing', dùng làm mục đích
-                purpose_data = {}
-                if 'willing' in self.env['p2p.loan']._fields:
-                    # Lấy giá trị unique từ willing
-                    purpose_values = set(loan.willing for loan in loans if loan.willing)
-                    for purpose in purpose_values:
-                        purpose_count = len(loans.filtered(lambda l: l.willing == purpose))
-                        if purpose_count > 0:
-                            purpose_name = purpose if len(purpose) < 30 else purpose[:27] + '...'
-                            purpose_data[purpose_name] = purpose_count
-                else:
-                    # Thử dùng trường description nếu không có willing
-                    purpose_data = {"Cho vay": dashboard.total_loans}
-                
-                # Nếu không có dữ liệu, thêm một mục "Không có dữ liệu"
-                if not purpose_data:
-                    purpose_data = {"Không có dữ liệu": 1}
-                
-                # Cấu trúc JSON cho Chart.js
-                colors = self._get_chart_colors(len(purpose_data))
-                dashboard.loans_by_purpose = json.dumps({
-                    'labels': list(purpose_data.keys()),
-                    'datasets': [{
-                        'label': 'Khoản vay theo mục đích',
-                        'data': list(purpose_data.values()),
-                        'backgroundColor': colors['backgroundColor'],
-                        'borderColor': colors['borderColor'],
-                        'borderWidth': 1
-                    }]
-                })
+                dashboard.update(dashboard._get_section_values('loan_stats'))
             except Exception as e:
                 logger.warning(f"_compute_loan_stats skipped due to: {e}")
                 dashboard.total_loans = 0
@@ -186,162 +168,438 @@ class P2PDashboard(models.Model):
                 dashboard.loan_funding_rate = 0
                 dashboard.average_loan_amount = 0
                 dashboard.average_interest_rate = 0
+
+    def _build_loan_stats_values(self):
+        """Giá trị các trường thống kê khoản vay"""
+        self.ensure_one()
+        values = {}
+        # Số liệu dùng chung, chỉ tính một lần cho mỗi khoảng thời gian
+        snapshot = self._get_loan_snapshot()
+        status_counts = snapshot['status_counts']
+        values['total_loans'] = snapshot['total']
+        # Trường p2p_bridge dùng 'capital' thay cho 'amount'
+        values['total_loan_amount'] = snapshot['amount']
+
+        # Các trạng thái
+        # p2p_bridge.status: waiting, success, clean, fail
+        values['active_loans'] = status_counts.get('waiting', 0) + status_counts.get('success', 0)
+        values['funded_loans'] = status_counts.get('success', 0) + status_counts.get('clean', 0)
+        values['defaulted_loans'] = status_counts.get('fail', 0)
+        values['completed_loans'] = status_counts.get('clean', 0)
+
+        # Tỷ lệ gọi vốn thành công
+        waiting_or_funding = status_counts.get('waiting', 0)
+        if waiting_or_funding > 0:
+            values['loan_funding_rate'] = (values['funded_loans'] / (values['funded_loans'] + waiting_or_funding)) * 100
+        else:
+            values['loan_funding_rate'] = 0
+
+        # Giá trị khoản vay trung bình
+        values['average_loan_amount'] = values['total_loan_amount'] / values['total_loans'] if values['total_loans'] > 0 else 0
+
+        # Lãi suất trung bình (bỏ qua các khoản vay không có lãi suất)
+        if snapshot['rate_count'] > 0:
+            values['average_interest_rate'] = snapshot['rate_sum'] / snapshot['rate_count']
+        else:
+            values['average_interest_rate'] = 0
+        return values
+
+    @api.depends('date_from', 'date_to')
+    def _compute_loan_charts(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('loan_charts'))
+            except Exception as e:
+                logger.warning(f"_compute_loan_charts skipped due to: {e}")
                 dashboard.loans_by_purpose = json.dumps({})
                 dashboard.loans_by_state = json.dumps({})
                 dashboard.chart_loan_status = json.dumps({})
 
-    @api.depends('date_from', 'date_to')
+    def _build_loan_charts_values(self):
+        """Giá trị các biểu đồ phân loại khoản vay theo trạng thái và mục đích"""
+        self.ensure_one()
+        values = {}
+        snapshot = self._get_loan_snapshot()
+        status_counts = snapshot['status_counts']
+
+        # Phân loại theo trạng thái (dựa theo p2p_bridge.status)
+        state_data = {}
+        status_field = self.env['p2p.loan']._fields.get('status')
+        if status_field and status_field.type == 'selection':
+            selection_dict = dict(status_field.selection)
+            for state in selection_dict.keys():
+                state_count = status_counts.get(state, 0)
+                if state_count > 0:
+                    state_data[selection_dict[state]] = state_count
+        else:
+            # Nếu không phải selection field, dùng trực tiếp giá trị
+            for status, count in status_counts.items():
+                state_data[status or 'Không xác định'] = count
+
+        # Nếu không có dữ liệu, thêm một mục "Không có dữ liệu"
+        if not state_data:
+            state_data = {"Không có dữ liệu": 1}
+
+        # Cấu trúc JSON cho Chart.js - Biểu đồ phân loại theo trạng thái
+        colors = self._get_chart_colors(len(state_data))
+        values['loans_by_state'] = json.dumps({
+            'labels': list(state_data.keys()),
+            'datasets': [{
+                'label': 'Khoản vay theo trạng thái',
+                'data': list(state_data.values()),
+                'backgroundColor': colors['backgroundColor'],
+                'borderColor': colors['borderColor'],
+                'borderWidth': 1
+            }]
+        })
+
+        # Cấu trúc JSON cho Chart.js - Biểu đồ trạng thái khoản vay
+        values['chart_loan_status'] = json.dumps({
+            'labels': list(state_data.keys()),
+            'datasets': [{
+                'label': 'Trạng thái khoản vay',
+                'data': list(state_data.values()),
+                'backgroundColor': colors['backgroundColor'],
+                'borderColor': colors['borderColor'],
+                'borderWidth': 1
+            }]
+        })
+
+        # Tạo biểu đồ phân loại theo mục đích (từ description hoặc willing)
+        # Nếu p2p.loan có trường 'willing', dùng làm mục đích
+        purpose_data = {}
+        if 'willing' in self.env['p2p.loan']._fields:
+            for purpose, purpose_count in snapshot['purpose_counts'].items():
+                purpose_name = purpose if len(purpose) < 30 else purpose[:27] + '...'
+                purpose_data[purpose_name] = purpose_data.get(purpose_name, 0) + purpose_count
+        else:
+            # Thử dùng trường description nếu không có willing
+            purpose_data = {"Cho vay": snapshot['total']}
+
+        # Nếu không có dữ liệu, thêm một mục "Không có dữ liệu"
+        if not purpose_data:
+            purpose_data = {"Không có dữ liệu": 1}
+
+        # Cấu trúc JSON cho Chart.js
+        colors = self._get_chart_colors(len(purpose_data))
+        values['loans_by_purpose'] = json.dumps({
+            'labels': list(purpose_data.keys()),
+            'datasets': [{
+                'label': 'Khoản vay theo mục đích',
+                'data': list(purpose_data.values()),
+                'backgroundColor': colors['backgroundColor'],
+                'borderColor': colors['borderColor'],
+                'borderWidth': 1
+            }]
+        })
+        return values
+
+    @api.depends('date_from', 'date_to', 'trend_granularity')
     def _compute_loan_trend_data(self):
         for dashboard in self:
             try:
-                # Tính khoảng thời gian theo tháng
-                months = self._get_months_between(dashboard.date_from, dashboard.date_to)
-                
-                # Đảm bảo luôn có dữ liệu cho biểu đồ
-                if not months:
-                    months = [
-                        (dashboard.date_from, dashboard.date_to, "Không có dữ liệu")
-                    ]
-                
-                # Dữ liệu xu hướng khoản vay
-                loan_counts = []
-                loan_amounts = []
-                
-                for month_start, month_end, month_label in months:
-                    loans_in_month = self.env['p2p.loan'].search([
-                        '|',
-                            '&', ('created_date', '>=', month_start), ('created_date', '<=', month_end),
-                            '&', ('created_at', '>=', fields.Datetime.to_datetime(month_start)), ('created_at', '<=', fields.Datetime.to_datetime(month_end)),
-                    ])
-                    
-                    loan_counts.append(len(loans_in_month))
-                    loan_amounts.append(sum(loan.capital for loan in loans_in_month if loan.capital))
-                
-                # Dữ liệu xu hướng số lượng khoản vay - Cấu trúc JSON cho Chart.js
-                dashboard.loan_trend_data = json.dumps({
-                    'labels': [m[2] for m in months],
-                    'datasets': [{
-                        'label': 'Số khoản vay',
-                        'data': loan_counts,
-                        'backgroundColor': 'rgba(75, 192, 192, 0.6)',
-                        'borderColor': 'rgb(75, 192, 192)',
-                        'borderWidth': 1,
-                        'tension': 0.1
-                    }]
-                })
-                
-                # Dữ liệu xu hướng giá trị khoản vay - Cấu trúc JSON cho Chart.js
-                dashboard.loan_amount_trend_data = json.dumps({
-                    'labels': [m[2] for m in months],
-                    'datasets': [{
-                        'label': 'Giá trị khoản vay',
-                        'data': loan_amounts,
-                        'backgroundColor': 'rgba(153, 102, 255, 0.6)',
-                        'borderColor': 'rgb(153, 102, 255)',
-                        'borderWidth': 1,
-                        'tension': 0.1
-                    }]
-                })
+                dashboard.update(dashboard._get_section_values('loan_trend'))
             except Exception as e:
                 logger.warning(f"_compute_loan_trend_data skipped due to: {e}")
                 dashboard.loan_trend_data = json.dumps({})
                 dashboard.loan_amount_trend_data = json.dumps({})
 
+    def _build_loan_trend_values(self):
+        """Giá trị các trường xu hướng khoản vay"""
+        self.ensure_one()
+        values = {}
+        # Một truy vấn GROUP BY date_trunc cho toàn bộ khoảng thời gian
+        series = []
+        if self.date_from and self.date_to:
+            series = self._get_loan_trend_series(
+                self.date_from, self.date_to, self.trend_granularity or 'month')
+
+        # Đảm bảo luôn có dữ liệu cho biểu đồ
+        if not series:
+            series = [(self.date_from, "Không có dữ liệu", 0, 0.0)]
+
+        labels = [label for _start, label, _count, _amount in series]
+        loan_counts = [count for _start, _label, count, _amount in series]
+        loan_amounts = [amount for _start, _label, _count, amount in series]
+
+        # Dữ liệu xu hướng số lượng khoản vay - Cấu trúc JSON cho Chart.js
+        values['loan_trend_data'] = json.dumps({
+            'labels': labels,
+            'datasets': [{
+                'label': 'Số khoản vay',
+                'data': loan_counts,
+                'backgroundColor': 'rgba(75, 192, 192, 0.6)',
+                'borderColor': 'rgb(75, 192, 192)',
+                'borderWidth': 1,
+                'tension': 0.1
+            }]
+        })
+
+        # Dữ liệu xu hướng giá trị khoản vay - Cấu trúc JSON cho Chart.js
+        values['loan_amount_trend_data'] = json.dumps({
+            'labels': labels,
+            'datasets': [{
+                'label': 'Giá trị khoản vay',
+                'data': loan_amounts,
+                'backgroundColor': 'rgba(153, 102, 255, 0.6)',
+                'borderColor': 'rgb(153, 102, 255)',
+                'borderWidth': 1,
+                'tension': 0.1
+            }]
+        })
+        return values
+
+    def _get_section_values(self, section):
+        """Giá trị các trường của một nhóm chỉ số.
+
+        Thứ tự: ảnh chụp do cron tính sẵn cho các khoảng thời gian chuẩn, rồi
+        cache dùng chung. Cả hai chỉ được dùng khi tính ở đúng phiên bản dữ liệu
+        hiện tại, nên kết quả cũ tự hết hiệu lực sau mỗi lần đồng bộ và luôn
+        khớp với ETag của _get_chart_etag.
+        """
+        self.ensure_one()
+        key = self._get_section_cache_key(section)
+        data_version = self.env['p2p.bridge']._get_data_version()
+        values = self.env['p2p.dashboard.snapshot']._lookup(key, data_version)
+        if values is not None:
+            return values
+        cache = self.env['p2p.dashboard.cache']
+        values = cache._lookup(key, data_version)
+        if values is None:
+            values = getattr(self, f'_build_{section}_values')()
+            cache._store(key, data_version, values)
+        return values
+
+    def _get_section_cache_key(self, section):
+        self.ensure_one()
+        parts = [section, str(self.date_from), str(self.date_to), str(self.company_id.id)]
+        parts += [str(self[field_name]) for field_name in SECTION_KEY_FIELDS[section]]
+        return '|'.join(parts)
+
+    @api.depends('date_from', 'date_to', 'company_id', 'trend_granularity', 'top_borrower_limit', 'analytics_mode')
+    def _compute_snapshot_computed_at(self):
+        snapshot_model = self.env['p2p.dashboard.snapshot']
+        data_version = self.env['p2p.bridge']._get_data_version()
+        for dashboard in self:
+            keys = [dashboard._get_section_cache_key(section) for section in SECTION_KEY_FIELDS]
+            dashboard.snapshot_computed_at = snapshot_model._get_computed_at(keys, data_version)
+
+    @api.model
+    def _get_standard_range(self, range_code):
+        """(date_from, date_to) của một khoảng thời gian chuẩn, tính theo ngày hôm nay"""
+        today = date.today()
+        if range_code == 'this_month':
+            return today.replace(day=1), today
+        if range_code == 'last_month':
+            last_month_end = today.replace(day=1) - timedelta(days=1)
+            return last_month_end.replace(day=1), last_month_end
+        if range_code == 'last_3_months':
+            return today - relativedelta(months=3), today
+        if range_code == 'this_year':
+            return today.replace(month=1, day=1), today
+        return today.replace(day=1) - timedelta(days=180), today
+
+    def _get_chart_etag(self, chart):
+        """ETag của một biểu đồ: đổi khi tham số bảng điều khiển hoặc phiên bản dữ liệu đổi"""
+        self.ensure_one()
+        key = self._get_section_cache_key(CHART_SECTIONS[chart])
+        data_version = self.env['p2p.bridge']._get_data_version()
+        digest = hashlib.sha1(f"{key}|{chart}".encode()).hexdigest()[:16]
+        return f'"{data_version}-{digest}"'
+
+    def _get_chart_data(self, chart):
+        """Dữ liệu JSON (Chart.js) của một biểu đồ, chỉ tính nhóm chỉ số chứa nó"""
+        self.ensure_one()
+        try:
+            return self._get_section_values(CHART_SECTIONS[chart])[chart]
+        except Exception as e:
+            logger.warning(f"_get_chart_data({chart}) skipped due to: {e}")
+            return json.dumps({})
+
+    def _get_loan_snapshot(self):
+        """Số liệu tổng hợp khoản vay dùng chung cho mọi compute của bảng điều khiển.
+
+        Được tính một lần cho mỗi khóa (date_from, date_to, company) và phiên bản
+        dữ liệu; ghi p2p.loan trong cùng transaction sẽ xóa kết quả đã nhớ.
+        """
+        self.ensure_one()
+        snapshots = self.env['p2p.bridge']._get_loan_memo('p2p.dashboard.loan_snapshot')
+        key = (self.date_from, self.date_to, self.company_id.id)
+        if key not in snapshots:
+            snapshots[key] = self._build_loan_snapshot(self.date_from, self.date_to)
+        return snapshots[key]
+
+    @api.model
+    def _build_loan_snapshot(self, date_from, date_to):
+        """Cộng dồn mọi chỉ số của khoảng thời gian.
+
+        Số lượng, giá trị, trạng thái, mục đích và lãi suất được đọc từ bảng rollup
+        p2p.loan.daily.stat; các chỉ số theo người vay xem _get_borrower_stats.
+        """
+        snapshot = {
+            'total': 0,
+            'amount': 0.0,
+            'status_counts': {},
+            'purpose_counts': {},
+            'rate_sum': 0.0,
+            'rate_count': 0,
+        }
+        if not date_from or not date_to:
+            return snapshot
+
+        status_counts = snapshot['status_counts']
+        purpose_counts = snapshot['purpose_counts']
+        rows = self.env['p2p.loan.daily.stat']._aggregate(date_from, date_to, groupby=['status', 'purpose'])
+        for row in rows:
+            snapshot['total'] += row['loan_count']
+            snapshot['amount'] += row['capital_sum'] or 0.0
+            snapshot['rate_sum'] += row['rate_sum'] or 0.0
+            snapshot['rate_count'] += row['rate_count'] or 0
+            status_counts[row['status']] = status_counts.get(row['status'], 0) + row['loan_count']
+            if row['purpose']:
+                purpose_counts[row['purpose']] = purpose_counts.get(row['purpose'], 0) + row['loan_count']
+        return snapshot
+
+    @api.model
+    def _get_borrower_stats(self, date_from, date_to, limit=5, sample_percent=None):
+        """Số người vay, số người vay đang hoạt động và top `limit` người vay theo tổng vốn.
+
+        Tất cả được tính trong một truy vấn: GROUP BY người vay, các hàm cửa sổ
+        trên kết quả nhóm cho số người vay phân biệt, ORDER BY ... LIMIT cho top.
+        Với sample_percent, truy vấn chạy trên mẫu TABLESAMPLE và tổng vốn được
+        nhân ngược theo tỷ lệ mẫu (số người vay khi đó chỉ là số trong mẫu).
+        :return: (total_borrowers, active_borrowers, [(borrower_id, total_borrowed)])
+        """
+        if not date_from or not date_to:
+            return 0, 0, []
+        self.env['p2p.loan'].flush_model(['created_date', 'created_at', 'status', 'capital', 'borrower_id'])
+        source_sql, source_params = self._get_loan_source_sql(sample_percent)
+        self.env.cr.execute(f"""
+            SELECT borrower_id,
+                   COALESCE(SUM(capital), 0) AS total_borrowed,
+                   COUNT(*) OVER () AS total_borrowers,
+                   SUM(bool_or(status = 'success')::int) OVER () AS active_borrowers
+              FROM {source_sql}
+             WHERE {LOAN_DATE_SQL} BETWEEN %s AND %s
+               AND borrower_id IS NOT NULL
+          GROUP BY borrower_id
+          ORDER BY total_borrowed DESC, borrower_id
+             LIMIT %s
+        """, source_params + [date_from, date_to, limit])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return 0, 0, []
+        scale = 100.0 / sample_percent if sample_percent else 1.0
+        top = [(borrower_id, float(total) * scale) for borrower_id, total, _count, _active in rows if total]
+        return rows[0][2], int(rows[0][3] or 0), top
+
+    def _get_borrower_stats_memo(self, sample_percent=None):
+        """_get_borrower_stats của bảng điều khiển, nhớ theo transaction để KPI và
+        biểu đồ top người vay dùng chung một truy vấn"""
+        self.ensure_one()
+        limit = max(self.top_borrower_limit or 5, 1)
+        memo = self.env['p2p.bridge']._get_loan_memo('p2p.dashboard.borrower_stats')
+        key = (self.date_from, self.date_to, self.company_id.id, limit, sample_percent)
+        if key not in memo:
+            if self.date_from and self.date_to:
+                memo[key] = self._get_borrower_stats(
+                    self.date_from, self.date_to, limit=limit, sample_percent=sample_percent)
+            else:
+                memo[key] = (0, 0, [])
+        return memo[key]
+
+    @api.model
+    def _get_sample_percent(self):
+        """Tỷ lệ mẫu (%) cho chế độ ước lượng"""
+        value = self.env['ir.config_parameter'].sudo().get_param('p2p_dashboard.sample_percent', DEFAULT_SAMPLE_PERCENT)
+        return min(max(float(value), 0.01), 100.0)
+
+    @api.model
+    def _get_loan_source_sql(self, sample_percent=None):
+        """Mệnh đề FROM cho p2p_loan: toàn bảng hoặc mẫu TABLESAMPLE (lặp lại được để cache ổn định)"""
+        if not sample_percent or sample_percent >= 100:
+            return "p2p_loan", []
+        return "p2p_loan TABLESAMPLE SYSTEM (%s) REPEATABLE (0)", [sample_percent]
+
+    @api.model
+    def _get_borrower_names(self, borrower_ids):
+        """Tên hiển thị của các người vay, tra cứu một lần cho cả danh sách"""
+        names = {}
+        if not borrower_ids or 'p2p.user' not in self.env:
+            return names
+        try:
+            for p2p_user in self.env['p2p.user'].search([('user_id', 'in', list(borrower_ids))]):
+                display_name = p2p_user.display_name or p2p_user.name or p2p_user.username
+                if display_name:
+                    names.setdefault(p2p_user.user_id, display_name)
+        except Exception as e:
+            logger.warning(f"Could not get user names from Odoo: {e}")
+        return names
+
+    def _get_loan_trend_series(self, date_from, date_to, granularity='month'):
+        """Trả về [(ngày bắt đầu kỳ, nhãn, số khoản vay, tổng giá trị)] cho từng kỳ.
+
+        Toàn bộ chuỗi được tính bằng một truy vấn GROUP BY date_trunc trên bảng rollup
+        p2p.loan.daily.stat, các kỳ không có khoản vay được bổ sung với giá trị 0.
+        """
+        if granularity not in _TREND_GRANULARITIES:
+            granularity = 'month'
+        rows = self.env['p2p.loan.daily.stat']._aggregate(date_from, date_to, granularity=granularity)
+        totals = {row['period']: (row['loan_count'], row['capital_sum'] or 0.0) for row in rows}
+
+        series = []
+        for period_start, label in self._get_periods_between(date_from, date_to, granularity):
+            count, amount = totals.get(period_start, (0, 0.0))
+            series.append((period_start, label, count, amount))
+        return series
+
 # Removed investment stats compute method as it's no longer needed
 
 # Removed investment trend data compute method as it's no longer needed
 
-    @api.depends('date_from', 'date_to')
+    @api.depends('date_from', 'date_to', 'analytics_mode')
     def _compute_user_stats(self):
         for dashboard in self:
             try:
-                # Lấy tất cả khoản vay trong khoảng thời gian
-                loans = self.env['p2p.loan'].search([
-                    '|',
-                        '&', ('created_date', '>=', dashboard.date_from), ('created_date', '<=', dashboard.date_to),
-                        '&', ('created_at', '>=', fields.Datetime.to_datetime(dashboard.date_from)), ('created_at', '<=', fields.Datetime.to_datetime(dashboard.date_to)),
-                ])
-                
-                # Tính unique borrowers
-                unique_borrowers = set(loan.borrower_id for loan in loans if loan.borrower_id)
-                dashboard.total_borrowers = len(unique_borrowers)
-                
-                # Người vay đang hoạt động (có khoản vay đang ở trạng thái success)
-                active_loans = loans.filtered(lambda l: l.status == 'success')
-                active_borrowers = set(loan.borrower_id for loan in active_loans if loan.borrower_id)
-                dashboard.active_borrowers = len(active_borrowers)
-                
-                # Top người vay
-                top_borrowers_data = {}
-                
-                # Trước tiên, tính tổng số tiền vay của mỗi người
-                for loan in loans:
-                    if not loan.borrower_id or not loan.capital:
-                        continue
-                    
-                    borrower_id = loan.borrower_id
-                    capital = loan.capital or 0
-                    
-                    if borrower_id in top_borrowers_data:
-                        top_borrowers_data[borrower_id]['total_borrowed'] += capital
-                    else:
-                        # Hiện tạm ID, sau đó cố gắng lấy tên thật
-                        top_borrowers_data[borrower_id] = {
-                            'borrower_id': borrower_id,
-                            'borrower_name': f"Người vay {borrower_id[:8]}...",  # Hiển thị ID ngắn gọn
-                            'total_borrowed': capital
-                        }
-                
-                # Cố gắng lấy tên thật từ Odoo
-                try:
-                    # Kiểm tra xem p2p.user model có tồn tại không
-                    if 'p2p.user' in self.env:
-                        user_model = self.env['p2p.user']
-                        for borrower_id in top_borrowers_data:
-                            p2p_user = user_model.search([('user_id', '=', borrower_id)], limit=1)
-                            if p2p_user:
-                                display_name = p2p_user.display_name or p2p_user.name or p2p_user.username
-                                if display_name:
-                                    top_borrowers_data[borrower_id]['borrower_name'] = display_name
-                except Exception as e:
-                    logger.warning(f"Could not get user names from Odoo: {e}")
-                            
-                
-                # Chuyển dict thành list và sắp xếp
-                top_borrowers_list = list(top_borrowers_data.values())
-                top_borrowers_list = sorted(top_borrowers_list, key=lambda x: x['total_borrowed'], reverse=True)[:5]
-                
-                # Tạo biểu đồ top borrowers
-                labels = [item['borrower_name'] for item in top_borrowers_list]
-                values = [item['total_borrowed'] for item in top_borrowers_list]
-                
-                if labels:
-                    colors = self._get_chart_colors(len(labels))
-                    dashboard.top_borrowers = json.dumps({
-                        'labels': labels,
-                        'datasets': [{
-                            'label': 'Tổng số tiền vay',
-                            'data': values,
-                            'backgroundColor': colors['backgroundColor'],
-                            'borderColor': colors['borderColor'],
-                            'borderWidth': 1
-                        }]
-                    })
-                else:
-                    dashboard.top_borrowers = json.dumps({
-                        'labels': ["Không có dữ liệu"],
-                        'datasets': [{
-                            'label': 'Tổng số tiền vay',
-                            'data': [0],
-                            'backgroundColor': ['rgba(200, 200, 200, 0.6)'],
-                            'borderColor': ['rgb(200, 200, 200)'],
-                            'borderWidth': 1
-                        }]
-                    })
+                dashboard.update(dashboard._get_section_values('user_stats'))
             except Exception as e:
                 logger.warning(f"_compute_user_stats skipped due to: {e}")
                 dashboard.total_borrowers = 0
                 dashboard.active_borrowers = 0
+                dashboard.borrower_stats_note = False
+
+    def _build_user_stats_values(self):
+        """Giá trị các trường thống kê người vay"""
+        self.ensure_one()
+        values = {}
+        # Người vay đang hoạt động: có khoản vay đang ở trạng thái success
+        sample_percent = self._get_sample_percent() if self.analytics_mode == 'approximate' else None
+        values['borrower_stats_note'] = False
+        if not sample_percent:
+            total_borrowers, active_borrowers, _top_borrowers = self._get_borrower_stats_memo()
+        elif not (self.date_from and self.date_to):
+            total_borrowers, active_borrowers = 0, 0
+        else:
+            # Số người vay phân biệt ước lượng từ sketch, không đọc p2p_loan
+            sketch = self.env['p2p.loan.daily.sketch']
+            total_borrowers, total_error = sketch._estimate_borrowers(self.date_from, self.date_to)
+            active_borrowers, active_error = sketch._estimate_borrowers(
+                self.date_from, self.date_to, statuses=['success'])
+            values['borrower_stats_note'] = (
+                f"Ước lượng HyperLogLog: ±{2 * total_error:.0f} người vay, "
+                f"±{2 * active_error:.0f} người vay đang hoạt động (95%, ±{200 * HLL_RELATIVE_ERROR:.0f}%); "
+                f"top người vay tính trên mẫu {sample_percent:g}%")
+        values['total_borrowers'] = total_borrowers
+        values['active_borrowers'] = active_borrowers
+        return values
+
+    @api.depends('date_from', 'date_to', 'top_borrower_limit', 'analytics_mode')
+    def _compute_user_charts(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('user_charts'))
+            except Exception as e:
+                logger.warning(f"_compute_user_charts skipped due to: {e}")
                 dashboard.top_borrowers = json.dumps({
                     'labels': ["Không có dữ liệu"],
                     'datasets': [{
@@ -353,54 +611,72 @@ class P2PDashboard(models.Model):
                     }]
                 })
 
+    def _build_user_charts_values(self):
+        """Giá trị biểu đồ top người vay theo tổng vốn"""
+        self.ensure_one()
+        values = {}
+        sample_percent = self._get_sample_percent() if self.analytics_mode == 'approximate' else None
+        _total, _active, top_borrowers = self._get_borrower_stats_memo(sample_percent)
+
+        # Tên thật lấy từ Odoo nếu có, nếu không hiển thị ID ngắn gọn
+        names = self._get_borrower_names([borrower_id for borrower_id, _total in top_borrowers])
+        labels = [names.get(borrower_id) or f"Người vay {borrower_id[:8]}..." for borrower_id, _total in top_borrowers]
+        amounts = [total for _borrower_id, total in top_borrowers]
+
+        if labels:
+            colors = self._get_chart_colors(len(labels))
+            values['top_borrowers'] = json.dumps({
+                'labels': labels,
+                'datasets': [{
+                    'label': 'Tổng số tiền vay',
+                    'data': amounts,
+                    'backgroundColor': colors['backgroundColor'],
+                    'borderColor': colors['borderColor'],
+                    'borderWidth': 1
+                }]
+            })
+        else:
+            values['top_borrowers'] = json.dumps({
+                'labels': ["Không có dữ liệu"],
+                'datasets': [{
+                    'label': 'Tổng số tiền vay',
+                    'data': [0],
+                    'backgroundColor': ['rgba(200, 200, 200, 0.6)'],
+                    'borderColor': ['rgb(200, 200, 200)'],
+                    'borderWidth': 1
+                }]
+            })
+        return values
+
     @api.depends('date_from', 'date_to')
     def _compute_risk_stats(self):
         for dashboard in self:
             try:
-                # Lấy tất cả khoản vay trong khoảng thời gian
-                all_loans = self.env['p2p.loan'].search([
-                    '|',
-                        '&', ('created_date', '>=', dashboard.date_from), ('created_date', '<=', dashboard.date_to),
-                        '&', ('created_at', '>=', fields.Datetime.to_datetime(dashboard.date_from)), ('created_at', '<=', fields.Datetime.to_datetime(dashboard.date_to)),
-                ])
-
-                # Tỷ lệ vỡ nợ dựa trên status của p2p_bridge
-                completed_loans = all_loans.filtered(lambda l: l.status in ['clean', 'fail'])
-                if completed_loans:
-                    defaulted_loans = all_loans.filtered(lambda l: l.status == 'fail')
-                    dashboard.default_rate = (len(defaulted_loans) / len(completed_loans)) * 100
-                else:
-                    dashboard.default_rate = 0
-
-                # Dữ liệu biểu đồ rủi ro
-                risk_return_data = [{
-                    'label': 'Tổng hợp',
-                    'default_rate': dashboard.default_rate,
-                    'interest_rate': sum(loan.interest_rate for loan in all_loans if loan.interest_rate) / len(all_loans) if all_loans else 0
-                }]
-
-                dashboard.risk_return_data = json.dumps({
-                    'labels': [d['label'] for d in risk_return_data],
-                    'datasets': [
-                        {
-                            'label': 'Tỷ lệ vỡ nợ (%)',
-                            'data': [d['default_rate'] for d in risk_return_data],
-                            'backgroundColor': 'rgba(255, 99, 132, 0.6)',
-                            'borderColor': 'rgb(255, 99, 132)',
-                            'borderWidth': 1
-                        },
-                        {
-                            'label': 'Lãi suất trung bình (%)',
-                            'data': [d['interest_rate'] for d in risk_return_data],
-                            'backgroundColor': 'rgba(54, 162, 235, 0.6)',
-                            'borderColor': 'rgb(54, 162, 235)',
-                            'borderWidth': 1
-                        }
-                    ]
-                })
+                dashboard.update(dashboard._get_section_values('risk_stats'))
             except Exception as e:
                 logger.warning(f"_compute_risk_stats skipped due to: {e}")
                 dashboard.default_rate = 0
+
+    def _build_risk_stats_values(self):
+        """Giá trị các trường thống kê rủi ro"""
+        self.ensure_one()
+        return {'default_rate': self._get_default_rate(self._get_loan_snapshot())}
+
+    @api.model
+    def _get_default_rate(self, snapshot):
+        """Tỷ lệ vỡ nợ (%) trên các khoản vay đã kết thúc, dựa trên status của p2p_bridge"""
+        status_counts = snapshot['status_counts']
+        defaulted_count = status_counts.get('fail', 0)
+        completed_count = status_counts.get('clean', 0) + defaulted_count
+        return (defaulted_count / completed_count) * 100 if completed_count else 0
+
+    @api.depends('date_from', 'date_to')
+    def _compute_risk_charts(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('risk_charts'))
+            except Exception as e:
+                logger.warning(f"_compute_risk_charts skipped due to: {e}")
                 dashboard.risk_return_data = json.dumps({
                     'labels': ["Không có dữ liệu"],
                     'datasets': [
@@ -421,6 +697,339 @@ class P2PDashboard(models.Model):
                     ]
                 })
 
+    def _build_risk_charts_values(self):
+        """Giá trị biểu đồ rủi ro và lợi nhuận"""
+        self.ensure_one()
+        values = {}
+        snapshot = self._get_loan_snapshot()
+
+        # Dữ liệu biểu đồ rủi ro
+        risk_return_data = [{
+            'label': 'Tổng hợp',
+            'default_rate': self._get_default_rate(snapshot),
+            'interest_rate': snapshot['rate_sum'] / snapshot['rate_count'] if snapshot['rate_count'] else 0
+        }]
+
+        values['risk_return_data'] = json.dumps({
+            'labels': [d['label'] for d in risk_return_data],
+            'datasets': [
+                {
+                    'label': 'Tỷ lệ vỡ nợ (%)',
+                    'data': [d['default_rate'] for d in risk_return_data],
+                    'backgroundColor': 'rgba(255, 99, 132, 0.6)',
+                    'borderColor': 'rgb(255, 99, 132)',
+                    'borderWidth': 1
+                },
+                {
+                    'label': 'Lãi suất trung bình (%)',
+                    'data': [d['interest_rate'] for d in risk_return_data],
+                    'backgroundColor': 'rgba(54, 162, 235, 0.6)',
+                    'borderColor': 'rgb(54, 162, 235)',
+                    'borderWidth': 1
+                }
+            ]
+        })
+        return values
+
+    @api.depends('date_from', 'date_to', 'analytics_mode')
+    def _compute_distribution_stats(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('distribution'))
+            except Exception as e:
+                logger.warning(f"_compute_distribution_stats skipped due to: {e}")
+                dashboard.median_loan_amount = 0
+                dashboard.p90_loan_amount = 0
+                dashboard.p99_loan_amount = 0
+                dashboard.distribution_note = False
+
+    def _build_distribution_values(self):
+        """Giá trị các trường phân vị giá trị khoản vay"""
+        self.ensure_one()
+        values = {'median_loan_amount': 0, 'p90_loan_amount': 0, 'p99_loan_amount': 0, 'distribution_note': False}
+        if self.date_from and self.date_to:
+            sample_percent = self._get_sample_percent() if self.analytics_mode == 'approximate' else None
+            median, p90, p99, sample_size = self._get_loan_amount_percentiles(
+                self.date_from, self.date_to, sample_percent=sample_percent)
+            values.update(median_loan_amount=median, p90_loan_amount=p90, p99_loan_amount=p99)
+            if sample_percent:
+                # Sai số của trung vị trên mẫu n phần tử: khoảng hạng ±1.96·sqrt(n)/2 (95%)
+                rank_error = 100 * 0.98 / math.sqrt(sample_size) if sample_size else 100
+                values['distribution_note'] = (
+                    f"Ước lượng trên mẫu {sample_percent:g}% ({sample_size} khoản vay): "
+                    f"trung vị sai lệch tối đa ±{rank_error:.1f} điểm phân vị (95%)")
+        return values
+
+    @api.depends('date_from', 'date_to', 'analytics_mode')
+    def _compute_distribution_charts(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('distribution_charts'))
+            except Exception as e:
+                logger.warning(f"_compute_distribution_charts skipped due to: {e}")
+                dashboard.interest_rate_histogram = json.dumps({})
+                dashboard.loans_by_term = json.dumps({})
+
+    def _build_distribution_charts_values(self):
+        """Giá trị các biểu đồ phân bố lãi suất và kỳ hạn"""
+        self.ensure_one()
+        values = {}
+        rate_counts = {}
+        term_counts = {}
+        if self.date_from and self.date_to:
+            sample_percent = self._get_sample_percent() if self.analytics_mode == 'approximate' else None
+            rate_counts = self._get_interest_rate_histogram(self.date_from, self.date_to, sample_percent=sample_percent)
+            term_counts = self._get_term_breakdown(self.date_from, self.date_to)
+
+        # Biểu đồ phân bố lãi suất: giữ đủ các khoảng để trục x ổn định
+        low, high, count = _RATE_HISTOGRAM_BOUNDS
+        width = (high - low) / count
+        labels = [f"< {low}%"]
+        labels += [f"{low + i * width:g}-{low + (i + 1) * width:g}%" for i in range(count)]
+        labels.append(f">= {high}%")
+        values['interest_rate_histogram'] = json.dumps({
+            'labels': labels,
+            'datasets': [{
+                'label': 'Số khoản vay',
+                'data': [rate_counts.get(bucket, 0) for bucket in range(count + 2)],
+                'backgroundColor': 'rgba(255, 159, 64, 0.6)',
+                'borderColor': 'rgb(255, 159, 64)',
+                'borderWidth': 1
+            }]
+        })
+
+        # Biểu đồ theo kỳ hạn
+        bounds = (1,) + _TERM_BUCKET_THRESHOLDS
+        labels = [f"{bounds[i]}-{bounds[i + 1] - 1} tháng" for i in range(len(_TERM_BUCKET_THRESHOLDS))]
+        labels[0] = f"<= {_TERM_BUCKET_THRESHOLDS[0] - 1} tháng"
+        labels.append(f"> {_TERM_BUCKET_THRESHOLDS[-1] - 1} tháng")
+        term_data = {labels[bucket]: term_counts[bucket] for bucket in range(len(labels)) if term_counts.get(bucket)}
+        if not term_data:
+            term_data = {"Không có dữ liệu": 1}
+        colors = self._get_chart_colors(len(term_data))
+        values['loans_by_term'] = json.dumps({
+            'labels': list(term_data.keys()),
+            'datasets': [{
+                'label': 'Khoản vay theo kỳ hạn',
+                'data': list(term_data.values()),
+                'backgroundColor': colors['backgroundColor'],
+                'borderColor': colors['borderColor'],
+                'borderWidth': 1
+            }]
+        })
+        return values
+
+    @api.model
+    def _get_loan_amount_percentiles(self, date_from, date_to, sample_percent=None):
+        """(trung vị, P90, P99, số khoản vay) của giá trị khoản vay, tính bằng percentile_cont"""
+        self.env['p2p.loan'].flush_model(['created_date', 'created_at', 'capital'])
+        source_sql, source_params = self._get_loan_source_sql(sample_percent)
+        self.env.cr.execute(f"""
+            SELECT percentile_cont(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY capital), COUNT(*)
+              FROM {source_sql}
+             WHERE {LOAN_DATE_SQL} BETWEEN %s AND %s
+               AND capital IS NOT NULL
+        """, source_params + [date_from, date_to])
+        percentiles, sample_size = self.env.cr.fetchone()
+        median, p90, p99 = (float(value or 0) for value in (percentiles or [0, 0, 0]))
+        return median, p90, p99, sample_size
+
+    @api.model
+    def _get_interest_rate_histogram(self, date_from, date_to, sample_percent=None):
+        """{số thứ tự khoảng: số khoản vay} theo width_bucket trên lãi suất.
+
+        Khoảng 0 là dưới cận dưới, khoảng count + 1 là từ cận trên trở lên.
+        Trên mẫu TABLESAMPLE, số lượng được nhân ngược theo tỷ lệ mẫu.
+        """
+        low, high, count = _RATE_HISTOGRAM_BOUNDS
+        self.env['p2p.loan'].flush_model(['created_date', 'created_at', 'interest_rate'])
+        source_sql, source_params = self._get_loan_source_sql(sample_percent)
+        self.env.cr.execute(f"""
+            SELECT width_bucket(interest_rate, %s, %s, %s) AS bucket, COUNT(*)
+              FROM {source_sql}
+             WHERE {LOAN_DATE_SQL} BETWEEN %s AND %s
+               AND interest_rate IS NOT NULL AND interest_rate <> 0
+          GROUP BY bucket
+        """, [low, high, count] + source_params + [date_from, date_to])
+        scale = 100.0 / sample_percent if sample_percent else 1
+        return {bucket: round(total * scale) for bucket, total in self.env.cr.fetchall()}
+
+    @api.model
+    def _get_term_breakdown(self, date_from, date_to):
+        """{số thứ tự nhóm kỳ hạn: số khoản vay}, tính trên bảng rollup"""
+        self.env['p2p.loan.daily.stat'].flush_model()
+        self.env.cr.execute("""
+            SELECT width_bucket(term_months, %s::int[]) AS bucket, SUM(loan_count)
+              FROM p2p_loan_daily_stat
+             WHERE day BETWEEN %s AND %s
+               AND term_months > 0
+          GROUP BY bucket
+        """, (list(_TERM_BUCKET_THRESHOLDS), date_from, date_to))
+        return {bucket: int(total) for bucket, total in self.env.cr.fetchall()}
+
+    @api.depends('date_from', 'date_to')
+    def _compute_vintage_stats(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('vintage'))
+            except Exception as e:
+                logger.warning(f"_compute_vintage_stats skipped due to: {e}")
+                dashboard.vintage_default_data = json.dumps({})
+                dashboard.vintage_clean_data = json.dumps({})
+
+    def _build_vintage_values(self):
+        """Đường cong vỡ nợ/tất toán lũy kế theo tháng trên sổ của các cohort giải ngân"""
+        self.ensure_one()
+        today = date.today()
+        cohorts, sizes, default_rates, clean_rates = vintage.vintage_curves(
+            *self._get_vintage_extract(self.date_from, self.date_to),
+            as_of=vintage.month_index(today.year, today.month))
+
+        # Chỉ vẽ các cohort gần nhất có khoản vay; trục x là tháng trên sổ
+        shown = np.flatnonzero(sizes)[-_VINTAGE_CHART_COHORTS:]
+        width = default_rates.shape[1] if shown.size else 0
+        labels = [f"Tháng {mob}" for mob in range(width)]
+        colors = self._get_chart_colors(len(shown))
+
+        def curve_chart(rates):
+            datasets = []
+            for position, row in enumerate(shown):
+                cohort = int(cohorts[row])
+                datasets.append({
+                    'label': f"{cohort % 12 + 1:02d}/{cohort // 12} ({int(sizes[row])})",
+                    'data': [None if np.isnan(rate) else round(float(rate) * 100, 2) for rate in rates[row]],
+                    'backgroundColor': colors['backgroundColor'][position],
+                    'borderColor': colors['borderColor'][position],
+                    'borderWidth': 1,
+                    'fill': False,
+                    'tension': 0.1
+                })
+            if not datasets:
+                return json.dumps({'labels': ["Không có dữ liệu"], 'datasets': []})
+            return json.dumps({'labels': labels, 'datasets': datasets})
+
+        return {
+            'vintage_default_data': curve_chart(default_rates),
+            'vintage_clean_data': curve_chart(clean_rates),
+        }
+
+    @api.depends('company_id')
+    def _compute_stress_result_id(self):
+        result_model = self.env['p2p.stress.result']
+        for dashboard in self:
+            dashboard.stress_result_id = result_model._get_latest(dashboard.company_id or self.env.company)
+
+    @api.depends('stress_result_id')
+    def _compute_stress_stats(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('stress'))
+            except Exception as e:
+                logger.warning(f"_compute_stress_stats skipped due to: {e}")
+                dashboard.stress_expected_loss = 0
+                dashboard.stress_value_at_risk = 0
+                dashboard.stress_conditional_var = 0
+
+    def _build_stress_values(self):
+        """Chỉ số tổn thất của lần mô phỏng stress gần nhất (p2p.stress.result)"""
+        self.ensure_one()
+        result = self.stress_result_id
+        return {
+            'stress_expected_loss': result.expected_loss,
+            'stress_value_at_risk': result.value_at_risk,
+            'stress_conditional_var': result.conditional_var,
+        }
+
+    @api.depends('stress_result_id')
+    def _compute_stress_charts(self):
+        for dashboard in self:
+            try:
+                dashboard.update(dashboard._get_section_values('stress_charts'))
+            except Exception as e:
+                logger.warning(f"_compute_stress_charts skipped due to: {e}")
+                dashboard.stress_loss_distribution = json.dumps({})
+
+    def _build_stress_charts_values(self):
+        """Biểu đồ phân bố tổn thất của lần mô phỏng stress gần nhất"""
+        self.ensure_one()
+        result = self.stress_result_id
+        distribution = json.loads(result.loss_distribution or '{}')
+        chart = {'labels': ["Không có dữ liệu"], 'datasets': []}
+        if distribution.get('counts'):
+            chart = {
+                'labels': distribution['labels'],
+                'datasets': [{
+                    'label': 'Số kịch bản',
+                    'data': distribution['counts'],
+                    'backgroundColor': 'rgba(255, 99, 132, 0.6)',
+                    'borderColor': 'rgb(255, 99, 132)',
+                    'borderWidth': 1
+                }]
+            }
+        return {'stress_loss_distribution': json.dumps(chart)}
+
+    @api.model
+    def _get_vintage_extract(self, date_from, date_to):
+        """Trích xuất dạng cột cho engine vintage: (tháng giải ngân, tháng đáo hạn, kết cục).
+
+        Chỉ số tháng và mã kết cục được tính trong SQL; kết quả chuyển thẳng thành
+        một mảng NumPy số nguyên, không tạo bản ghi ORM.
+        """
+        if not date_from or not date_to:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+        columns = self.env['p2p.bridge']._get_loan_columns()
+        if columns is not None:
+            return self._get_vintage_extract_from_columns(columns, date_from, date_to)
+        self.env['p2p.loan'].flush_model(['created_date', 'created_at', 'maturity_date', 'status'])
+        self.env.cr.execute(f"""
+            SELECT (EXTRACT(YEAR FROM {LOAN_DATE_SQL}) * 12 + EXTRACT(MONTH FROM {LOAN_DATE_SQL}) - 1)::int,
+                   COALESCE((EXTRACT(YEAR FROM maturity_date) * 12 + EXTRACT(MONTH FROM maturity_date) - 1)::int, -1),
+                   CASE status WHEN 'fail' THEN %s WHEN 'clean' THEN %s ELSE %s END
+              FROM p2p_loan
+             WHERE {LOAN_DATE_SQL} BETWEEN %s AND %s
+        """, (vintage.OUTCOME_DEFAULT, vintage.OUTCOME_CLEAN, vintage.OUTCOME_OPEN, date_from, date_to))
+        columns = np.array(self.env.cr.fetchall(), dtype=np.int64).reshape(-1, 3)
+        return columns[:, 0], columns[:, 1], columns[:, 2]
+
+    @api.model
+    def _get_vintage_extract_from_columns(self, columns, date_from, date_to):
+        """Như _get_vintage_extract nhưng đọc từ bản chụp dạng cột ánh xạ bộ nhớ"""
+        epoch = date(1970, 1, 1)
+        loan_day = columns['loan_day']
+        mask = (loan_day >= (date_from - epoch).days) & (loan_day <= (date_to - epoch).days)
+
+        def to_month_index(days):
+            # datetime64[M] đếm số tháng kể từ 01/1970
+            months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+            return np.where(days >= 0, months + vintage.month_index(1970, 1), -1)
+
+        status = columns['status'][mask]
+        outcome = np.full(status.shape, vintage.OUTCOME_OPEN, dtype=np.int8)
+        outcome[status == LOAN_STATUS_CODES['fail']] = vintage.OUTCOME_DEFAULT
+        outcome[status == LOAN_STATUS_CODES['clean']] = vintage.OUTCOME_CLEAN
+        return to_month_index(loan_day[mask]), to_month_index(columns['maturity_day'][mask]), outcome
+
+    def _get_periods_between(self, date_from, date_to, granularity='month'):
+        """Trả về danh sách (ngày bắt đầu kỳ, nhãn) giữa hai ngày theo chu kỳ"""
+        if granularity == 'month':
+            return [(month_start, label) for month_start, _month_end, label in self._get_months_between(date_from, date_to)]
+        
+        if granularity == 'week':
+            # date_trunc('week') của PostgreSQL bắt đầu tuần từ thứ Hai
+            current_date = date_from - timedelta(days=date_from.weekday())
+            step = timedelta(weeks=1)
+            label_format = "Tuần %d/%m/%Y"
+        else:
+            current_date = date_from
+            step = timedelta(days=1)
+            label_format = "%d/%m/%Y"
+        
+        periods = []
+        while current_date <= date_to:
+            periods.append((current_date, current_date.strftime(label_format)))
+            current_date += step
+        return periods
+
     def _get_months_between(self, date_from, date_to):
         """Trả về danh sách các tháng giữa hai ngày"""
         months = []
@@ -486,66 +1095,54 @@ class P2PDashboard(models.Model):
             'borderColor': border_color_list
         }
 
+    def action_run_stress_simulation(self):
+        """Chạy mô phỏng stress ở nền (cron), kết quả hiện khi lần chạy kết thúc"""
+        self.ensure_one()
+        self.check_access('write')
+        # Cron được kích hoạt bằng sudo nên phải kiểm tra quyền giống nút trên form
+        if not self.env.user.has_group('base.group_system'):
+            raise AccessError("Chỉ quản trị hệ thống mới được chạy mô phỏng stress.")
+        self.env.ref('p2p_dashboard.ir_cron_run_stress_simulation').sudo()._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Mô phỏng stress',
+                'message': 'Đã đưa mô phỏng vào hàng đợi, vui lòng cập nhật lại sau ít phút.',
+                'type': 'info',
+                'sticky': False,
+            }
+        }
+
     def action_refresh_dashboard(self):
         """Làm mới dữ liệu bảng điều khiển"""
         self.ensure_one()
         return True
         
-    def action_this_month(self):
-        """Thiết lập khoảng thời gian là tháng hiện tại"""
+    def _set_standard_range(self, range_code):
         self.ensure_one()
-        today = date.today()
+        date_from, date_to = self._get_standard_range(range_code)
         self.write({
-            'date_from': today.replace(day=1),
-            'date_to': today
+            'date_from': date_from,
+            'date_to': date_to
         })
         return True
+
+    def action_this_month(self):
+        """Thiết lập khoảng thời gian là tháng hiện tại"""
+        return self._set_standard_range('this_month')
         
     def action_last_month(self):
         """Thiết lập khoảng thời gian là tháng trước"""
-        self.ensure_one()
-        today = date.today()
-        
-        # Tháng trước
-        if today.month == 1:
-            last_month_start = today.replace(year=today.year-1, month=12, day=1)
-        else:
-            last_month_start = today.replace(month=today.month-1, day=1)
-            
-        # Ngày cuối tháng trước
-        if last_month_start.month == 12:
-            last_month_end = last_month_start.replace(day=31)
-        else:
-            last_month_end = today.replace(day=1) - timedelta(days=1)
-            
-        self.write({
-            'date_from': last_month_start,
-            'date_to': last_month_end
-        })
-        return True
+        return self._set_standard_range('last_month')
         
     def action_last_3_months(self):
         """Thiết lập khoảng thời gian là 3 tháng gần nhất"""
-        self.ensure_one()
-        today = date.today()
-        three_months_ago = today - relativedelta(months=3)
-        
-        self.write({
-            'date_from': three_months_ago,
-            'date_to': today
-        })
-        return True
+        return self._set_standard_range('last_3_months')
         
     def action_this_year(self):
         """Thiết lập khoảng thời gian là năm hiện tại"""
-        self.ensure_one()
-        today = date.today()
-        
-        self.write({
-            'date_from': today.replace(month=1, day=1),
-            'date_to': today
-        })
-        return True
+        return self._set_standard_range('this_year')
         
     @api.model_create_multi
     def create(self, vals_list):
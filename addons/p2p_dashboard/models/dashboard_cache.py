@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+import json
+import logging
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Giá trị mặc định, có thể ghi đè bằng tham số hệ thống cùng tên
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_CACHE_SIZE = 200
+# Chỉ cập nhật last_access (LRU) khi lần truy cập trước cũ hơn khoảng này (giây)
+CACHE_TOUCH_INTERVAL = 300
+
+
+class P2PDashboardCache(models.Model):
+    _name = 'p2p.dashboard.cache'
+    _description = 'Cache kết quả bảng điều khiển P2P'
+    _order = 'last_access desc'
+    _rec_name = 'key'
+
+    key = fields.Char('Khóa', required=True, index=True)
+    data_version = fields.Integer('Phiên bản dữ liệu', required=True)
+    payload = fields.Text('Giá trị (JSON)', required=True)
+    last_access = fields.Datetime('Truy cập lần cuối', index=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'Khóa cache phải là duy nhất.'),
+    ]
+
+    @api.model
+    def _get_limits(self):
+        """(TTL tính bằng giây, số mục tối đa) của cache"""
+        params = self.env['ir.config_parameter'].sudo()
+        ttl = int(params.get_param('p2p_dashboard.cache_ttl', DEFAULT_CACHE_TTL))
+        size = int(params.get_param('p2p_dashboard.cache_size', DEFAULT_CACHE_SIZE))
+        return ttl, size
+
+    @api.model
+    def _lookup(self, key, data_version):
+        """Trả về dict giá trị đã cache hoặc None nếu chưa có, đã cũ hay hết hạn"""
+        ttl, _size = self._get_limits()
+        self.env.cr.execute("""
+            SELECT id, payload,
+                   last_access IS NULL
+                   OR last_access < (now() AT TIME ZONE 'UTC') - make_interval(secs => %(touch)s)
+              FROM p2p_dashboard_cache
+             WHERE key = %(key)s AND data_version = %(version)s
+               AND write_date > (now() AT TIME ZONE 'UTC') - make_interval(secs => %(ttl)s)
+        """, {'key': key, 'version': data_version, 'ttl': ttl, 'touch': CACHE_TOUCH_INTERVAL})
+        row = self.env.cr.fetchone()
+        if not row:
+            return None
+        entry_id, payload, stale_access = row
+        if stale_access and not getattr(self.env.cr, 'readonly', False):
+            self._touch(entry_id)
+        try:
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    @api.model
+    def _touch(self, entry_id):
+        """Cập nhật last_access nếu không phải chờ khóa; bỏ qua mọi xung đột"""
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    UPDATE p2p_dashboard_cache SET last_access = now() AT TIME ZONE 'UTC'
+                     WHERE id IN (SELECT id FROM p2p_dashboard_cache
+                                   WHERE id = %s FOR UPDATE SKIP LOCKED)
+                """, [entry_id])
+        except psycopg2.Error as e:
+            logger.debug(f"p2p.dashboard.cache touch skipped due to: {e}")
+
+    @api.model
+    def _store(self, key, data_version, values):
+        """Ghi (hoặc thay thế) giá trị vào cache; việc dọn cache do cron đảm nhận"""
+        if getattr(self.env.cr, 'readonly', False):
+            return
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    INSERT INTO p2p_dashboard_cache
+                           (key, data_version, payload, last_access, create_uid, create_date, write_uid, write_date)
+                    VALUES (%(key)s, %(version)s, %(payload)s, now() AT TIME ZONE 'UTC',
+                            %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC')
+                    ON CONFLICT (key) DO UPDATE
+                       SET data_version = EXCLUDED.data_version,
+                           payload = EXCLUDED.payload,
+                           last_access = EXCLUDED.last_access,
+                           write_uid = EXCLUDED.write_uid,
+                           write_date = EXCLUDED.write_date
+                """, {'key': key, 'version': data_version, 'payload': json.dumps(values), 'uid': self.env.uid})
+        except psycopg2.Error as e:
+            # Một worker khác vừa ghi cùng khóa: giữ giá trị của worker đó
+            logger.debug(f"p2p.dashboard.cache store of {key} skipped due to: {e}")
+
+    @api.model
+    def _gc(self):
+        """Xóa các mục quá TTL và các mục ít được truy cập nhất vượt giới hạn kích thước (chạy bằng cron)"""
+        ttl, size = self._get_limits()
+        self.env.cr.execute("""
+            DELETE FROM p2p_dashboard_cache
+             WHERE write_date <= (now() AT TIME ZONE 'UTC') - make_interval(secs => %(ttl)s)
+                OR id IN (SELECT id FROM p2p_dashboard_cache
+                           ORDER BY last_access DESC NULLS LAST
+                          OFFSET %(size)s)
+        """, {'ttl': ttl, 'size': size})
+        if self.env.cr.rowcount:
+            logger.debug("Evicted %s p2p.dashboard.cache entries", self.env.cr.rowcount)
+        self.invalidate_model()
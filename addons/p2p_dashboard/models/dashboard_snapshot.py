@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from .dashboard import SECTION_KEY_FIELDS, STANDARD_RANGES
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class P2PDashboardSnapshot(models.Model):
+    _name = 'p2p.dashboard.snapshot'
+    _description = 'Ảnh chụp số liệu bảng điều khiển P2P'
+    _order = 'computed_at desc'
+    _rec_name = 'key'
+
+    key = fields.Char('Khóa', required=True, index=True)
+    company_id = fields.Many2one('res.company', string='Công ty', required=True, ondelete='cascade')
+    range_code = fields.Selection(STANDARD_RANGES, string='Khoảng thời gian', required=True)
+    date_from = fields.Date('Từ ngày')
+    date_to = fields.Date('Đến ngày')
+    data_version = fields.Integer('Phiên bản dữ liệu')
+    payload = fields.Text('Giá trị (JSON)', required=True)
+    computed_at = fields.Datetime('Tính lúc')
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'Khóa ảnh chụp phải là duy nhất.'),
+    ]
+
+    @api.model
+    def _lookup(self, key, data_version):
+        """Giá trị đã tính sẵn cho khóa nhóm chỉ số ở đúng phiên bản dữ liệu, hoặc None"""
+        self.env.cr.execute("""
+            SELECT payload FROM p2p_dashboard_snapshot WHERE key = %s AND data_version = %s
+        """, (key, data_version))
+        row = self.env.cr.fetchone()
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    @api.model
+    def _get_computed_at(self, keys, data_version):
+        """Thời điểm tính cũ nhất nếu mọi khóa đều có ảnh chụp ở phiên bản dữ liệu này, ngược lại False"""
+        self.env.cr.execute("""
+            SELECT COUNT(*), MIN(computed_at) FROM p2p_dashboard_snapshot
+             WHERE key IN %s AND data_version = %s
+        """, (tuple(keys), data_version))
+        count, computed_at = self.env.cr.fetchone()
+        return computed_at if count == len(set(keys)) else False
+
+    @api.model
+    def _cron_precompute_snapshots(self):
+        """Tính sẵn các nhóm chỉ số cho mọi công ty và các khoảng thời gian chuẩn.
+
+        Chỉ tính lại khi phiên bản dữ liệu đổi hoặc khoảng thời gian đã sang ngày
+        mới (khóa đổi); ảnh chụp của các khóa không còn dùng được xóa đi.
+        """
+        dashboard_model = self.env['p2p.dashboard']
+        data_version = self.env['p2p.bridge']._get_data_version()
+        defaults = dashboard_model.default_get(['trend_granularity', 'top_borrower_limit', 'analytics_mode'])
+        self.env.cr.execute("SELECT key, data_version FROM p2p_dashboard_snapshot")
+        existing = dict(self.env.cr.fetchall())
+
+        keys = []
+        computed = 0
+        for company in self.env['res.company'].search([]):
+            for range_code, _label in STANDARD_RANGES:
+                date_from, date_to = dashboard_model._get_standard_range(range_code)
+                dashboard = dashboard_model.with_company(company).new(dict(
+                    defaults, date_from=date_from, date_to=date_to, company_id=company.id))
+                for section in SECTION_KEY_FIELDS:
+                    key = dashboard._get_section_cache_key(section)
+                    keys.append(key)
+                    if existing.get(key) == data_version:
+                        continue
+                    try:
+                        values = getattr(dashboard, f'_build_{section}_values')()
+                    except Exception as e:
+                        logger.warning(f"Snapshot {key} skipped due to: {e}")
+                        continue
+                    self._store(key, company, range_code, date_from, date_to, data_version, values)
+                    computed += 1
+
+        if keys:
+            self.env.cr.execute("DELETE FROM p2p_dashboard_snapshot WHERE key NOT IN %s", (tuple(keys),))
+        self.invalidate_model()
+        logger.info("Precomputed %s p2p.dashboard.snapshot sections (data version %s)", computed, data_version)
+
+    @api.model
+    def _store(self, key, company, range_code, date_from, date_to, data_version, values):
+        self.env.cr.execute("""
+            INSERT INTO p2p_dashboard_snapshot
+                   (key, company_id, range_code, date_from, date_to, data_version, payload, computed_at,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%(key)s, %(company)s, %(range_code)s, %(date_from)s, %(date_to)s, %(version)s, %(payload)s,
+                    now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC')
+            ON CONFLICT (key) DO UPDATE
+               SET data_version = EXCLUDED.data_version,
+                   payload = EXCLUDED.payload,
+                   computed_at = EXCLUDED.computed_at,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, {
+            'key': key, 'company': company.id, 'range_code': range_code,
+            'date_from': date_from, 'date_to': date_to, 'version': data_version,
+            'payload': json.dumps(values), 'uid': self.env.uid,
+        })
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Mô phỏng Monte Carlo tổn thất danh mục theo mô hình một nhân tố (Vasicek).
+
+Khoản vay i vỡ nợ trong một kịch bản khi
+    sqrt(rho) * Z + sqrt(1 - rho) * e_i < Phi^-1(PD_i)
+với Z là nhân tố hệ thống chung của kịch bản và e_i là nhiễu riêng, nên các
+khoản vay vỡ nợ tương quan với nhau qua Z. Kịch bản được chia thành các shard
+có seed riêng (kết quả không phụ thuộc cách chia khối); trong mỗi shard các
+kịch bản được xử lý theo khối bằng phép toán mảng NumPy. Mô phỏng chạy trong
+tiến trình hiện tại: worker Odoo không được fork thêm tiến trình con.
+
+Thời gian chạy tỷ lệ với số kịch bản x số khoản vay (~0.9 s cho 1000 x 50.000
+trên một lõi), nên 100.000 kịch bản trên 50.000 khoản vay mất cỡ 100 s, sát
+limit_time_real mặc định. Mỗi shard giới hạn ở _SHARD_ELEMENTS phần tử (~1 s),
+để cron chạy lần lượt các shard trong một khoảng thời gian cố định rồi
+chạy tiếp ở lần sau (xem p2p.stress.result._run_simulation).
+"""
+import logging
+import math
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+# Số phần tử tối đa của ma trận (kịch bản x khoản vay) trong một khối, ~20 MB float32
+_BLOCK_ELEMENTS = 5_000_000
+# Số phần tử tối đa (kịch bản x khoản vay) của một shard, ~1 s trên một lõi
+_SHARD_ELEMENTS = 50_000_000
+# Số kịch bản tối đa của một shard
+_SHARD_MAX_SCENARIOS = 5000
+
+# Hệ số xấp xỉ hữu tỷ của Phi^-1 (Acklam), sai số tương đối < 1.2e-9
+_INV_CDF_A = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+              1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+_INV_CDF_B = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+              6.680131188771972e+01, -1.328068155288572e+01, 1.0]
+_INV_CDF_C = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+              -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+_INV_CDF_D = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+              3.754408661907416e+00, 1.0]
+_INV_CDF_TAIL = 0.02425
+
+
+def inverse_normal_cdf(p):
+    """Phi^-1(p) trên cả mảng, p trong (0, 1)"""
+    p = np.asarray(p, dtype=np.float64)
+    # Hai đuôi dùng cùng công thức theo min(p, 1 - p), đổi dấu ở đuôi trên
+    tail = np.minimum(p, 1 - p)
+    q = np.sqrt(-2 * np.log(np.maximum(tail, np.finfo(np.float64).tiny)))
+    tail_value = np.polyval(_INV_CDF_C, q) / np.polyval(_INV_CDF_D, q)
+    tail_value = np.where(p > 0.5, -tail_value, tail_value)
+    centred = p - 0.5
+    r = centred * centred
+    central_value = np.polyval(_INV_CDF_A, r) * centred / np.polyval(_INV_CDF_B, r)
+    return np.where(tail < _INV_CDF_TAIL, tail_value, central_value)
+
+
+def default_thresholds(pd):
+    """Phi^-1(PD) cho từng khoản vay"""
+    return inverse_normal_cdf(np.clip(np.asarray(pd, dtype=np.float64), 1e-6, 1 - 1e-6))
+
+
+def shard_size_for(n_loans):
+    """Số kịch bản mỗi shard để một shard không vượt quá _SHARD_ELEMENTS phần tử"""
+    return int(min(_SHARD_MAX_SCENARIOS, max(1, _SHARD_ELEMENTS // max(n_loans, 1))))
+
+
+def shard_plan(n_scenarios, seed=0, shard_size=_SHARD_MAX_SCENARIOS):
+    """[(số kịch bản, SeedSequence)] của từng shard, theo đúng thứ tự kịch bản"""
+    if n_scenarios <= 0:
+        return []
+    shard_counts = [shard_size] * (n_scenarios // shard_size)
+    if n_scenarios % shard_size:
+        shard_counts.append(n_scenarios % shard_size)
+    return list(zip(shard_counts, np.random.SeedSequence(seed).spawn(len(shard_counts))))
+
+
+def simulate_shard(thresholds, exposures, rho, n_scenarios, seed):
+    """Tổn thất của từng kịch bản trong một shard.
+
+    :param thresholds: Phi^-1(PD) của từng khoản vay (xem default_thresholds)
+    :param seed: SeedSequence của shard (xem shard_plan)
+    """
+    rng = np.random.default_rng(seed)
+    thresholds = np.asarray(thresholds).astype(np.float32)
+    exposures = np.asarray(exposures).astype(np.float32)
+    systematic_weight = np.float32(math.sqrt(rho))
+    idiosyncratic_weight = np.float32(math.sqrt(1 - rho))
+    block = max(1, _BLOCK_ELEMENTS // max(thresholds.size, 1))
+
+    losses = np.empty(n_scenarios, dtype=np.float64)
+    for start in range(0, n_scenarios, block):
+        size = min(block, n_scenarios - start)
+        systematic = rng.standard_normal(size, dtype=np.float32)[:, None] * systematic_weight
+        latent = rng.standard_normal((size, thresholds.size), dtype=np.float32)
+        latent *= idiosyncratic_weight
+        latent += systematic
+        defaults = latent < thresholds
+        losses[start:start + size] = np.einsum('ij,j->i', defaults, exposures, dtype=np.float64)
+    return losses
+
+
+def simulate_losses(pd, exposures, rho, n_scenarios, seed=0, shard_size=None):
+    """Mảng tổn thất danh mục của n_scenarios kịch bản, chạy hết các shard một lượt.
+
+    :param pd: xác suất vỡ nợ của từng khoản vay
+    :param exposures: tổn thất khi vỡ nợ của từng khoản vay (dư nợ x LGD)
+    :param rho: hệ số tương quan tài sản với nhân tố chung, trong [0, 1)
+    :param shard_size: số kịch bản mỗi shard, mặc định shard_size_for(số khoản vay)
+    """
+    thresholds = default_thresholds(pd)
+    exposures = np.asarray(exposures, dtype=np.float64)
+    if not thresholds.size or n_scenarios <= 0:
+        return np.zeros(max(n_scenarios, 0))
+
+    plan = shard_plan(n_scenarios, seed, shard_size or shard_size_for(thresholds.size))
+    return np.concatenate([
+        simulate_shard(thresholds, exposures, rho, count, shard_seed)
+        for count, shard_seed in plan
+    ])
+
+
+def loss_metrics(losses, confidence=0.99):
+    """Tổn thất kỳ vọng (EL), VaR và CVaR (expected shortfall) ở mức tin cậy cho trước"""
+    losses = np.asarray(losses, dtype=np.float64)
+    if not losses.size:
+        return 0.0, 0.0, 0.0
+    var = float(np.quantile(losses, confidence))
+    tail = losses[losses >= var]
+    return float(losses.mean()), var, float(tail.mean()) if tail.size else var
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from . import stress
+import io
+import json
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Giá trị mặc định của mô phỏng, ghi đè bằng tham số hệ thống p2p_dashboard.stress_*
+DEFAULT_STRESS_PARAMS = {
+    'scenarios': 100000,
+    'correlation': 0.15,
+    'lgd': 0.6,
+    'confidence': 0.99,
+    'base_pd': 0.05,
+}
+
+# Số cột của biểu đồ phân bố tổn thất
+_LOSS_HISTOGRAM_BINS = 30
+# Thời gian tối đa (giây) của một lần chạy cron, dưới limit_time_real mặc định (120 s);
+# phần kịch bản còn lại chạy tiếp ở lần kích hoạt sau
+STRESS_TIME_BUDGET = 60
+# Tên ir.attachment giữ trạng thái của lần mô phỏng đang chạy dở
+STRESS_RUN_ATTACHMENT = 'p2p_dashboard.stress_run.npz'
+
+
+class P2PStressResult(models.Model):
+    _name = 'p2p.stress.result'
+    _description = 'Kết quả mô phỏng stress danh mục P2P'
+    _order = 'computed_at desc, id desc'
+    _rec_name = 'computed_at'
+
+    company_id = fields.Many2one('res.company', string='Công ty', required=True, ondelete='cascade',
+                                 default=lambda self: self.env.company)
+    computed_at = fields.Datetime('Tính lúc', required=True, default=fields.Datetime.now)
+    duration = fields.Float('Thời gian chạy (giây)')
+    loan_count = fields.Integer('Số khoản vay')
+    scenario_count = fields.Integer('Số kịch bản')
+    exposure = fields.Float('Tổng dư nợ')
+    correlation = fields.Float('Hệ số tương quan')
+    lgd = fields.Float('Tỷ lệ tổn thất khi vỡ nợ (LGD)')
+    confidence = fields.Float('Mức tin cậy')
+    expected_loss = fields.Float('Tổn thất kỳ vọng (EL)')
+    value_at_risk = fields.Float('VaR')
+    conditional_var = fields.Float('CVaR')
+    loss_distribution = fields.Text('Phân bố tổn thất (JSON)')
+
+    @api.model
+    def _get_stress_params(self):
+        params = self.env['ir.config_parameter'].sudo()
+        return {
+            key: type(default)(params.get_param(f'p2p_dashboard.stress_{key}', default))
+            for key, default in DEFAULT_STRESS_PARAMS.items()
+        }
+
+    @api.model
+    def _get_loan_factors(self):
+        """Hệ số rủi ro từ loan.config đang hoạt động (nếu module loan_config được cài)"""
+        factors = {'risk_factor': 1.0, 'loan_term_factor': 1.0, 'base_interest_rate': 0.0}
+        if 'loan.config' in self.env:
+            config = self.env['loan.config'].sudo().search([('active', '=', True)], limit=1)
+            if config:
+                factors.update(
+                    risk_factor=config.risk_factor or 1.0,
+                    loan_term_factor=config.loan_term_factor or 1.0,
+                    base_interest_rate=config.base_interest_rate or 0.0,
+                )
+        return factors
+
+    @api.model
+    def _get_portfolio(self, base_pd):
+        """(PD, dư nợ) của các khoản vay đang hoạt động (waiting/success).
+
+        PD gốc là tỷ lệ vỡ nợ lịch sử của các khoản vay đã kết thúc (hoặc base_pd
+        khi chưa có), nhân risk_factor nếu lãi suất cao hơn lãi suất cơ bản và
+        loan_term_factor nếu kỳ hạn trên 12 tháng, giống calculate_interest_rate.
+        """
+        self.env['p2p.loan'].flush_model(['status', 'capital', 'interest_rate', 'term_months'])
+        self.env.cr.execute("""
+            SELECT COUNT(*) FILTER (WHERE status = 'fail'), COUNT(*) FILTER (WHERE status IN ('fail', 'clean'))
+              FROM p2p_loan
+        """)
+        defaulted, closed = self.env.cr.fetchone()
+        historical_pd = defaulted / closed if closed else base_pd
+
+        self.env.cr.execute("""
+            SELECT COALESCE(capital, 0), COALESCE(interest_rate, 0), COALESCE(term_months, 0)
+              FROM p2p_loan
+             WHERE status IN ('waiting', 'success') AND capital > 0
+        """)
+        portfolio = np.array(self.env.cr.fetchall(), dtype=np.float64).reshape(-1, 3)
+        capital, rate, term = portfolio[:, 0], portfolio[:, 1], portfolio[:, 2]
+
+        factors = self._get_loan_factors()
+        pd = np.full(capital.shape, historical_pd)
+        pd = np.where(rate > factors['base_interest_rate'], pd * factors['risk_factor'], pd)
+        pd = np.where(term > 12, pd * factors['loan_term_factor'], pd)
+        return np.clip(pd, 1e-4, 0.99), capital
+
+    @api.model
+    def _load_run(self):
+        """(trạng thái lần chạy dở hoặc None, attachment chứa nó)"""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('name', '=', STRESS_RUN_ATTACHMENT)], limit=1)
+        if not attachment:
+            return None, attachment
+        with np.load(io.BytesIO(attachment.raw)) as data:
+            run = {key: data[key] for key in data.files}
+        run['params'] = json.loads(str(run['params']))
+        return run, attachment
+
+    @api.model
+    def _save_run(self, run, attachment):
+        buffer = io.BytesIO()
+        np.savez(buffer, **dict(run, params=np.array(json.dumps(run['params']))))
+        if attachment:
+            attachment.raw = buffer.getvalue()
+        else:
+            self.env['ir.attachment'].sudo().create({
+                'name': STRESS_RUN_ATTACHMENT,
+                'res_model': self._name,
+                'mimetype': 'application/octet-stream',
+                'raw': buffer.getvalue(),
+            })
+
+    @api.model
+    def _run_simulation(self, time_budget=None):
+        """Chạy (tiếp) mô phỏng cho danh mục hiện tại, lưu kết quả cho mọi công ty khi xong.
+
+        Danh mục (PD, dư nợ) được chụp ở lần chạy đầu và lưu cùng tổn thất của các
+        shard đã chạy, nên một lần mô phỏng chia qua nhiều lần cron vẫn cho đúng kết
+        quả như chạy một lượt.
+
+        :param time_budget: số giây tối đa, None để chạy hết
+        :return: (bản ghi kết quả hoặc None nếu chưa xong, số shard còn lại)
+        """
+        run, attachment = self._load_run()
+        if run is None:
+            params = self._get_stress_params()
+            pd, capital = self._get_portfolio(params['base_pd'])
+            run = {
+                'params': params,
+                'pd': pd,
+                'capital': capital,
+                'losses': np.zeros(max(params['scenarios'], 0)),
+                'shards_done': np.array(0),
+                'duration': np.array(0.0),
+            }
+        params, pd, capital, losses = run['params'], run['pd'], run['capital'], run['losses']
+        plan = stress.shard_plan(losses.size, seed=0, shard_size=stress.shard_size_for(pd.size)) if pd.size else []
+        offsets = np.concatenate([[0], np.cumsum([count for count, _seed in plan], dtype=np.int64)])
+        thresholds = stress.default_thresholds(pd)
+        exposures = capital * params['lgd']
+
+        started = time.monotonic()
+        shards_done = int(run['shards_done'])
+        while shards_done < len(plan) and (time_budget is None or time.monotonic() - started < time_budget):
+            count, shard_seed = plan[shards_done]
+            losses[offsets[shards_done]:offsets[shards_done + 1]] = stress.simulate_shard(
+                thresholds, exposures, params['correlation'], count, shard_seed)
+            shards_done += 1
+        duration = float(run['duration']) + time.monotonic() - started
+        remaining = len(plan) - shards_done
+        if remaining:
+            self._save_run(dict(run, shards_done=np.array(shards_done), duration=np.array(duration)), attachment)
+            logger.info("Stress simulation: %s/%s shards done, continuing in the next run", shards_done, len(plan))
+            return None, remaining
+        attachment.unlink()
+
+        expected_loss, value_at_risk, conditional_var = stress.loss_metrics(losses, params['confidence'])
+        counts, edges = np.histogram(losses, bins=_LOSS_HISTOGRAM_BINS) if losses.size else ([], [0])
+        distribution = {
+            'labels': [f"{edges[i]:,.0f}" for i in range(len(counts))],
+            'counts': [int(count) for count in counts],
+        }
+        logger.info("Stress simulation: %s loans x %s scenarios in %.1fs (EL=%.0f, VaR=%.0f, CVaR=%.0f)",
+                    capital.size, params['scenarios'], duration, expected_loss, value_at_risk, conditional_var)
+
+        # Danh mục p2p.loan dùng chung cho mọi công ty
+        results = self.create([{
+            'company_id': company.id,
+            'duration': duration,
+            'loan_count': int(capital.size),
+            'scenario_count': params['scenarios'],
+            'exposure': float(capital.sum()),
+            'correlation': params['correlation'],
+            'lgd': params['lgd'],
+            'confidence': params['confidence'],
+            'expected_loss': expected_loss,
+            'value_at_risk': value_at_risk,
+            'conditional_var': conditional_var,
+            'loss_distribution': json.dumps(distribution),
+        } for company in self.env['res.company'].search([])])
+        return results, 0
+
+    @api.model
+    def _cron_run_stress_simulation(self):
+        """Chạy mô phỏng theo từng phần STRESS_TIME_BUDGET giây, commit rồi tự kích hoạt lại"""
+        results, remaining = self._run_simulation(time_budget=STRESS_TIME_BUDGET)
+        if results is not None:
+            # Chỉ giữ 30 kết quả gần nhất cho mỗi công ty
+            self.env.cr.execute("""
+                DELETE FROM p2p_stress_result
+                 WHERE id IN (SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY company_id ORDER BY computed_at DESC, id DESC) AS rank
+                          FROM p2p_stress_result) ranked
+                       WHERE rank > 30)
+            """)
+            self.invalidate_model()
+        else:
+            self.env.ref('p2p_dashboard.ir_cron_run_stress_simulation').sudo()._trigger()
+        self.env['ir.cron']._notify_progress(done=0 if results is None else 1, remaining=remaining)
+
+    @api.model
+    def _get_latest(self, company):
+        return self.search([('company_id', '=', company.id)], limit=1)
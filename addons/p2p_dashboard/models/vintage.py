@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Tính đường cong vintage (cohort theo tháng giải ngân) bằng mảng NumPy.
+
+Mọi phép tính là phép toán trên cả mảng (bincount/cumsum), không lặp theo
+từng khoản vay, nên vài trăm nghìn khoản vay chỉ mất vài chục mili giây.
+"""
+import numpy as np
+
+# Mã kết cục của khoản vay trong mảng outcome
+OUTCOME_OPEN = 0
+OUTCOME_DEFAULT = 1
+OUTCOME_CLEAN = 2
+
+
+def month_index(year, month):
+    """Số thứ tự tháng liên tục (year * 12 + month - 1), dùng cho cả số nguyên và mảng"""
+    return year * 12 + month - 1
+
+
+def vintage_curves(origination, resolution, outcome, as_of):
+    """Tỷ lệ vỡ nợ và tất toán lũy kế theo số tháng trên sổ (months-on-book).
+
+    :param origination: mảng chỉ số tháng giải ngân của từng khoản vay
+    :param resolution: mảng chỉ số tháng kết thúc (đáo hạn) của khoản vay, dùng làm
+        thời điểm ghi nhận vỡ nợ/tất toán; giá trị < 0 nghĩa là chưa biết
+    :param outcome: mảng mã kết cục (OUTCOME_OPEN, OUTCOME_DEFAULT, OUTCOME_CLEAN)
+    :param as_of: chỉ số tháng hiện tại, giới hạn các tháng đã quan sát được
+    :return: (chỉ số tháng của từng cohort, số khoản vay mỗi cohort,
+              ma trận tỷ lệ vỡ nợ lũy kế, ma trận tỷ lệ tất toán lũy kế);
+             ma trận có kích thước (số cohort, số tháng trên sổ tối đa + 1) và
+             chứa NaN ở các tháng cohort chưa đi tới
+    """
+    origination = np.asarray(origination, dtype=np.int64)
+    resolution = np.asarray(resolution, dtype=np.int64)
+    outcome = np.asarray(outcome, dtype=np.int8)
+    if not origination.size:
+        empty = np.empty((0, 0))
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), empty, empty
+
+    first_cohort = origination.min()
+    cohort_ids = origination - first_cohort
+    n_cohorts = int(cohort_ids.max()) + 1
+    max_mob = max(int(as_of - first_cohort), 0)
+    width = max_mob + 1
+
+    # Thời điểm ghi nhận: tháng đáo hạn nếu đã qua, ngược lại tháng hiện tại
+    event_month = np.where(resolution >= 0, np.minimum(resolution, as_of), as_of)
+    mob = np.clip(event_month - origination, 0, max_mob)
+    cohort_sizes = np.bincount(cohort_ids, minlength=n_cohorts)
+
+    def cumulative_rate(code):
+        mask = outcome == code
+        flat = cohort_ids[mask] * width + mob[mask]
+        counts = np.bincount(flat, minlength=n_cohorts * width).reshape(n_cohorts, width)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.cumsum(counts, axis=1) / cohort_sizes[:, None]
+
+    default_rates = cumulative_rate(OUTCOME_DEFAULT)
+    clean_rates = cumulative_rate(OUTCOME_CLEAN)
+
+    # Ẩn các tháng trên sổ mà cohort chưa tới và các cohort không có khoản vay
+    cohort_age = as_of - (first_cohort + np.arange(n_cohorts))
+    unobserved = (np.arange(width)[None, :] > cohort_age[:, None]) | (cohort_sizes[:, None] == 0)
+    default_rates[unobserved] = np.nan
+    clean_rates[unobserved] = np.nan
+    return first_cohort + np.arange(n_cohorts), cohort_sizes, default_rates, clean_rates
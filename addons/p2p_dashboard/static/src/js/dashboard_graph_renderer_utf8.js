@@ -1,9 +1,10 @@
 ﻿/** @odoo-module **/
 import { registry } from "@web/core/registry";
-import { useRef, onMounted, onPatched, onWillDestroy } from "@odoo/owl";
+import { useRef, onMounted, onPatched, onWillDestroy, onWillUpdateProps } from "@odoo/owl";
 import { standardFieldProps } from "@web/views/fields/standard_field_props";
 import { Component, useState, xml } from "@odoo/owl";
 import { standardWidgetProps } from "@web/views/widgets/standard_widget_props";
+import { serializeDate } from "@web/core/l10n/dates";
 // Chart.js is optional. If present globally (window.Chart), we'll use it; otherwise we gracefully fallback.
 
 /**
@@ -13,7 +14,7 @@ import { standardWidgetProps } from "@web/views/widgets/standard_widget_props";
  */
 export class P2PDashboardGraphField extends Component {
     static template = xml`
-        <div class="o_field_dashboard_stats">
+        <div class="o_field_dashboard_stats" t-ref="root">
             <div class="p2p-stats-container" t-att-style="state.containerStyle">
                 <!-- Runtime chart type selector (overrides XML options); hidden if opts.hideTypeSelector -->
                 <div class="p2p-stats-controls" t-if="!state.opts.hideTypeSelector" style="display:flex; gap:8px; justify-content:flex-end; align-items:center; margin-bottom:8px;">
@@ -853,5 +854,137 @@ export class P2PDashboardGraphField extends Component {
     }
 }
 
+/**
+ * Biểu đồ tải dữ liệu riêng từ /p2p_dashboard/chart/<id>/<chart>
+ *
+ * Dùng như view widget (<widget name="p2p_dashboard_lazy_graph" chart="..."/>) để trường
+ * biểu đồ không được đọc cùng form: KPI hiển thị ngay, mỗi biểu đồ chỉ gửi request khi
+ * xuất hiện trên màn hình và các request chạy song song. Trình duyệt xác thực lại bằng
+ * ETag nên lần tải sau chỉ nhận 304 cho tới khi dữ liệu thay đổi.
+ *
+ * Request mang giá trị hiện tại của form (khoảng ngày, chu kỳ, ...) nên biểu đồ khớp
+ * với form cả khi bản ghi đang sửa chưa lưu; bản ghi mới dùng id 0.
+ */
+export class P2PDashboardLazyGraph extends P2PDashboardGraphField {
+    static props = {
+        ...standardWidgetProps,
+        name: { type: String },
+        options: { type: Object, optional: true },
+    };
+
+    setup() {
+        this._remoteRaw = null;
+        this._requested = false;
+        super.setup();
+        this.rootRef = useRef("root");
+
+        onMounted(() => {
+            this.state.isLoading = true;
+            this._observeVisibility();
+        });
+
+        onWillUpdateProps((nextProps) => {
+            // Bản ghi được tải lại (đổi khoảng ngày, cập nhật dữ liệu): xác thực lại nếu đã hiển thị,
+            // server trả 304 khi không có gì thay đổi
+            if (this._requested) {
+                this._fetchData(nextProps);
+            }
+        });
+
+        onWillDestroy(() => {
+            if (this._intersectionObserver) {
+                this._intersectionObserver.disconnect();
+                this._intersectionObserver = null;
+            }
+        });
+    }
+
+    _observeVisibility() {
+        const el = this.rootRef.el;
+        if (!el || typeof IntersectionObserver === 'undefined') {
+            this._fetchData(this.props);
+            return;
+        }
+        this._intersectionObserver = new IntersectionObserver((entries) => {
+            if (entries.some((entry) => entry.isIntersecting)) {
+                this._intersectionObserver.disconnect();
+                this._intersectionObserver = null;
+                this._fetchData(this.props);
+            }
+        }, { rootMargin: "200px" });
+        this._intersectionObserver.observe(el);
+    }
+
+    _getDashboardParams(record) {
+        const data = record?.data || {};
+        const params = new URLSearchParams();
+        for (const name of ["date_from", "date_to"]) {
+            if (data[name]) {
+                params.set(name, serializeDate(data[name]));
+            }
+        }
+        for (const name of ["trend_granularity", "analytics_mode", "top_borrower_limit"]) {
+            if (data[name] !== undefined && data[name] !== null && data[name] !== false) {
+                params.set(name, data[name]);
+            }
+        }
+        const company = data.company_id;
+        const companyId = Array.isArray(company) ? company[0] : company?.id;
+        if (companyId) {
+            params.set("company_id", companyId);
+        }
+        return params;
+    }
+
+    async _fetchData(props) {
+        const resId = props.record?.resId || 0;
+        const params = this._getDashboardParams(props.record);
+        this._requested = true;
+        try {
+            const url = `/p2p_dashboard/chart/${resId}/${encodeURIComponent(props.name)}?${params}`;
+            const response = await fetch(url, {
+                credentials: "same-origin",
+                headers: { Accept: "application/json" },
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            this._remoteRaw = await response.text();
+            const newSignature = this._computeSignature();
+            if (newSignature !== this._lastSignature || this.state.isLoading) {
+                const { chartData, chartType } = this._buildChartState();
+                this.state.chartData = chartData;
+                this.state.chartType = this.state.userType || chartType;
+                this._lastSignature = newSignature;
+                this._scheduleRender();
+                this._setupVisibilityWatcher();
+            }
+            this.state.hasError = false;
+        } catch (error) {
+            console.error("[P2P Dashboard] Error loading chart data:", props.name, error);
+            this.state.hasError = true;
+            this.state.errorMessage = error.message;
+        } finally {
+            this.state.isLoading = false;
+        }
+    }
+
+    _getFieldRaw() {
+        return this._remoteRaw;
+    }
+
+    _getChartData() {
+        if (!this._remoteRaw) {
+            return null;
+        }
+        try {
+            return JSON.parse(this._remoteRaw);
+        } catch (error) {
+            console.error("[P2P Dashboard] Error parsing chart data:", error);
+            return null;
+        }
+    }
+}
+
 // Debug helper - đã chuyển phần đăng ký sang file dashboard_graph_widget_registry.js
 console.log("[P2P Dashboard] Graph renderer component defined successfully!");
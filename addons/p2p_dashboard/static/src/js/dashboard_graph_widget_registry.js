@@ -5,7 +5,7 @@
  */
 
 import { registry } from "@web/core/registry";
-import { P2PDashboardGraphField } from "./dashboard_graph_renderer_utf8";
+import { P2PDashboardGraphField, P2PDashboardLazyGraph } from "./dashboard_graph_renderer_utf8";
 
 // Đăng ký field widget với registry của Odoo (Odoo 18 expects a config object)
 registry.category("fields").add("p2p_dashboard_graph", {
@@ -14,5 +14,14 @@ registry.category("fields").add("p2p_dashboard_graph", {
 	supportedTypes: ["json", "char", "text"],
 });
 
+// View widget tải dữ liệu biểu đồ riêng: <widget name="p2p_dashboard_lazy_graph" chart="top_borrowers"/>
+registry.category("view_widgets").add("p2p_dashboard_lazy_graph", {
+	component: P2PDashboardLazyGraph,
+	extractProps: ({ attrs, options }) => ({
+		name: attrs.chart,
+		options,
+	}),
+});
+
 // Debug helper
 console.log("[P2P Dashboard] Widget registry loaded and widget registered successfully!");
\ No newline at end of file
@@ -0,0 +1,2 @@
+from . import test_vintage
+from . import test_stress
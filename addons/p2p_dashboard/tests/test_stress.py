@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from statistics import NormalDist
+
+import numpy as np
+
+from odoo.tests import BaseCase, tagged
+from odoo.addons.p2p_dashboard.models import stress
+
+
+@tagged('p2p_dashboard')
+class TestStressSimulation(BaseCase):
+
+    def test_inverse_normal_cdf(self):
+        np.testing.assert_allclose(
+            stress.inverse_normal_cdf([0.05, 0.5, 0.975, 1e-6]),
+            [-1.6448536269514729, 0.0, 1.9599639845400536, -4.753424308822899], atol=1e-8)
+        # Khớp NormalDist trên cả hai đuôi và vùng giữa
+        grid = np.linspace(1e-6, 1 - 1e-6, 2001)
+        expected = [NormalDist().inv_cdf(p) for p in grid]
+        np.testing.assert_allclose(stress.inverse_normal_cdf(grid), expected, atol=1e-8)
+
+    def test_default_thresholds_clip_pd(self):
+        np.testing.assert_allclose(stress.default_thresholds([0.0, 1.0]), [-4.753424308822899, 4.753424308822899],
+                                   atol=1e-8)
+
+    def test_independent_defaults(self):
+        # rho = 0: tổn thất là tổng Bernoulli, kỳ vọng 200 x 5% = 10, độ lệch chuẩn sqrt(200 x 0.05 x 0.95) ≈ 3.08
+        losses = stress.simulate_losses(np.full(200, 0.05), np.ones(200), 0.0, 20000, seed=1)
+        self.assertEqual(losses.shape, (20000,))
+        self.assertAlmostEqual(losses.mean(), 10.0, delta=0.15)
+        self.assertAlmostEqual(losses.std(), 3.08, delta=0.1)
+
+    def test_vasicek_tail(self):
+        # Danh mục lớn, PD 5%, rho 0.2: tỷ lệ vỡ nợ ở phân vị 99% theo Vasicek
+        # Phi((Phi^-1(0.05) + sqrt(0.2) Phi^-1(0.99)) / sqrt(0.8)) ≈ 0.2496
+        losses = stress.simulate_losses(np.full(1000, 0.05), np.ones(1000), 0.2, 20000, seed=0)
+        self.assertAlmostEqual(losses.mean() / 1000, 0.05, delta=0.003)
+        self.assertAlmostEqual(np.quantile(losses, 0.99) / 1000, 0.2496, delta=0.02)
+
+    def test_reproducible_with_seed(self):
+        args = (np.full(50, 0.1), np.arange(1, 51, dtype=np.float64), 0.15, 12000)
+        np.testing.assert_array_equal(stress.simulate_losses(*args, seed=7), stress.simulate_losses(*args, seed=7))
+
+    def test_shards_resume_to_same_result(self):
+        # Cron chạy từng shard qua nhiều lần: ghép lại phải đúng bằng chạy một lượt
+        pd, exposures = np.full(300, 0.08), np.linspace(1, 3, 300)
+        expected = stress.simulate_losses(pd, exposures, 0.2, 2500, seed=3, shard_size=700)
+        plan = stress.shard_plan(2500, seed=3, shard_size=700)
+        self.assertEqual([count for count, _seed in plan], [700, 700, 700, 400])
+        thresholds = stress.default_thresholds(pd)
+        resumed = np.concatenate([stress.simulate_shard(thresholds, exposures, 0.2, count, shard_seed)
+                                  for count, shard_seed in plan])
+        np.testing.assert_array_equal(resumed, expected)
+
+    def test_shard_size_budget(self):
+        # Một shard tối đa 50 triệu phần tử (~1 s trên một lõi), để mỗi lần cron
+        # (STRESS_TIME_BUDGET = 60 s) dừng kịp trước limit_time_real
+        self.assertEqual(stress.shard_size_for(1000), 5000)
+        self.assertEqual(stress.shard_size_for(50000), 1000)
+        self.assertEqual(stress.shard_size_for(10 ** 9), 1)
+        for n_loans in (1, 999, 50000, 123457, 10 ** 7):
+            self.assertLessEqual(stress.shard_size_for(n_loans) * n_loans, 50_000_000)
+
+    def test_empty_inputs(self):
+        np.testing.assert_array_equal(stress.simulate_losses([], [], 0.15, 5), np.zeros(5))
+        self.assertEqual(stress.simulate_losses([0.1], [1.0], 0.15, 0).size, 0)
+
+    def test_loss_metrics(self):
+        # 100 kịch bản tổn thất 0..99: EL 49.5, VaR 99% = 98.01 (nội suy), CVaR = trung bình đuôi {99}
+        self.assertEqual(stress.loss_metrics(np.arange(100)), (49.5, 98.01, 99.0))
+        self.assertEqual(stress.loss_metrics([]), (0.0, 0.0, 0.0))
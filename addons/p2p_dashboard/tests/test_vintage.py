@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from odoo.tests import BaseCase, tagged
+from odoo.addons.p2p_dashboard.models import vintage
+from odoo.addons.p2p_dashboard.models.vintage import month_index, OUTCOME_OPEN, OUTCOME_DEFAULT, OUTCOME_CLEAN
+
+
+@tagged('p2p_dashboard')
+class TestVintageCurves(BaseCase):
+
+    def test_month_index(self):
+        self.assertEqual(month_index(2024, 1), 24288)
+        self.assertEqual(month_index(2024, 12) + 1, month_index(2025, 1))
+        np.testing.assert_array_equal(month_index(np.array([2024, 2025]), np.array([3, 1])), [24290, 24300])
+
+    def test_cumulative_rates(self):
+        # Cohort 01/2024: một khoản vỡ nợ đáo hạn 02/2024, một khoản tất toán 03/2024, một khoản còn mở.
+        # Cohort 03/2024: một khoản vỡ nợ đáo hạn 04/2024. Không có khoản nào giải ngân 02/2024.
+        origination = [month_index(2024, 1)] * 3 + [month_index(2024, 3)]
+        resolution = [month_index(2024, 2), month_index(2024, 3), -1, month_index(2024, 4)]
+        outcome = [OUTCOME_DEFAULT, OUTCOME_CLEAN, OUTCOME_OPEN, OUTCOME_DEFAULT]
+        cohorts, sizes, default_rates, clean_rates = vintage.vintage_curves(
+            origination, resolution, outcome, as_of=month_index(2024, 4))
+
+        np.testing.assert_array_equal(cohorts, [24288, 24289, 24290])
+        np.testing.assert_array_equal(sizes, [3, 0, 1])
+        self.assertEqual(default_rates.shape, (3, 4))
+        np.testing.assert_allclose(default_rates[0], [0, 1 / 3, 1 / 3, 1 / 3])
+        np.testing.assert_allclose(clean_rates[0], [0, 0, 1 / 3, 1 / 3])
+        # Cohort rỗng bị ẩn hoàn toàn
+        self.assertTrue(np.isnan(default_rates[1]).all())
+        self.assertTrue(np.isnan(clean_rates[1]).all())
+        # Cohort 03/2024 mới đi được 1 tháng trên sổ
+        np.testing.assert_allclose(default_rates[2, :2], [0, 1])
+        np.testing.assert_allclose(clean_rates[2, :2], [0, 0])
+        self.assertTrue(np.isnan(default_rates[2, 2:]).all())
+
+    def test_resolution_after_as_of_is_capped(self):
+        # Đáo hạn sau tháng hiện tại: ghi nhận ở tháng hiện tại
+        cohorts, sizes, default_rates, _clean_rates = vintage.vintage_curves(
+            [month_index(2024, 1)] * 2, [month_index(2025, 1), -1], [OUTCOME_DEFAULT, OUTCOME_OPEN],
+            as_of=month_index(2024, 3))
+        np.testing.assert_array_equal(sizes, [2])
+        np.testing.assert_allclose(default_rates[0], [0, 0, 0.5])
+
+    def test_empty(self):
+        cohorts, sizes, default_rates, clean_rates = vintage.vintage_curves([], [], [], as_of=month_index(2024, 1))
+        self.assertEqual(cohorts.size, 0)
+        self.assertEqual(sizes.size, 0)
+        self.assertEqual(default_rates.shape, (0, 0))
+        self.assertEqual(clean_rates.shape, (0, 0))